@@ -305,6 +305,8 @@ export class Qwen3TtsBackendService extends LongLivedPythonApiService {
     const voiceDesign = this.localModelDir(QWEN3_TTS_MODEL_REPOS.voiceDesign)
     if (custom) env.QWEN3_TTS_MODEL = custom
     if (voiceDesign) env.QWEN3_TTS_VOICE_DESIGN_MODEL = voiceDesign
+    const voiceClone = this.localModelDir(QWEN3_TTS_MODEL_REPOS.voiceClone)
+    if (voiceClone) env.QWEN3_TTS_VOICE_CLONE_MODEL = voiceClone
     return env
   }
 
@@ -25,14 +25,17 @@ export type Qwen3TtsLanguage =
 export type Qwen3TtsSynthesisMode = 'custom_voice' | 'voice_design'
 
 /**
- * HuggingFace repos backing the two synthesis modes. These are downloaded via the
+ * HuggingFace repos backing the synthesis modes. These are downloaded via the
  * standard model-download popup (like every other model) and loaded locally by the
  * qwen3-tts sidecar — never auto-downloaded on service install. Keep in sync with
- * the env defaults in `qwen3-tts/tts_engine.py` (`QWEN3_TTS_MODEL` / `QWEN3_TTS_VOICE_DESIGN_MODEL`).
+ * the env defaults in `qwen3-tts/tts_engine.py` (`QWEN3_TTS_MODEL` /
+ * `QWEN3_TTS_VOICE_DESIGN_MODEL` / `QWEN3_TTS_VOICE_CLONE_MODEL`). The voice clone
+ * (Base) model is optional and not part of the default download list.
  */
 export const QWEN3_TTS_MODEL_REPOS = {
   customVoice: 'Qwen/Qwen3-TTS-12Hz-0.6B-CustomVoice',
   voiceDesign: 'Qwen/Qwen3-TTS-12Hz-1.7B-VoiceDesign',
+  voiceClone: 'Qwen/Qwen3-TTS-12Hz-0.6B-Base',
 } as const
 
 export const QWEN3_TTS_MODEL_REPO_LIST: string[] = [
@@ -708,8 +708,11 @@ type LLMOutCallback =
   | LoadModelCallback
   | LoadModelAllComplete
   | LLMOutTextCallback
+  | DownloadJobs
   | DownloadModelProgressCallback
   | DownloadModelCompleted
+  | DownloadShardCompleted
+  | DownloadStopped
   | ErrorOutCallback
   | NotEnoughDiskSpaceExceptionCallback
   | GatherMetrics
@@ -765,11 +768,32 @@ type DownloadModelProgressCallback = {
   speed: string
 }
 
+type DownloadJobs = {
+  type: 'download_jobs'
+  job_ids: string[]
+}
+
 type DownloadModelCompleted = {
   type: 'download_model_completed'
   repo_id: string
 }
 
+type DownloadShardCompleted = {
+  type: 'download_shard_completed'
+  job_id: string
+  repo_id: string
+  file: string
+  shard: number
+  shard_count: number
+  staged_path: string
+}
+
+type DownloadStopped = {
+  type: 'download_paused' | 'download_cancelled'
+  job_id: string
+  repo_id: string
+}
+
 type ShowOpenDialogOptions = {
   filters: Array<{
     name: string
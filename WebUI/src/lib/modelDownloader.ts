@@ -135,6 +135,17 @@ export function runModelDownload(
     const total = list.length
     let completeCount = 0
     let settled = false
+    // the backend's jobs for this request; stopping cancels only these
+    let jobIds: string[] = []
+    // repos paused from elsewhere (e.g. the download queue) and not finished
+    const paused = new Set<string>()
+
+    const stop = () => {
+      if (jobIds.length === 0) return
+      const ids = encodeURIComponent(jobIds.join(','))
+      void aipgFetch(`${opts.apiHost}/api/stopDownloadModel?ids=${ids}`).catch(() => {})
+    }
+    opts.signal?.addEventListener('abort', stop)
 
     const finish = () => {
       if (settled) return
@@ -158,6 +169,9 @@ export function runModelDownload(
         return
       }
       switch (data.type) {
+        case 'download_jobs':
+          jobIds = data.job_ids
+          break
         case 'download_model_progress':
           opts.onProgress?.({
             repoId: data.repo_id,
@@ -171,6 +185,7 @@ export function runModelDownload(
           })
           break
         case 'download_model_completed':
+          paused.delete(data.repo_id)
           completeCount++
           opts.onModelCompleted?.(data.repo_id)
           opts.onProgress?.({
@@ -185,10 +200,16 @@ export function runModelDownload(
         case 'allComplete':
           finish()
           break
+        case 'download_paused':
+          paused.add(data.repo_id)
+          break
+        case 'download_cancelled':
+          fail(new Error(`Download of ${data.repo_id} was cancelled`))
+          break
         case 'error': {
           const detail = mapDownloadError(data)
           opts.onError?.(detail)
-          void aipgFetch(`${opts.apiHost}/api/stopDownloadModel`).catch(() => {})
+          stop()
           fail(new Error(detail.message))
           break
         }
@@ -206,8 +227,13 @@ export function runModelDownload(
     })
       .then((response) => new SSEProcessor(response.body!.getReader(), onLine, undefined).start())
       // Stream closed without an explicit allComplete (some servers just end):
-      // treat a clean close as success so we don't hang.
-      .then(() => finish())
+      // treat a clean close as success so we don't hang, unless a model was
+      // paused and never finished.
+      .then(() =>
+        paused.size > 0
+          ? fail(new Error(`Download of ${[...paused].join(', ')} was paused`))
+          : finish(),
+      )
       .catch((ex) => fail(ex instanceof Error ? ex : new Error(String(ex))))
   })
 }
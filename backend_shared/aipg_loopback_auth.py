@@ -24,6 +24,12 @@ LOOPBACK_REMOTE_ADDRS = frozenset({"127.0.0.1", "::1"})
 # service registry can detect the service is up before it has the token.
 DEFAULT_AUTH_EXEMPT_PATHS = frozenset({"/healthy"})
 
+# Loopback hostnames whose Origin we are willing to echo back as
+# Access-Control-Allow-Origin. The renderer may load via 127.0.0.1 or
+# localhost depending on platform/devtools; production Electron loads
+# from file:// which the browser sends as `Origin: null`.
+LOOPBACK_CORS_HOSTS = frozenset({"127.0.0.1", "localhost", "::1", "[::1]"})
+
 
 def get_loopback_token() -> str:
     """The per-launch token provisioned by the Electron main process (or "")."""
@@ -59,3 +65,53 @@ def evaluate_loopback_auth(
     if not provided_token or not hmac.compare_digest(provided_token, expected_token):
         return 401, "unauthorized"
     return None
+
+
+def origin_is_loopback(origin: str) -> bool:
+    """True for `null`, `file://...`, or any http(s) URL whose host is a
+    loopback host. Used to decide whether we are willing to echo the
+    request Origin back as Access-Control-Allow-Origin."""
+    if not origin:
+        return False
+    if origin == "null":
+        return True
+    if origin.startswith("file://"):
+        return True
+    # Strip scheme.
+    for scheme in ("http://", "https://"):
+        if origin.startswith(scheme):
+            rest = origin[len(scheme) :]
+            # Strip path component if any.
+            rest = rest.split("/", 1)[0]
+            # Strip port. IPv6 hosts come bracketed: `[::1]:1234`.
+            if rest.startswith("["):
+                end = rest.find("]")
+                if end < 0:
+                    return False
+                host = rest[: end + 1]
+            else:
+                host = rest.split(":", 1)[0]
+            return host in LOOPBACK_CORS_HOSTS
+    return False
+
+
+def loopback_cors_headers(origin: str) -> dict[str, str]:
+    """The CORS headers to add to a response for `origin`.
+
+    The renderer fetch sends a custom `X-AIPG-Auth` header which makes the
+    request "non-simple", so the browser issues a CORS preflight for every
+    call. We only echo the Origin back when it is a known loopback origin;
+    non-loopback origins get no Allow-Origin header and the browser blocks
+    them.
+    """
+    if not origin or not origin_is_loopback(origin):
+        return {}
+    return {
+        "Access-Control-Allow-Origin": origin,
+        "Vary": "Origin",
+        "Access-Control-Allow-Methods": "GET, POST, DELETE, PUT, OPTIONS, PATCH",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, X-AIPG-Auth",
+        # Preflight result cached for 10 minutes; avoids repeated OPTIONS
+        # round-trips for typical short-lived API calls.
+        "Access-Control-Max-Age": "600",
+    }
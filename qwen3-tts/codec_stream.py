@@ -0,0 +1,171 @@
+"""Incremental codec decoding for streaming synthesis.
+
+The talker emits one 16-codebook codec frame per generation step (12.5 frames
+per second of audio). `Qwen3TTSTokenizerV2Decoder.chunked_decode` turns the
+whole sequence into audio once generation has finished; the decoder here does
+the same work in small windows while frames are still arriving, each window
+prefixed by already-decoded frames as left context and the context's samples
+dropped from the output — the scheme `chunked_decode` itself uses at its
+300-frame chunk boundaries.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+from collections.abc import Callable, Iterator
+from typing import Any
+
+# Frames in the first window: small, so the first audio is out after ~0.3 s of
+# speech has been generated. Later windows are larger to keep per-window
+# decoder overhead (and chunk-boundary artifacts) low.
+FIRST_WINDOW_FRAMES = int(os.environ.get("QWEN3_TTS_STREAM_FIRST_FRAMES", "4"))
+WINDOW_FRAMES = int(os.environ.get("QWEN3_TTS_STREAM_WINDOW_FRAMES", "12"))
+# Same as chunked_decode's default.
+LEFT_CONTEXT_FRAMES = 25
+
+
+class StreamingCodecDecoder:
+    """Decodes codec frames to mono float32 audio a window at a time.
+
+    `decoder` is a `Qwen3TTSTokenizerV2Decoder` (or anything with the same
+    call signature and `total_upsample`). Not thread-safe: feed it from the
+    thread that runs generation, which already holds the inference lock.
+    """
+
+    def __init__(
+        self,
+        decoder: Any,
+        device: Any = None,
+        first_window: int = FIRST_WINDOW_FRAMES,
+        window: int = WINDOW_FRAMES,
+        left_context: int = LEFT_CONTEXT_FRAMES,
+    ) -> None:
+        self.decoder = decoder
+        self.device = device
+        self.first_window = max(1, first_window)
+        self.window = max(1, window)
+        self.left_context = left_context
+        self.samples_per_frame = int(decoder.total_upsample)
+        self._context: list[Any] = []
+        self._pending: list[Any] = []
+        self._started = False
+
+    def push(self, frame: Any) -> Any | None:
+        """Add one `(num_quantizers,)` frame; returns audio once a window is full."""
+        self._pending.append(frame)
+        if len(self._pending) < (self.window if self._started else self.first_window):
+            return None
+        return self._decode()
+
+    def flush(self) -> Any | None:
+        """Decode whatever is left once generation has finished."""
+        return self._decode() if self._pending else None
+
+    def _decode(self) -> Any:
+        import torch
+
+        frames = self._context + self._pending
+        codes = torch.stack(frames, dim=-1).unsqueeze(0).clamp(min=0)
+        if self.device is not None:
+            codes = codes.to(self.device)
+        with torch.inference_mode():
+            wav = self.decoder(codes)
+        wav = wav[0, 0, len(self._context) * self.samples_per_frame :]
+        self._context = frames[-self.left_context :] if self.left_context else []
+        self._pending = []
+        self._started = True
+        return wav.to(torch.float32).cpu().numpy()
+
+
+@contextlib.contextmanager
+def streaming_generation(model: Any, on_audio: Callable[[Any], None]) -> Iterator[None]:
+    """Send the audio of a `Qwen3TTSModel.generate_*` call to `on_audio` as it is made.
+
+    `Qwen3TTSTalkerForConditionalGeneration.forward` returns the frame it just
+    completed as the last element of `hidden_states` (None for the prefill
+    step), so a forward hook sees each one as soon as it exists. The
+    wrapper's whole-utterance `speech_tokenizer.decode` at the end is replaced
+    by decoding only the frames not yet sent, and generate_* returns no
+    waveforms. Nothing in the vendored tree is changed; the caller must hold
+    the inference lock for the duration.
+    """
+    tokenizer = model.model.speech_tokenizer
+    eos_token_id = model.model.config.talker_config.codec_eos_token_id
+    decoder = StreamingCodecDecoder(tokenizer.model.decoder, tokenizer.device)
+
+    def send(wav: Any) -> None:
+        if wav is not None and len(wav):
+            on_audio(wav)
+
+    def hook(_module, _args, output) -> None:
+        codec_ids = output.hidden_states[-1]
+        if codec_ids is None:
+            return
+        frame = codec_ids[0]
+        if int(frame[0]) == eos_token_id:
+            return
+        send(decoder.push(frame))
+
+    def decode_rest(_encoded) -> tuple[list, int]:
+        send(decoder.flush())
+        return [], int(tokenizer.get_output_sample_rate())
+
+    handle = model.model.talker.register_forward_hook(hook)
+    tokenizer.decode = decode_rest
+    try:
+        yield
+    finally:
+        del tokenizer.decode
+        handle.remove()
+
+
+class DeferredDecode:
+    """The codec codes of one generate_* call, to be decoded later by `decode`."""
+
+    def __init__(self, tokenizer: Any) -> None:
+        self.tokenizer = tokenizer
+        self.encoded: list[dict] | None = None
+
+    def decode(self, prompt_frames: list[int] | None = None) -> list[Any]:
+        """Decode the captured codes; returns one waveform per batch item.
+
+        generate_voice_clone puts the reference clip's codes in front of each
+        item's; `prompt_frames` gives their count per item, and the audio they
+        make is cut off the front the way generate_voice_clone itself does.
+        """
+        if self.encoded is None:
+            return []
+        # The class's decode, not the instance's: that may be overridden by a
+        # generate call running on another thread meanwhile.
+        wavs, _ = type(self.tokenizer).decode(self.tokenizer, self.encoded)
+        if not prompt_frames:
+            return wavs
+        out = []
+        for wav, encoded, skip in zip(wavs, self.encoded, prompt_frames, strict=True):
+            total = max(int(encoded["audio_codes"].shape[0]), 1)
+            out.append(wav[int(skip / total * wav.shape[0]) :])
+        return out
+
+
+@contextlib.contextmanager
+def deferred_decode(model: Any) -> Iterator[DeferredDecode]:
+    """Run a `Qwen3TTSModel.generate_*` call without its final codec decode.
+
+    generate_* returns no waveforms; the codes are kept on the yielded
+    `DeferredDecode`, whose `decode` may run on another thread while the talker
+    generates the next batch. The caller must hold the inference lock for the
+    duration of the `with` block only.
+    """
+    tokenizer = model.model.speech_tokenizer
+    deferred = DeferredDecode(tokenizer)
+
+    def capture(encoded) -> tuple[list, int]:
+        deferred.encoded = encoded
+        return [], int(tokenizer.get_output_sample_rate())
+
+    tokenizer.decode = capture
+    try:
+        yield deferred
+    finally:
+        del tokenizer.decode
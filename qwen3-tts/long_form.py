@@ -0,0 +1,137 @@
+"""Splitting long texts into utterances and joining their audio again.
+
+The talker's quality and speed both degrade on very long inputs, and one long
+autoregressive run cannot use the batch. Long texts are therefore cut at
+sentence boundaries — at clause boundaries where a sentence alone is too long,
+and at spaces (or anywhere, for scripts written without them) as a last
+resort — and the pieces are packed into segments of up to a target length.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Any
+
+# Target segment lengths. Chinese and Japanese carry several times more
+# speech per character than space-separated scripts.
+SEGMENT_CHARS = int(os.environ.get("QWEN3_TTS_SEGMENT_CHARS", "250"))
+DENSE_SEGMENT_CHARS = int(os.environ.get("QWEN3_TTS_DENSE_SEGMENT_CHARS", "90"))
+CROSSFADE_SECONDS = 0.02
+
+_DENSE_LANGUAGES = {"chinese", "japanese"}
+
+# Kana and CJK ideographs.
+_CJK = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+# Closing quotes and brackets kept with the punctuation before them. Non-ASCII
+# punctuation is escaped: the full-width forms look like their ASCII twins.
+_CLOSERS = "\"'\u201d\u2019\u00bb)\\]"
+_WIDE_CLOSERS = "\u300d\u300f\u201d\u2019\uff09"
+# Group 1 is latin-style punctuation that needs whitespace (group 2) after it;
+# group 3 is full-width punctuation, which ends a piece on its own.
+_SENTENCE_END = re.compile(
+    "([.!?\u2026]+["
+    + _CLOSERS
+    + "]*)(\\s+)|([\u3002\uff01\uff1f]+["
+    + _WIDE_CLOSERS
+    + "]*)"
+)
+_CLAUSE_END = re.compile(
+    "([,;:]+[" + _CLOSERS + "]*)(\\s+)|([\uff0c\u3001\uff1b\uff1a]+)"
+)
+# Don't end a sentence after these (lower-cased, without the dot).
+_ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "sr", "jr", "st", "vs", "e.g", "i.e"}
+_LAST_WORD = re.compile(r"([\w.]+)$")
+
+
+def is_dense(text: str, language: str) -> bool:
+    """Whether `text` is written without spaces between words."""
+    if language.lower() in _DENSE_LANGUAGES:
+        return True
+    if language.lower() != "auto" or not text:
+        return False
+    return len(_CJK.findall(text)) > len(text) * 0.3
+
+
+def _split_at(text: str, pattern: re.Pattern, abbreviations=frozenset()) -> list[str]:
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        if match.group(1):
+            word = _LAST_WORD.search(text, start, match.start(1))
+            if (
+                match.group(1) == "."
+                and word is not None
+                and word.group(1).lower() in abbreviations
+            ):
+                continue
+            end = match.end(1)
+        else:
+            end = match.end()
+        piece = text[start:end].strip()
+        if piece:
+            pieces.append(piece)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        pieces.append(tail)
+    return pieces
+
+
+def _hard_split(text: str, limit: int, dense: bool) -> list[str]:
+    if dense or " " not in text:
+        return [text[i : i + limit] for i in range(0, len(text), limit)]
+    pieces: list[str] = []
+    for word in text.split():
+        if pieces and len(pieces[-1]) + 1 + len(word) <= limit:
+            pieces[-1] += " " + word
+        else:
+            pieces.append(word)
+    return pieces
+
+
+def split_text(text: str, language: str, limit: int | None = None) -> list[str]:
+    """Cut `text` into segments of at most `limit` characters at natural breaks."""
+    dense = is_dense(text, language)
+    if limit is None:
+        limit = DENSE_SEGMENT_CHARS if dense else SEGMENT_CHARS
+    text = text.strip()
+    if len(text) <= limit:
+        return [text] if text else []
+    pieces: list[str] = []
+    for sentence in _split_at(text, _SENTENCE_END, _ABBREVIATIONS):
+        if len(sentence) <= limit:
+            pieces.append(sentence)
+            continue
+        for clause in _split_at(sentence, _CLAUSE_END):
+            if len(clause) <= limit:
+                pieces.append(clause)
+            else:
+                pieces.extend(_hard_split(clause, limit, dense))
+    separator = "" if dense else " "
+    segments: list[str] = []
+    for piece in pieces:
+        if segments and len(segments[-1]) + len(separator) + len(piece) <= limit:
+            segments[-1] += separator + piece
+        else:
+            segments.append(piece)
+    return segments
+
+
+def crossfade_join(wavs: list[Any], sample_rate: int) -> Any:
+    """Concatenate mono float waveforms, overlapping each join by a short linear fade."""
+    import numpy as np
+
+    fade = int(sample_rate * CROSSFADE_SECONDS)
+    out = np.asarray(wavs[0], dtype=np.float32)
+    for wav in wavs[1:]:
+        wav = np.asarray(wav, dtype=np.float32)
+        n = min(fade, len(out), len(wav))
+        if n == 0:
+            out = np.concatenate([out, wav])
+            continue
+        ramp = np.linspace(1.0, 0.0, n, dtype=np.float32)
+        joined = out[-n:] * ramp + wav[:n] * (1.0 - ramp)
+        out = np.concatenate([out[:-n], joined, wav[n:]])
+    return out
@@ -0,0 +1,116 @@
+"""Tests for incremental codec decoding (codec_stream.py).
+
+No model weights: a fake causal decoder stands in for `Qwen3TTSTokenizerV2Decoder`, so what is
+checked is the windowing — that audio decoded a window at a time, with left context, lines up
+sample for sample with decoding every frame at once — and that the generate hooks are removed
+again afterwards.
+
+Run: python -m unittest discover -s tests
+"""
+
+import sys
+import types
+import unittest
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+import codec_stream  # noqa: E402
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+EOS = 2150
+
+
+class _FakeDecoder:
+    """Causal: each sample depends on its frame and the frame before it."""
+
+    total_upsample = 4
+
+    def __call__(self, codes: torch.Tensor) -> torch.Tensor:
+        first = codes[:, :1, :].float()
+        previous = torch.cat(
+            [torch.zeros_like(first[..., :1]), first[..., :-1]], dim=-1
+        )
+        return (first * 10 + previous).repeat_interleave(self.total_upsample, dim=-1)
+
+
+def _frames(n: int) -> list[torch.Tensor]:
+    return [torch.full((16,), i + 1, dtype=torch.long) for i in range(n)]
+
+
+class _FakeTalker(torch.nn.Module):
+    def forward(self, codec_ids):
+        return types.SimpleNamespace(hidden_states=((), codec_ids))
+
+
+class _FakeTokenizer:
+    device = None
+
+    def __init__(self) -> None:
+        self.model = types.SimpleNamespace(decoder=_FakeDecoder())
+
+    def get_output_sample_rate(self) -> int:
+        return 24000
+
+    def decode(self, encoded):
+        raise AssertionError("the whole-utterance decode must not run while streaming")
+
+
+def _fake_model() -> types.SimpleNamespace:
+    config = types.SimpleNamespace(
+        talker_config=types.SimpleNamespace(codec_eos_token_id=EOS)
+    )
+    return types.SimpleNamespace(
+        model=types.SimpleNamespace(
+            talker=_FakeTalker(), speech_tokenizer=_FakeTokenizer(), config=config
+        )
+    )
+
+
+class TestStreamingCodecDecoder(unittest.TestCase):
+    def test_windows_join_into_the_full_decode(self):
+        frames = _frames(11)
+        decoder = codec_stream.StreamingCodecDecoder(
+            _FakeDecoder(), first_window=2, window=4, left_context=1
+        )
+        chunks = [decoder.push(frame) for frame in frames] + [decoder.flush()]
+        chunks = [chunk for chunk in chunks if chunk is not None]
+
+        self.assertEqual([len(chunk) for chunk in chunks], [8, 16, 16, 4])
+        full = _FakeDecoder()(torch.stack(frames, dim=-1).unsqueeze(0))[0, 0]
+        self.assertTrue(torch.equal(torch.from_numpy(np.concatenate(chunks)), full))
+
+    def test_flush_without_pending_frames_is_empty(self):
+        decoder = codec_stream.StreamingCodecDecoder(_FakeDecoder(), first_window=1)
+        self.assertIsNotNone(decoder.push(_frames(1)[0]))
+        self.assertIsNone(decoder.flush())
+
+
+class TestStreamingGeneration(unittest.TestCase):
+    def test_frames_are_decoded_as_the_talker_produces_them(self):
+        model = _fake_model()
+        talker, tokenizer = model.model.talker, model.model.speech_tokenizer
+        audio = []
+        with codec_stream.streaming_generation(model, audio.append):
+            talker(None)  # prefill: no frame yet
+            for frame in _frames(codec_stream.FIRST_WINDOW_FRAMES):
+                talker(frame.unsqueeze(0))
+            self.assertEqual(len(audio), 1)
+            talker(_frames(1)[0].unsqueeze(0))
+            talker(torch.full((1, 16), EOS))
+            wavs, sample_rate = tokenizer.decode([])
+
+        self.assertEqual((wavs, sample_rate), ([], 24000))
+        self.assertEqual(
+            sum(len(chunk) for chunk in audio),
+            (codec_stream.FIRST_WINDOW_FRAMES + 1) * 4,
+        )
+        self.assertEqual(len(talker._forward_hooks), 0)
+        with self.assertRaises(AssertionError):
+            tokenizer.decode([])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Tests for long-text segmentation and joining (long_form.py).
+
+Segmentation is stdlib only; the crossfade test needs numpy and is skipped without it.
+
+Run: python -m unittest discover -s tests
+"""
+
+import importlib.util
+import sys
+import unittest
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+import long_form  # noqa: E402
+
+
+class TestSplitText(unittest.TestCase):
+    def test_short_text_is_one_segment(self):
+        self.assertEqual(
+            long_form.split_text("  Hello there.  ", "English"), ["Hello there."]
+        )
+
+    def test_sentences_are_packed_up_to_the_limit(self):
+        text = "Dr. Smith arrived. It was late! Was anyone awake? Nobody answered."
+        self.assertEqual(
+            long_form.split_text(text, "English", limit=35),
+            ["Dr. Smith arrived. It was late!", "Was anyone awake? Nobody answered."],
+        )
+
+    def test_long_sentences_break_at_clauses_then_spaces(self):
+        text = (
+            "First, a clause that is fine; then one more clause that runs far too long"
+        )
+        segments = long_form.split_text(text, "English", limit=30)
+        self.assertEqual(
+            segments[:2],
+            ["First, a clause that is fine;", "then one more clause that runs"],
+        )
+        self.assertTrue(all(len(segment) <= 30 for segment in segments))
+        self.assertEqual(" ".join(segments), text)
+
+    def test_dense_scripts_split_at_full_width_punctuation(self):
+        text = "今天天气很好。我们去公园散步吧！你觉得怎么样？"  # noqa: RUF001
+        self.assertEqual(
+            long_form.split_text(text, "Auto", limit=12),
+            ["今天天气很好。", "我们去公园散步吧！", "你觉得怎么样？"],  # noqa: RUF001
+        )
+        self.assertEqual(
+            long_form.split_text("一二三四五六七八九十", "Chinese", limit=4),
+            ["一二三四", "五六七八", "九十"],
+        )
+
+    def test_language_picks_the_default_limit(self):
+        self.assertTrue(long_form.is_dense("これはテストです。", "Auto"))
+        self.assertFalse(long_form.is_dense("This is a test.", "Auto"))
+        self.assertTrue(long_form.is_dense("This is a test.", "Japanese"))
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class TestCrossfadeJoin(unittest.TestCase):
+    def test_joins_overlap_by_the_crossfade(self):
+        import numpy as np
+
+        sample_rate = 1000  # 20 samples of crossfade
+        joined = long_form.crossfade_join([np.ones(100), np.zeros(50)], sample_rate)
+        self.assertEqual(len(joined), 130)
+        self.assertTrue(np.all(joined[:80] == 1))
+        self.assertTrue(np.all(np.diff(joined[80:100]) < 0))
+        self.assertTrue(np.all(joined[100:] == 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
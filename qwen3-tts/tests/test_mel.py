@@ -0,0 +1,71 @@
+"""Tests for the cached mel front-end of the vendored tree (vendor/qwen_tts/_mel.py).
+
+No model weights: the cached front-end is compared against the upstream `mel_spectrogram` it
+replaces in `extract_speaker_embedding`, on random audio with the speaker encoder's settings.
+The outputs must match bit for bit, or `tests/vendor_parity.py` would stop holding.
+
+Run: python -m unittest discover -s tests
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+import torch  # noqa: E402
+from vendor.qwen_tts import _mel  # noqa: E402
+from vendor.qwen_tts.core.models.modeling_qwen3_tts import mel_spectrogram  # noqa: E402
+
+# What extract_speaker_embedding passes
+SPEAKER_ENCODER = {
+    "n_fft": 1024,
+    "num_mels": 128,
+    "sampling_rate": 24000,
+    "hop_size": 256,
+    "win_size": 1024,
+    "fmin": 0,
+    "fmax": 12000,
+}
+
+
+def _clip(samples: int, seed: int) -> torch.Tensor:
+    generator = torch.Generator().manual_seed(seed)
+    return torch.rand(samples, generator=generator) * 1.8 - 0.9
+
+
+class TestMelFrontEnd(unittest.TestCase):
+    def test_matches_upstream_bit_for_bit(self):
+        y = _clip(24000 * 3, seed=0).unsqueeze(0)
+        expected = mel_spectrogram(y, **SPEAKER_ENCODER)
+        self.assertTrue(
+            torch.equal(_mel.mel_spectrogram(y, **SPEAKER_ENCODER), expected)
+        )
+        # and again from the cache
+        self.assertTrue(
+            torch.equal(_mel.mel_spectrogram(y, **SPEAKER_ENCODER), expected)
+        )
+
+    def test_filterbank_and_window_are_built_once_per_configuration(self):
+        _mel.get_front_end.cache_clear()
+        for seed in range(3):
+            _mel.mel_spectrogram(_clip(12000, seed).unsqueeze(0), **SPEAKER_ENCODER)
+        _mel.mel_spectrogram(
+            _clip(12000, 0).unsqueeze(0), **{**SPEAKER_ENCODER, "num_mels": 80}
+        )
+        info = _mel.get_front_end.cache_info()
+        self.assertEqual((info.misses, info.hits), (2, 2))
+
+    def test_batch_matches_one_clip_at_a_time(self):
+        clips = [_clip(24000, 1), _clip(30000, 2), _clip(24000, 3)]
+        batched = _mel.mel_spectrogram_batch(clips, **SPEAKER_ENCODER)
+        self.assertEqual(len(batched), 3)
+        for clip, mel in zip(clips, batched):
+            single = _mel.mel_spectrogram(clip.unsqueeze(0), **SPEAKER_ENCODER)[0]
+            self.assertEqual(mel.shape, single.shape)
+            self.assertTrue(torch.allclose(mel, single, atol=1e-5))
+
+
+if __name__ == "__main__":
+    unittest.main()
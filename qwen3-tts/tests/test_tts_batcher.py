@@ -0,0 +1,93 @@
+"""Tests for the synthesis request batcher (tts_batcher.py).
+
+Stdlib only: the batched function is a stand-in that records the batches it was given, so
+these run without torch or model weights.
+
+Run: python -m unittest discover -s tests
+"""
+
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+import tts_batcher  # noqa: E402
+
+
+class TestSynthesisBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batches: list[list[str]] = []
+        self.running = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def run_batch(self, items: list[str]) -> list[str]:
+        self.running.set()
+        self.release.wait(5)
+        self.batches.append(list(items))
+        if "bad" in items:
+            raise ValueError("unknown speaker")
+        return [item.upper() for item in items]
+
+    def submit_all(self, batcher, requests):
+        results: dict[str, object] = {}
+
+        def submit(key, item):
+            try:
+                results[item] = batcher.submit(key, item)
+            except ValueError as exc:
+                results[item] = exc
+
+        threads = [
+            threading.Thread(target=submit, args=request) for request in requests
+        ]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_requests_for_one_model_run_as_one_batch(self):
+        batcher = tts_batcher.SynthesisBatcher(self.run_batch, window=0.5)
+        threads, results = self.submit_all(
+            batcher, [("custom", "a"), ("custom", "b"), ("design", "c")]
+        )
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, {"a": "A", "b": "B", "c": "C"})
+        self.assertEqual(sorted(map(sorted, self.batches)), [["a", "b"], ["c"]])
+
+    def test_requests_queued_behind_a_running_batch_form_the_next_one(self):
+        batcher = tts_batcher.SynthesisBatcher(self.run_batch, window=0, max_batch=2)
+        self.release.clear()
+        first, _ = self.submit_all(batcher, [("custom", "a")])
+        self.assertTrue(self.running.wait(5))
+        # "a" is running (blocked); these three queue up behind it
+        threads, results = self.submit_all(
+            batcher, [("custom", "b"), ("custom", "c"), ("custom", "d")]
+        )
+        deadline = time.monotonic() + 5
+        while len(batcher._queue) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.release.set()
+        for thread in first + threads:
+            thread.join(5)
+        self.assertEqual(self.batches[0], ["a"])
+        self.assertEqual([len(batch) for batch in self.batches[1:]], [2, 1])
+        self.assertEqual(results, {"b": "B", "c": "C", "d": "D"})
+
+    def test_a_failing_request_fails_alone(self):
+        batcher = tts_batcher.SynthesisBatcher(self.run_batch, window=0.5)
+        threads, results = self.submit_all(
+            batcher, [("custom", "ok"), ("custom", "bad")]
+        )
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results["ok"], "OK")
+        self.assertIsInstance(results["bad"], ValueError)
+
+
+if __name__ == "__main__":
+    unittest.main()
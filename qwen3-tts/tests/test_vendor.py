@@ -70,7 +70,7 @@ STDLIB_PREFIXES = {
 
 # Files in the vendored tree that are ours rather than upstream's, and so are exempt from the
 # "upstream notice preserved" check.
-OUR_FILES = {"_compat.py"}
+OUR_FILES = {"_compat.py", "_mel.py"}
 
 EXPECTED_FILES = OUR_FILES | {
     "__init__.py",
@@ -0,0 +1,108 @@
+"""Tests for the voice-clone prompt cache (voice_prompts.py).
+
+No model weights: a dataclass with `VoiceClonePromptItem`'s fields stands in for it, so what is
+checked is the keying, the in-memory LRU and the round trip through the tensor files on disk.
+
+Run: python -m unittest discover -s tests
+"""
+
+import dataclasses
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+import torch  # noqa: E402
+import voice_prompts  # noqa: E402
+
+
+@dataclasses.dataclass
+class _Item:
+    ref_code: torch.Tensor | None
+    ref_spk_embedding: torch.Tensor
+    x_vector_only_mode: bool
+    icl_mode: bool
+    ref_text: str | None = None
+
+
+def _item(seed: int, ref_text: str | None = "hello") -> _Item:
+    generator = torch.Generator().manual_seed(seed)
+    return _Item(
+        ref_code=None if ref_text is None else torch.randint(0, 2048, (30, 16)),
+        ref_spk_embedding=torch.randn(1024, generator=generator),
+        x_vector_only_mode=ref_text is None,
+        icl_mode=ref_text is not None,
+        ref_text=ref_text,
+    )
+
+
+class TestVoiceId(unittest.TestCase):
+    def test_depends_on_model_audio_and_transcript(self):
+        key = voice_prompts.voice_id("Qwen/Base", b"RIFF....")
+        self.assertTrue(voice_prompts.is_voice_id(key))
+        self.assertEqual(key, voice_prompts.voice_id("Qwen/Base", b"RIFF...."))
+        self.assertNotEqual(key, voice_prompts.voice_id("Qwen/Other", b"RIFF...."))
+        self.assertNotEqual(key, voice_prompts.voice_id("Qwen/Base", b"RIFF...!"))
+        with_text = voice_prompts.voice_id("Qwen/Base", b"RIFF....", "hello")
+        self.assertNotEqual(key, with_text)
+        self.assertNotEqual(
+            with_text, voice_prompts.voice_id("Qwen/Base", b"RIFF....", "hello!")
+        )
+        self.assertNotEqual(
+            with_text, voice_prompts.voice_id("Qwen/Base", b"RIFF....hello")
+        )
+        self.assertFalse(voice_prompts.is_voice_id("../" + key[3:]))
+
+
+class TestVoicePromptCache(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def cache(self, capacity: int = 2) -> voice_prompts.VoicePromptCache:
+        return voice_prompts.VoicePromptCache(self.directory, capacity, item_type=_Item)
+
+    def test_prompts_survive_a_restart(self):
+        key = voice_prompts.voice_id("m", b"a")
+        item = _item(0)
+        self.cache().put("m", key, item)
+
+        loaded = self.cache().get("m", key)
+        self.assertIsInstance(loaded, _Item)
+        self.assertTrue(torch.equal(loaded.ref_code, item.ref_code))
+        self.assertTrue(torch.equal(loaded.ref_spk_embedding, item.ref_spk_embedding))
+        self.assertEqual(
+            (loaded.icl_mode, loaded.x_vector_only_mode, loaded.ref_text),
+            (True, False, "hello"),
+        )
+
+    def test_least_recently_used_prompts_leave_memory_first(self):
+        cache = self.cache(capacity=2)
+        keys = [voice_prompts.voice_id("m", bytes([i])) for i in range(3)]
+        items = [_item(i, ref_text=None) for i in range(3)]
+        cache.put("m", keys[0], items[0])
+        cache.put("m", keys[1], items[1])
+        self.assertIs(cache.get("m", keys[0]), items[0])
+        cache.put("m", keys[2], items[2])
+
+        self.assertEqual(list(cache._items), [("m", keys[0]), ("m", keys[2])])
+        reloaded = cache.get("m", keys[1])  # from disk
+        self.assertIsNot(reloaded, items[1])
+        self.assertIsNone(reloaded.ref_code)
+
+    def test_unknown_malformed_and_other_model_ids_miss(self):
+        cache = self.cache()
+        key = voice_prompts.voice_id("m", b"a")
+        cache.put("m", key, _item(0))
+        self.assertIsNone(cache.get("m", voice_prompts.voice_id("m", b"nothing")))
+        self.assertIsNone(cache.get("m", "../../etc/passwd"))
+        self.assertIsNone(cache.get("other", key))
+        self.assertIsNone(self.cache().get("other", key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Batches concurrent synthesis requests onto one accelerator.
+
+`Qwen3TTSForConditionalGeneration.generate` takes a list of texts, left-pads
+them into one batch and splits the codes back out per item by their effective
+length, so N requests cost little more than the longest of them. The batcher
+holds each request for a short window to collect others for the same model;
+requests arriving while a batch runs are queued and form the next batch as
+soon as it finishes, without waiting for a further window.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Hashable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW_SECONDS = int(os.environ.get("QWEN3_TTS_BATCH_WINDOW_MS", "25")) / 1000
+# Padded batch rows cost memory for the whole generation; 1 disables batching.
+MAX_BATCH_SIZE = max(1, int(os.environ.get("QWEN3_TTS_MAX_BATCH", "4")))
+
+
+class _Pending:
+    key: Hashable
+    item: Any
+    arrived: float
+    result: Any
+    error: Exception | None
+
+    def __init__(self, key: Hashable, item: Any) -> None:
+        self.key = key
+        self.item = item
+        self.arrived = time.monotonic()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SynthesisBatcher:
+    """Runs `run_batch(items) -> results` for requests that share a key.
+
+    Only requests with the same key (the model they need) are batched
+    together. If a batch fails, its requests are retried one at a time so a
+    single bad request (an unknown speaker, say) fails alone.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[Any]], list[Any]],
+        window: float = BATCH_WINDOW_SECONDS,
+        max_batch: int = MAX_BATCH_SIZE,
+    ) -> None:
+        self._run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._queue: list[_Pending] = []
+        self._worker: threading.Thread | None = None
+
+    def submit(self, key: Hashable, item: Any) -> Any:
+        """Queue `item` and block until its batch has run; returns its result."""
+        pending = _Pending(key, item)
+        with self._cond:
+            self._queue.append(pending)
+            self._cond.notify()
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="qwen3-tts-batcher", daemon=True
+                )
+                self._worker.start()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _take_batch(self) -> list[_Pending]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            first = self._queue[0]
+            while True:
+                batch = [p for p in self._queue if p.key == first.key]
+                remaining = first.arrived + self.window - time.monotonic()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = batch[: self.max_batch]
+            self._queue = [p for p in self._queue if all(p is not b for b in batch)]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            try:
+                self._run_pending(batch)
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def _run_pending(self, batch: list[_Pending]) -> None:
+        try:
+            results = self._run_batch([p.item for p in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0].error = exc
+                return
+            logger.warning(
+                "batch of %d failed (%s); retrying one at a time", len(batch), exc
+            )
+            for pending in batch:
+                self._run_pending([pending])
+            return
+        for pending, result in zip(batch, results, strict=True):
+            pending.result = result
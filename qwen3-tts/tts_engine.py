@@ -2,16 +2,26 @@
 
 from __future__ import annotations
 
+import concurrent.futures
 import contextlib
 import io
 import logging
 import os
+import queue
+import random
 import threading
+from collections.abc import Iterator
 from typing import Any, Literal
 
+import codec_stream
+import long_form
+import tts_batcher
+import voice_prompts
+
 logger = logging.getLogger(__name__)
 
-SynthesisMode = Literal["custom_voice", "voice_design"]
+SynthesisMode = Literal["custom_voice", "voice_design", "voice_clone"]
+SYNTHESIS_MODES = ("custom_voice", "voice_design", "voice_clone")
 
 CUSTOM_VOICE_SPEAKERS: list[dict[str, str]] = [
     {
@@ -79,7 +89,8 @@ LANGUAGES = [
 _load_lock = threading.Lock()
 # … and separately serializes inference. The models share a single accelerator
 # and most torch generate paths are not thread-safe, so concurrent
-# /api/synthesize requests must not hit a model object at the same time.
+# /api/synthesize requests must not hit a model object at the same time; they
+# are run together as one padded batch instead (see _batcher below).
 _infer_lock = threading.Lock()
 # Two-slot cache: custom_voice and voice_design use different model ids, so we
 # keep both resident once loaded instead of unloading/reloading on every mode
@@ -88,9 +99,9 @@ _models: dict[str, Any] = {}
 _load_error: str | None = None
 _resolved_device: str | None = None
 
-# Upper bound on input length. A single request that is too long can run for
-# minutes or exhaust device memory; the agent should split long scripts.
-MAX_TEXT_CHARS = int(os.environ.get("QWEN3_TTS_MAX_CHARS", "5000"))
+# Upper bound on input length. Long texts are split into segments (see
+# long_form), so this only bounds how long one request may occupy the model.
+MAX_TEXT_CHARS = int(os.environ.get("QWEN3_TTS_MAX_CHARS", "100000"))
 
 
 def resolved_device_label() -> str | None:
@@ -112,6 +123,13 @@ def voice_design_model_id() -> str:
     )
 
 
+def voice_clone_model_id() -> str:
+    return os.environ.get(
+        "QWEN3_TTS_VOICE_CLONE_MODEL",
+        "Qwen/Qwen3-TTS-12Hz-0.6B-Base",
+    )
+
+
 def model_status() -> dict[str, object]:
     with _load_lock:
         return {
@@ -123,7 +141,11 @@ def model_status() -> dict[str, object]:
 
 
 def model_id_for_mode(mode: SynthesisMode) -> str:
-    return voice_design_model_id() if mode == "voice_design" else default_model_id()
+    if mode == "voice_design":
+        return voice_design_model_id()
+    if mode == "voice_clone":
+        return voice_clone_model_id()
+    return default_model_id()
 
 
 def is_model_downloaded(mode: SynthesisMode = "custom_voice") -> bool:
@@ -236,60 +258,319 @@ def _seed_everything(seed: int) -> None:
             torch.xpu.manual_seed_all(seed)
 
 
-def synthesize_wav(
-    *,
-    text: str,
-    language: str,
-    speaker: str,
-    instruct: str | None,
-    mode: SynthesisMode,
-    seed: int | None = None,
-) -> tuple[bytes, int]:
-    import numpy as np
-    import soundfile as sf
-
+def _validated_text(text: str) -> str:
     trimmed = (text or "").strip()
     if not trimmed:
         raise ValueError("text is required")
     if len(trimmed) > MAX_TEXT_CHARS:
         raise ValueError(
-            f"text is too long ({len(trimmed)} characters); the maximum is {MAX_TEXT_CHARS}. "
-            "Split it into smaller segments and synthesize them separately."
+            f"text is too long ({len(trimmed)} characters); the maximum is {MAX_TEXT_CHARS}."
         )
+    return trimmed
+
 
+def _normalized_language(language: str) -> str:
     lang = language.strip() if language else "Auto"
     if lang.lower() == "auto":
         lang = "Auto"
+    return lang
+
+
+class SynthesisRequest:
+    """One utterance of a (possibly batched) generate call."""
+
+    text: str
+    language: str
+    speaker: str
+    instruct: str | None
+    # The cached VoiceClonePromptItem, for voice_clone mode
+    voice_prompt: Any
+
+    def __init__(
+        self,
+        text: str,
+        language: str,
+        speaker: str,
+        instruct: str | None,
+        voice_prompt: Any = None,
+    ) -> None:
+        self.text = text
+        self.language = language
+        self.speaker = speaker
+        self.instruct = instruct
+        self.voice_prompt = voice_prompt
+
+    def prompt_frames(self) -> int:
+        """Codec frames of reference audio the prompt puts before the speech."""
+        ref_code = getattr(self.voice_prompt, "ref_code", None)
+        return 0 if ref_code is None else int(ref_code.shape[0])
+
+
+# Prompts for voice_clone mode, computed once per reference clip (see voice_prompts).
+_voice_prompts = voice_prompts.VoicePromptCache()
 
-    model_id = voice_design_model_id() if mode == "voice_design" else default_model_id()
+
+def register_voice(audio: bytes, ref_text: str | None = None) -> str:
+    """Compute (or find) the voice-clone prompt of a reference clip; return its id.
+
+    With a transcript the prompt conditions on the clip's codec codes as well
+    as its speaker embedding (ICL); without one, on the embedding only.
+    The same clip with another transcript is another voice, with its own id.
+    """
+    import numpy as np
+    import soundfile as sf
+
+    ref_text = (ref_text or "").strip() or None
+    model_id = voice_clone_model_id()
+    key = voice_prompts.voice_id(model_id, audio, ref_text)
+    if _voice_prompts.get(model_id, key) is not None:
+        return key
+    try:
+        wav, sr = sf.read(io.BytesIO(audio), dtype="float32", always_2d=False)
+    except (RuntimeError, TypeError) as exc:
+        raise ValueError(
+            f"reference audio is not a readable sound file: {exc}"
+        ) from exc
+    if wav.ndim > 1:
+        wav = np.mean(wav, axis=-1)
     model = _load_model(model_id)
+    with _infer_lock:
+        (item,) = model.create_voice_clone_prompt(
+            ref_audio=(wav, int(sr)),
+            ref_text=ref_text,
+            x_vector_only_mode=ref_text is None,
+        )
+    _voice_prompts.put(model_id, key, item)
+    return key
 
-    # Serialize inference: the cached models share one accelerator and the
-    # generate paths are not thread-safe, so only one synthesis runs at a time.
+
+def _voice_prompt(voice_id: str | None) -> Any:
+    model_id = voice_clone_model_id()
+    prompt = _voice_prompts.get(model_id, voice_id) if voice_id else None
+    if prompt is None:
+        raise ValueError(
+            "unknown voiceId; register the reference audio with /api/voices first"
+        )
+    return prompt
+
+
+def _generate(
+    model: Any,
+    mode: SynthesisMode,
+    requests: list[SynthesisRequest],
+    seed: int | None = None,
+) -> tuple[list[Any], int]:
+    """Synthesize `requests` as one batch; the caller holds `_infer_lock`.
+
+    The vendored generate left-pads the batch and cuts each item's codes at
+    its own end of speech, so the waveforms come back one per request.
+    """
+    if seed is not None:
+        _seed_everything(seed)
+    texts = [r.text for r in requests]
+    languages = [r.language for r in requests]
+    instructs = [(r.instruct or "").strip() for r in requests]
+    if mode == "voice_clone":
+        return model.generate_voice_clone(
+            text=texts,
+            language=languages,
+            voice_clone_prompt=[r.voice_prompt for r in requests],
+        )
+    if mode == "voice_design":
+        return model.generate_voice_design(
+            text=texts,
+            language=languages,
+            instruct=[inst or "Natural, clear narration." for inst in instructs],
+        )
+    return model.generate_custom_voice(
+        text=texts,
+        language=languages,
+        speaker=[r.speaker.strip() or "Ryan" for r in requests],
+        instruct=instructs,
+    )
+
+
+def _run_batch(batch: list[tuple[SynthesisMode, SynthesisRequest]]) -> list[Any]:
+    mode = batch[0][0]
+    model = _load_model(model_id_for_mode(mode))
     with _infer_lock:
-        if seed is not None:
-            _seed_everything(seed)
-        if mode == "voice_design":
-            wavs, sr = model.generate_voice_design(
-                text=trimmed,
-                language=lang,
-                instruct=(instruct or "").strip() or "Natural, clear narration.",
-            )
-        else:
-            spk = speaker.strip() or "Ryan"
-            inst = (instruct or "").strip()
-            kwargs: dict[str, Any] = {
-                "text": trimmed,
-                "language": lang,
-                "speaker": spk,
-            }
-            if inst:
-                kwargs["instruct"] = inst
-            wavs, sr = model.generate_custom_voice(**kwargs)
-
-    waveform = wavs[0]
+        wavs, sr = _generate(model, mode, [request for _, request in batch])
+    return [(wav, int(sr)) for wav in wavs]
+
+
+# Unseeded requests for the same model are batched. A seeded request runs on
+# its own: the batch shares one sampler, so batching it would give a pinned
+# voice different samples depending on what it happened to be batched with.
+_batcher = tts_batcher.SynthesisBatcher(_run_batch)
+
+
+def _synthesize_segments(
+    model: Any,
+    mode: SynthesisMode,
+    requests: list[SynthesisRequest],
+    seed: int | None,
+) -> tuple[Any, int]:
+    """Synthesize the segments of a long text and join them into one waveform.
+
+    Segments go through the talker in batches, taking the inference lock per
+    batch so other requests can run in between. Each batch's codec decode is
+    deferred to a worker thread and overlaps the talker generating the next
+    batch. Every batch starts from the same seed; voice design samples its
+    speaker per batch row, so there each segment is generated on its own to
+    keep one voice throughout.
+    """
+    if seed is None:
+        seed = random.randrange(2**31)
+    batch_size = 1 if mode == "voice_design" else tts_batcher.MAX_BATCH_SIZE
+    with concurrent.futures.ThreadPoolExecutor(
+        1, thread_name_prefix="qwen3-tts-decode"
+    ) as decoder:
+        decoded = []
+        for start in range(0, len(requests), batch_size):
+            batch = requests[start : start + batch_size]
+            with _infer_lock, codec_stream.deferred_decode(model) as codes:
+                _generate(model, mode, batch, seed)
+            prompt_frames = [request.prompt_frames() for request in batch]
+            decoded.append(decoder.submit(codes.decode, prompt_frames))
+        wavs = [wav for future in decoded for wav in future.result()]
+    sample_rate = int(model.model.speech_tokenizer.get_output_sample_rate())
+    return long_form.crossfade_join(wavs, sample_rate), sample_rate
+
+
+def _segment_requests(
+    mode: SynthesisMode,
+    text: str,
+    language: str,
+    speaker: str,
+    instruct: str | None,
+    voice_id: str | None,
+) -> list[SynthesisRequest]:
+    lang = _normalized_language(language)
+    segments = long_form.split_text(_validated_text(text), lang)
+    prompt = _voice_prompt(voice_id) if mode == "voice_clone" else None
+    return [
+        SynthesisRequest(segment, lang, speaker, instruct, prompt)
+        for segment in segments
+    ]
+
+
+def synthesize_wav(
+    *,
+    text: str,
+    language: str,
+    speaker: str,
+    instruct: str | None,
+    mode: SynthesisMode,
+    seed: int | None = None,
+    voice_id: str | None = None,
+) -> tuple[bytes, int]:
+    import numpy as np
+    import soundfile as sf
+
+    requests = _segment_requests(mode, text, language, speaker, instruct, voice_id)
+    if len(requests) > 1:
+        model = _load_model(model_id_for_mode(mode))
+        waveform, sr = _synthesize_segments(model, mode, requests, seed)
+    elif seed is None:
+        waveform, sr = _batcher.submit(mode, (mode, requests[0]))
+    else:
+        model = _load_model(model_id_for_mode(mode))
+        with _infer_lock:
+            wavs, sr = _generate(model, mode, requests, seed)
+        waveform = wavs[0]
+
     if isinstance(waveform, np.ndarray):
         buf = io.BytesIO()
         sf.write(buf, waveform, sr, format="WAV")
         return buf.getvalue(), int(sr)
     raise RuntimeError("Unexpected waveform type from Qwen3-TTS")
+
+
+_STREAM_END = object()
+
+
+class _StreamCancelled(Exception):
+    """The client stopped reading a streamed synthesis."""
+
+
+class _ChunkStream:
+    """The chunk iterator of `synthesize_stream`.
+
+    Not a generator: closing a generator that was never started skips its
+    cleanup, and a client may go away before the first chunk is read.
+    """
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event) -> None:
+        self._chunks = chunks
+        self._cancelled = cancelled
+
+    def __iter__(self) -> _ChunkStream:
+        return self
+
+    def __next__(self) -> Any:
+        if self._cancelled.is_set():
+            raise StopIteration
+        item = self._chunks.get()
+        if item is _STREAM_END:
+            self.close()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        return item
+
+    def close(self) -> None:
+        self._cancelled.set()
+
+
+def synthesize_stream(
+    *,
+    text: str,
+    language: str,
+    speaker: str,
+    instruct: str | None,
+    mode: SynthesisMode,
+    seed: int | None = None,
+    voice_id: str | None = None,
+) -> tuple[int, Iterator[Any]]:
+    """Synthesize like `synthesize_wav`, but hand out audio while it is generated.
+
+    Returns the sample rate and an iterator of mono float32 chunks. Codec
+    frames are captured from the talker as each generation step completes and
+    decoded in small windows (see codec_stream), so the first chunk arrives
+    after a few frames instead of after the whole utterance. Validation and
+    model loading happen before this returns, so their errors are raised here
+    rather than from the iterator. Closing the iterator early, even before the
+    first chunk, stops generation at the next decoded window. Long texts are
+    generated a segment at a time, all from the same seed.
+    """
+    requests = _segment_requests(mode, text, language, speaker, instruct, voice_id)
+    if len(requests) > 1 and seed is None:
+        seed = random.randrange(2**31)
+    model = _load_model(model_id_for_mode(mode))
+    sample_rate = int(model.model.speech_tokenizer.get_output_sample_rate())
+    chunks: queue.Queue = queue.Queue()
+    cancelled = threading.Event()
+
+    def put(wav: Any) -> None:
+        if cancelled.is_set():
+            # raised inside the talker's forward hook, which ends generate()
+            raise _StreamCancelled
+        chunks.put(wav)
+
+    def run() -> None:
+        try:
+            for request in requests:
+                with _infer_lock, codec_stream.streaming_generation(model, put):
+                    _generate(model, mode, [request], seed)
+        except _StreamCancelled:
+            logger.info("streaming synthesis stopped: the client went away")
+        except Exception as exc:
+            logger.exception("streaming synthesis failed")
+            chunks.put(exc)
+        finally:
+            # however generation ended, a reader blocked on the queue wakes up
+            chunks.put(_STREAM_END)
+
+    threading.Thread(target=run, name="qwen3-tts-stream", daemon=True).start()
+    return sample_rate, _ChunkStream(chunks, cancelled)
@@ -0,0 +1,135 @@
+"""Voice-clone prompts, cached by reference audio.
+
+`Qwen3TTSModel.create_voice_clone_prompt` decodes and resamples the reference
+clip, runs the speaker encoder over its mel spectrogram and the codec encoder
+over the whole clip. Its result — a `VoiceClonePromptItem` holding the clip's
+codec codes and speaker embedding — depends only on the audio, its transcript
+and the model, so it is computed once per voice and kept: the most recently
+used in memory, all of them on disk, keyed by a hash of the model id, the
+audio bytes and the transcript. Clients refer to a voice by that key.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+VOICES_DIR = os.path.abspath(
+    os.environ.get("QWEN3_TTS_VOICE_CACHE_DIR", "./cache/voices")
+)
+MEMORY_ENTRIES = max(1, int(os.environ.get("QWEN3_TTS_VOICE_CACHE_ENTRIES", "32")))
+
+_VOICE_ID = re.compile(r"[0-9a-f]{64}")
+
+
+def voice_id(model_id: str, audio: bytes, ref_text: str | None = None) -> str:
+    """The cache key of a reference clip and its transcript for `model_id`.
+
+    `ref_text` is expected normalized (stripped, None when empty), so each
+    (clip, transcript) pair has exactly one id.
+    """
+    digest = hashlib.sha256(model_id.encode("utf-8"))
+    digest.update(b"\0")
+    # fixed-size, so where the audio ends and the transcript starts is unambiguous
+    digest.update(hashlib.sha256(audio).digest())
+    if ref_text is not None:
+        digest.update(ref_text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_voice_id(value: str) -> bool:
+    return bool(_VOICE_ID.fullmatch(value))
+
+
+class VoicePromptCache:
+    """`VoiceClonePromptItem`s by voice id: an in-memory LRU over a directory of tensor files.
+
+    `item_type` builds items read back from disk; it defaults to the vendored
+    `VoiceClonePromptItem`, imported when first needed.
+    """
+
+    def __init__(
+        self,
+        directory: str = VOICES_DIR,
+        capacity: int = MEMORY_ENTRIES,
+        item_type: Any = None,
+    ) -> None:
+        self.directory = directory
+        self.capacity = capacity
+        self._item_type = item_type
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple[str, str], Any] = OrderedDict()
+
+    def _path(self, model_id: str, key: str) -> str:
+        # One directory per model, so an id handed out for another model's
+        # prompt (before a model switch) is a miss rather than a wrong prompt.
+        model_dir = hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, model_dir, f"{key}.pt")
+
+    def get(self, model_id: str, key: str) -> Any | None:
+        """The prompt stored under `key` for `model_id`, or None."""
+        if not is_voice_id(key):
+            return None
+        with self._lock:
+            item = self._items.get((model_id, key))
+            if item is not None:
+                self._items.move_to_end((model_id, key))
+                return item
+        item = self._load(self._path(model_id, key))
+        if item is not None:
+            self._remember((model_id, key), item)
+        return item
+
+    def put(self, model_id: str, key: str, item: Any) -> None:
+        self._remember((model_id, key), item)
+        self._save(self._path(model_id, key), item)
+
+    def _remember(self, entry: tuple[str, str], item: Any) -> None:
+        with self._lock:
+            self._items[entry] = item
+            self._items.move_to_end(entry)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def _load(self, path: str) -> Any | None:
+        import torch
+
+        if not os.path.isfile(path):
+            return None
+        try:
+            # tensors, bools, a str and Nones only, so the safe loader will do
+            fields = torch.load(path, map_location="cpu", weights_only=True)
+        except Exception as exc:
+            logger.warning("Unreadable voice prompt %s: %s", path, exc)
+            return None
+        item_type = self._item_type
+        if item_type is None:
+            from vendor.qwen_tts import VoiceClonePromptItem as item_type
+        return item_type(**fields)
+
+    def _save(self, path: str, item: Any) -> None:
+        import torch
+
+        fields = {
+            field.name: _to_cpu(getattr(item, field.name))
+            for field in dataclasses.fields(item)
+        }
+        tmp = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            torch.save(fields, tmp)
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("Failed to save voice prompt %s: %s", path, exc)
+
+
+def _to_cpu(value: Any) -> Any:
+    return value.detach().cpu() if hasattr(value, "detach") else value
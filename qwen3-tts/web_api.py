@@ -9,20 +9,25 @@ from __future__ import annotations
 import argparse
 import base64
 import hmac
+import json
 import logging
 import os
 import threading
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from tts_engine import (
     CUSTOM_VOICE_SPEAKERS,
     LANGUAGES,
+    SYNTHESIS_MODES,
     default_model_id,
     ensure_loaded,
     is_model_downloaded,
     model_status,
+    register_voice,
+    synthesize_stream,
     synthesize_wav,
+    voice_clone_model_id,
     voice_design_model_id,
 )
 
@@ -68,6 +73,7 @@ def get_config():
             "data": {
                 "customVoiceModel": default_model_id(),
                 "voiceDesignModel": voice_design_model_id(),
+                "voiceCloneModel": voice_clone_model_id(),
                 "speakers": CUSTOM_VOICE_SPEAKERS,
                 "languages": LANGUAGES,
                 "status": model_status(),
@@ -86,7 +92,7 @@ def load_model():
     """
     body = request.get_json(silent=True) or {}
     mode = body.get("mode", "custom_voice")
-    if mode not in ("custom_voice", "voice_design"):
+    if mode not in SYNTHESIS_MODES:
         return jsonify({"code": -1, "message": f"unsupported mode: {mode}"}), 400
     try:
         ensure_loaded(mode)
@@ -96,16 +102,12 @@ def load_model():
         return jsonify({"code": -1, "message": str(exc)}), 500
 
 
-@app.post("/api/synthesize")
-def synthesize():
-    body = request.get_json(silent=True) or {}
-    text = body.get("text", "")
-    language = body.get("language", "Auto")
-    speaker = body.get("speaker", "Ryan")
-    instruct = body.get("instruct")
+def _synthesis_args(body: dict) -> dict:
+    """The synthesize_* keyword arguments of a request body."""
     mode = body.get("mode", "custom_voice")
-    if mode not in ("custom_voice", "voice_design"):
-        return jsonify({"code": -1, "message": f"unsupported mode: {mode}"}), 400
+    if mode not in SYNTHESIS_MODES:
+        raise ValueError(f"unsupported mode: {mode}")
+    instruct = body.get("instruct")
     # Optional sampler seed: the client pins one per saved voice so the voice is
     # reproducible across generations. Clamped to a torch-safe non-negative int;
     # anything unparsable just means "unseeded".
@@ -114,15 +116,55 @@ def synthesize():
         seed = abs(int(seed_raw)) % (2**31) if seed_raw is not None else None
     except (TypeError, ValueError):
         seed = None
+    return {
+        "text": str(body.get("text", "")),
+        "language": str(body.get("language", "Auto")),
+        "speaker": str(body.get("speaker", "Ryan")),
+        "instruct": str(instruct) if instruct is not None else None,
+        "mode": mode,
+        "seed": seed,
+        # voice_clone: the id /api/voices returned for the reference clip
+        "voice_id": str(body.get("voiceId") or "") or None,
+    }
+
+
+@app.post("/api/voices")
+def create_voice():
+    """Register a reference clip for voice_clone mode; returns its voice id.
+
+    Body: `audioBase64` (a sound file, e.g. WAV) and optionally `refText`, its
+    transcript. The speaker and codec encoders run once per clip and
+    transcript; the id is stable (a hash of the clip, the transcript and the
+    voice clone model), so registering the same pair again is cheap and
+    returns the same id.
+    """
+    body = request.get_json(silent=True) or {}
     try:
-        wav_bytes, sample_rate = synthesize_wav(
-            text=str(text),
-            language=str(language),
-            speaker=str(speaker),
-            instruct=str(instruct) if instruct is not None else None,
-            mode=mode,
-            seed=seed,
-        )
+        audio = base64.b64decode(str(body.get("audioBase64", "")), validate=True)
+    except ValueError:
+        return jsonify({"code": -1, "message": "audioBase64 is not valid base64"}), 400
+    if not audio:
+        return jsonify({"code": -1, "message": "audioBase64 is required"}), 400
+    ref_text = body.get("refText")
+    try:
+        voice_id = register_voice(audio, str(ref_text) if ref_text else None)
+    except ValueError as exc:
+        return jsonify({"code": -1, "message": str(exc)}), 400
+    except Exception as exc:
+        logger.exception("voice registration failed")
+        return jsonify({"code": -1, "message": str(exc)}), 500
+    return jsonify({"code": 0, "data": {"voiceId": voice_id}})
+
+
+@app.post("/api/synthesize")
+def synthesize():
+    body = request.get_json(silent=True) or {}
+    try:
+        args = _synthesis_args(body)
+    except ValueError as exc:
+        return jsonify({"code": -1, "message": str(exc)}), 400
+    try:
+        wav_bytes, sample_rate = synthesize_wav(**args)
         encoded = base64.b64encode(wav_bytes).decode("ascii")
         return jsonify(
             {
@@ -131,9 +173,9 @@ def synthesize():
                     "audioBase64": encoded,
                     "sampleRate": sample_rate,
                     "mediaType": "audio/wav",
-                    "speaker": speaker,
-                    "language": language,
-                    "mode": mode,
+                    "speaker": body.get("speaker", "Ryan"),
+                    "language": body.get("language", "Auto"),
+                    "mode": args["mode"],
                 },
             }
         )
@@ -144,6 +186,70 @@ def synthesize():
         return jsonify({"code": -1, "message": str(exc)}), 500
 
 
+def _sse(event: dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+
+@app.post("/api/synthesize/stream")
+def synthesize_streaming():
+    """`/api/synthesize` as Server-Sent Events, audio sent while it is generated.
+
+    Events: `start` (sample rate and PCM format), then one `audio` event per
+    decoded window with base64 16-bit little-endian mono PCM, then `end` — or
+    `error` if synthesis fails once streaming has begun. Errors before the
+    first event are plain JSON responses, as for /api/synthesize.
+    """
+    import numpy as np
+
+    body = request.get_json(silent=True) or {}
+    try:
+        args = _synthesis_args(body)
+        sample_rate, chunks = synthesize_stream(**args)
+    except ValueError as exc:
+        return jsonify({"code": -1, "message": str(exc)}), 400
+    except Exception as exc:
+        logger.exception("synthesis failed")
+        return jsonify({"code": -1, "message": str(exc)}), 500
+
+    def events():
+        # a client that disconnects closes this generator, even before the
+        # first event is out; generation stops with it
+        try:
+            yield _sse(
+                {
+                    "type": "start",
+                    "sampleRate": sample_rate,
+                    "format": "pcm_s16le",
+                    "channels": 1,
+                    "mode": args["mode"],
+                }
+            )
+            samples = 0
+            try:
+                for index, wav in enumerate(chunks):
+                    pcm = (np.clip(wav, -1.0, 1.0) * 32767).astype("<i2")
+                    samples += len(pcm)
+                    encoded = base64.b64encode(pcm.tobytes()).decode("ascii")
+                    yield _sse(
+                        {"type": "audio", "index": index, "audioBase64": encoded}
+                    )
+            except Exception as exc:
+                yield _sse({"type": "error", "message": str(exc)})
+                return
+            yield _sse({"type": "end", "samples": samples})
+        finally:
+            chunks.close()
+
+    response = Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # closing a generator that never started skips its finally
+    response.call_on_close(chunks.close)
+    return response
+
+
 def _warmup_model():
     global _warmup_started
     if _warmup_started:
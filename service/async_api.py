@@ -0,0 +1,478 @@
+import asyncio
+import concurrent.futures
+import inspect
+import io
+import json
+import logging
+import sys
+import threading
+import traceback
+from collections.abc import Callable
+from urllib.parse import parse_qsl
+
+import lazy_imports
+import manifest_cache
+import utils
+from aipg_loopback_auth import evaluate_loopback_auth, loopback_cors_headers
+from marshmallow import ValidationError
+from utils import is_specific_file_reference
+from web_request_bodies import DownloadModelRequestBody
+
+# imported on first use, after the server is up
+httpx = lazy_imports.module("httpx")
+hf_api = lazy_imports.module("huggingface_hub.hf_api")
+hf_constants = lazy_imports.module("huggingface_hub.constants")
+hf_utils = lazy_imports.module("huggingface_hub.utils")
+model_download_adpater = lazy_imports.module("model_download_adpater")
+model_downloader = lazy_imports.module("model_downloader")
+psutil_common = lazy_imports.module("psutil._common")
+
+# The ASGI serving mode (`web_api.py --asgi`). The endpoints the model picker
+# and the download dialog fan out over dozens of repos (sizes, gating, access)
+# and the SSE download streams run as coroutines on one event loop: HF is asked
+# through one httpx.AsyncClient with at most `_HF_CONCURRENCY` requests in
+# flight however many probes come in, and a stream waits on its job
+# subscription instead of holding a thread. Every other route is handed to the
+# Flask app on a small thread pool, so both modes serve the same API behind the
+# same loopback auth and CORS rules.
+_HF_CONCURRENCY = 16
+# seconds, as (connect, read)
+_HF_TIMEOUT = (10, 30)
+_WSGI_WORKERS = 8
+
+
+class _Request:
+    method: str
+    path: str
+    args: dict[str, str]
+    # lower-cased names
+    headers: dict[str, str]
+    remote_addr: str | None
+    body: bytes
+
+    def __init__(self, scope: dict, body: bytes) -> None:
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        client = scope.get("client")
+        self.remote_addr = client[0] if client else None
+        self.body = body
+
+    def get_json(self):
+        return json.loads(self.body or b"null")
+
+    def bearer_token(self) -> str | None:
+        auth_header = self.headers.get("authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            return auth_header.split(" ")[1]
+        return None
+
+
+class AsyncApi:
+    """ASGI app serving the download endpoints natively and the rest via Flask."""
+
+    def __init__(
+        self,
+        wsgi_app,
+        auth_token: str,
+        ready: threading.Event | None = None,
+        client: "httpx.AsyncClient | None" = None,
+        on_request: Callable[[], None] | None = None,
+    ) -> None:
+        self.wsgi_app = wsgi_app
+        self.auth_token = auth_token
+        # set once the download stack is up; only /healthy is answered before
+        self.ready = ready
+        # called as each request arrives, before anything else
+        self.on_request = on_request
+        self._client = client
+        self._hf_slots = asyncio.Semaphore(_HF_CONCURRENCY)
+        self._wsgi_pool = concurrent.futures.ThreadPoolExecutor(
+            _WSGI_WORKERS, thread_name_prefix="wsgi"
+        )
+        self._routes = {
+            ("GET", "/healthy"): self.healthy,
+            ("POST", "/api/getModelSize"): self.get_model_size,
+            ("POST", "/api/isModelGated"): self.is_model_gated,
+            ("POST", "/api/isAccessGranted"): self.is_access_granted,
+            ("POST", "/api/downloadModel"): self.download_model,
+            ("POST", "/api/downloadJobs/resume"): self.resume_download_jobs,
+            ("GET", "/api/downloadJobs/events"): self.download_job_events,
+        }
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            connect, read = _HF_TIMEOUT
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=_HF_CONCURRENCY),
+            )
+        return self._client
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self.on_request is not None:
+            self.on_request()
+        request = _Request(scope, await _read_body(receive))
+        cors = loopback_cors_headers(request.headers.get("origin", ""))
+        # Use a dedicated X-AIPG-Auth header so the existing
+        # `Authorization: Bearer <hf_token>` semantics for /api/downloadModel
+        # remain intact.
+        rejection = evaluate_loopback_auth(
+            request.remote_addr,
+            request.method,
+            request.path,
+            request.headers.get("x-aipg-auth", ""),
+            expected_token=self.auth_token,
+        )
+        if rejection is not None:
+            status, message = rejection
+            if status == 403:
+                logging.warning(
+                    f"rejecting non-loopback request from {request.remote_addr} to {request.path}"
+                )
+            await _send_json(send, {"error": message}, status, cors)
+            return
+        # the browser strips custom headers from CORS preflight requests
+        if request.method == "OPTIONS":
+            await _send_response(send, 204, b"", cors)
+            return
+
+        if self.ready is not None and request.path != "/healthy":
+            await asyncio.to_thread(self.ready.wait)
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            await self._call_wsgi(request, send)
+            return
+        try:
+            result = await handler(request)
+        except Exception as ex:
+            traceback.print_exc()
+            await _send_json(send, {"error": str(ex)}, 500, cors)
+            return
+        if inspect.isasyncgen(result):
+            await _send_stream(receive, send, result, cors)
+            return
+        data, status = result if isinstance(result, tuple) else (result, 200)
+        await _send_json(send, data, status, cors)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.aclose()
+                self._wsgi_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def healthy(self, request: _Request):
+        return {"health": "OK"}
+
+    async def get_model_size(self, request: _Request):
+        items = request.get_json()
+        sizes = await asyncio.gather(
+            *(self._model_size(item["repo_id"], item["type"]) for item in items),
+            return_exceptions=True,
+        )
+        size_list = dict()
+        for item, size in zip(items, sizes):
+            if isinstance(size, Exception):
+                logging.warning(f"could not get the size of {item['repo_id']}: {size}")
+                continue
+            size_list[f"{item['repo_id']}_{item['type']}"] = psutil_common.bytes2human(
+                size, "%(value).2f%(symbol)s"
+            )
+        return {"code": 0, "message": "success", "sizeList": size_list}
+
+    async def is_model_gated(self, request: _Request):
+        items, hf_token = request.get_json()
+        repo_ids = list(dict.fromkeys(item["repo_id"] for item in items))
+        gated = await asyncio.gather(
+            *(self._is_gated(repo_id, hf_token or None) for repo_id in repo_ids)
+        )
+        return {
+            "code": 0,
+            "message": "success",
+            "gatedList": dict(zip(repo_ids, gated)),
+        }
+
+    async def is_access_granted(self, request: _Request):
+        items, hf_token = request.get_json()
+        granted = await asyncio.gather(
+            *(
+                self._is_access_granted(item["repo_id"], hf_token or None)
+                for item in items
+            )
+        )
+        return {
+            "accessList": {
+                item["repo_id"]: is_granted for item, is_granted in zip(items, granted)
+            }
+        }
+
+    async def download_model(self, request: _Request):
+        try:
+            body = DownloadModelRequestBody.Schema().load(request.get_json())
+        except ValidationError as ex:
+            return {"detail": {"json": ex.messages}, "message": "Validation error"}, 422
+        adapter = model_download_adpater.Model_Downloader_Adapter(
+            request.bearer_token(), asynchronous=True
+        )
+        try:
+            return adapter.download(body.data)
+        except Exception as e:
+            traceback.print_exc()
+            adapter.stop_download()
+            return _single(f'{{"type": "error", "err_type": "{e}"}}')
+
+    async def resume_download_jobs(self, request: _Request):
+        adapter = model_download_adpater.Model_Downloader_Adapter(
+            request.bearer_token(), asynchronous=True
+        )
+        messages = adapter.resume_all()
+        if messages is None:
+            return {"code": 1, "message": "no paused download jobs"}, 404
+        return messages
+
+    async def download_job_events(self, request: _Request):
+        job_ids = [id for id in request.args.get("ids", "").split(",") if id]
+        adapter = model_download_adpater.Model_Downloader_Adapter(asynchronous=True)
+        messages = adapter.follow(job_ids)
+        if messages is None:
+            return {"code": 1, "message": "unknown download job"}, 404
+        return messages
+
+    async def _model_info(
+        self, repo_id: str, hf_token: str | None
+    ) -> "hf_api.ModelInfo":
+        # shares the downloader's short-lived cache, in both directions
+        info = model_downloader.cached_model_info(repo_id, hf_token)
+        if info is None:
+            url = f"{hf_constants.ENDPOINT}/api/models/{utils.trim_repo(repo_id)}"
+            async with self._hf_slots:
+                response = await self.client.get(
+                    url, headers=hf_utils.build_hf_headers(token=hf_token)
+                )
+            response.raise_for_status()
+            info = hf_api.ModelInfo(**response.json())
+            model_downloader.remember_model_info(repo_id, hf_token, info)
+        return info
+
+    async def _model_size(self, repo_id: str, model_type: str) -> int:
+        # `HFPlaygroundDownloader.get_file_list`, with the revision check made
+        # on the loop; only a repo that moved is enumerated, in a worker thread
+        entry = manifest_cache.get(repo_id, model_type)
+        if entry is not None and entry.age() < manifest_cache.DEFAULT_TTL:
+            return entry.total_size
+        try:
+            sha = (await self._model_info(repo_id, None)).sha
+        except Exception as ex:
+            logging.warning(f"could not fetch the revision of {repo_id}: {ex}")
+            sha = None
+        if entry is not None and (sha is None or sha == entry.sha):
+            if sha is not None:
+                manifest_cache.mark_validated(entry)
+            return entry.total_size
+        async with self._hf_slots:
+            return await asyncio.to_thread(
+                model_downloader.HFPlaygroundDownloader().get_model_total_size,
+                repo_id,
+                model_type,
+            )
+
+    async def _is_gated(self, repo_id: str, hf_token: str | None) -> bool:
+        try:
+            info = await self._model_info(repo_id, hf_token)
+            return bool(info.gated or info.private)
+        except Exception as ex:
+            logging.warning(f"could not determine whether {repo_id} is gated: {ex}")
+            return False
+
+    async def _is_access_granted(self, repo_id: str, hf_token: str | None) -> bool:
+        # see HFPlaygroundDownloader.is_access_granted
+        headers = {}
+        if hf_token is not None:
+            headers["Authorization"] = f"Bearer {hf_token}"
+        try:
+            if is_specific_file_reference(repo_id):
+                filename = utils.extract_model_id_pathsegments(repo_id)
+            else:
+                info = await self._model_info(repo_id, hf_token)
+                filename = model_downloader.access_probe_file(repo_id, info)
+            url = model_downloader.hf_hub_url(
+                repo_id=utils.trim_repo(repo_id), filename=filename
+            )
+            async with self._hf_slots:
+                response = await self.client.head(
+                    url, headers=headers, follow_redirects=True
+                )
+        except Exception as ex:
+            logging.warning(f"could not check access to {repo_id}: {ex}")
+            return False
+        return response.status_code == 200
+
+    async def _call_wsgi(self, request: _Request, send) -> None:
+        loop = asyncio.get_running_loop()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        def run():
+            body = self.wsgi_app(_wsgi_environ(request), start_response)
+            return body, iter(body)
+
+        body, chunks = await loop.run_in_executor(self._wsgi_pool, run)
+        try:
+            # a WSGI app may defer start_response to its first chunk
+            chunk = await loop.run_in_executor(self._wsgi_pool, next, chunks, None)
+            status, headers = started
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers
+                    ],
+                }
+            )
+            while chunk is not None:
+                if chunk:
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+                chunk = await loop.run_in_executor(self._wsgi_pool, next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(body, "close"):
+                await loop.run_in_executor(self._wsgi_pool, body.close)
+
+
+async def _single(message: str):
+    yield message
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _encode_headers(headers: dict[str, str]) -> list[tuple[bytes, bytes]]:
+    return [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers.items()
+    ]
+
+
+async def _send_response(send, status: int, body: bytes, headers: dict) -> None:
+    headers = dict(headers, **{"Content-Length": str(len(body))})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": _encode_headers(headers),
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, data, status: int, headers: dict) -> None:
+    body = json.dumps(data).encode("utf-8")
+    await _send_response(
+        send, status, body, dict(headers, **{"Content-Type": "application/json"})
+    )
+
+
+async def _send_stream(receive, send, messages, headers: dict) -> None:
+    """Send an SSE stream until it ends or the client goes away."""
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": _encode_headers(
+                dict(headers, **{"Content-Type": "text/event-stream"})
+            ),
+        }
+    )
+
+    async def pump():
+        async for message in messages:
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": message.encode("utf-8"),
+                    "more_body": True,
+                }
+            )
+
+    pumping = asyncio.ensure_future(pump())
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    await asyncio.wait({pumping, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    # cancelling the pump unsubscribes the stream from its jobs
+    pumping.cancel()
+    disconnected.cancel()
+    await asyncio.gather(pumping, disconnected, return_exceptions=True)
+    await messages.aclose()
+    if pumping.cancelled():
+        return
+    if pumping.exception() is not None:
+        logging.error(f"download stream failed: {pumping.exception()}")
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _wsgi_environ(request: _Request) -> dict:
+    scope = request.scope
+    server = scope.get("server") or ("127.0.0.1", 80)
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": request.path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        # Flask repeats the loopback check against this
+        "REMOTE_ADDR": request.remote_addr or "",
+        "CONTENT_LENGTH": str(len(request.body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(request.body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length":
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
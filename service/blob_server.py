@@ -0,0 +1,89 @@
+import logging
+import os
+import re
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import blob_store
+
+# Serves the blob store to other AI Playground instances that list this one as
+# a "peer+http://..." download mirror. Only what the store holds is reachable:
+# files that passed sha256 verification, addressed by that sha256, read-only.
+# This is a separate listener from the API, which stays loopback-only, and it
+# only runs when `config.download_peer_server` is set.
+_BLOB_PATH = re.compile(r"/blobs/([0-9a-f]{64})$")
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)$")
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class _BlobHandler(BaseHTTPRequestHandler):
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool) -> None:
+        match = _BLOB_PATH.match(self.path)
+        if match is None:
+            self.send_error(404)
+            return
+        try:
+            f = open(blob_store.blob_path(match.group(1)), "rb")
+        except OSError:
+            self.send_error(404)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size
+            requested = _RANGE.match(self.headers.get("Range", ""))
+            if requested is not None:
+                start = int(requested.group(1))
+                if requested.group(2):
+                    end = min(end, int(requested.group(2)) + 1)
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            if send_body:
+                f.seek(start)
+                try:
+                    shutil.copyfileobj(
+                        _Limited(f, end - start), self.wfile, _COPY_BUFFER_SIZE
+                    )
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"blob server: {format % args}")
+
+
+class _Limited:
+    def __init__(self, f, length: int) -> None:
+        self._f = f
+        self._left = length
+
+    def read(self, size: int) -> bytes:
+        data = self._f.read(min(size, self._left))
+        self._left -= len(data)
+        return data
+
+
+def serve(address: str) -> ThreadingHTTPServer:
+    """Start serving blobs on "host:port" from a daemon thread."""
+    host, _, port = address.rpartition(":")
+    server = ThreadingHTTPServer((host, int(port)), _BlobHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"serving the blob store to peers on {address}")
+    return server
@@ -0,0 +1,112 @@
+import logging
+import os
+import shutil
+
+import file_integrity
+
+# Verified model files, stored once per sha256 and hardlinked into every backend
+# layout that uses them. A VAE or text encoder fetched for ComfyUI and again for
+# OpenVINO then occupies disk space once. A blob whose only remaining link is
+# the store's own is no longer used by any model and is removed by
+# `collect_garbage`.
+#
+# Installed model files are therefore shared: editing one in place (rather than
+# replacing it) changes every model and backend linked to the same blob. A blob
+# is rehashed before another file is linked to it, so a damaged one is replaced
+# instead of spreading, but the copies already linked to it stay damaged.
+#
+# Hardlinks only work within one volume and not on every filesystem; wherever
+# linking fails the model file simply stays an independent copy.
+_STORE_DIR = os.path.abspath("./cache/blobs")
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(_STORE_DIR, sha256[0:2], sha256)
+
+
+def adopt(file_path: str, sha256: str) -> bool:
+    """Back the verified file at `file_path` with the blob for `sha256`.
+
+    If the blob already exists and still has that hash, the file is replaced
+    by a link to it, freeing the duplicate; otherwise the file becomes the
+    blob. Returns whether the file is now linked to the store.
+    """
+    blob = blob_path(sha256)
+    try:
+        if os.path.isfile(blob):
+            if os.path.samefile(blob, file_path):
+                return True
+            if _is_intact(blob, sha256, os.path.getsize(file_path)):
+                _replace_with_link(blob, file_path)
+                return True
+            # a damaged blob must not spread to new models
+            logging.warning(f"replacing blob {blob} that no longer matches")
+            os.remove(blob)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.link(file_path, blob)
+        file_integrity.record_verified({blob: sha256})
+        return True
+    except OSError as ex:
+        logging.info(f"keeping {file_path} outside the blob store: {ex}")
+        return False
+
+
+def link_or_copy(src: str, dst: str) -> str:
+    """`shutil.copy2` that hardlinks when it can; usable as a `copy_function`."""
+    try:
+        _replace_with_link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def collect_garbage() -> int:
+    """Remove blobs no model links to any more; returns the bytes freed."""
+    freed = 0
+    if not os.path.isdir(_STORE_DIR):
+        return freed
+    for prefix in os.listdir(_STORE_DIR):
+        prefix_dir = os.path.join(_STORE_DIR, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            blob = os.path.join(prefix_dir, name)
+            try:
+                stat = os.stat(blob)
+                if stat.st_nlink > 1:
+                    continue
+                os.remove(blob)
+                freed += stat.st_size
+            except OSError as ex:
+                logging.warning(f"could not collect blob {blob}: {ex}")
+        try:
+            os.rmdir(prefix_dir)
+        except OSError:
+            pass  # still has blobs
+    if freed:
+        logging.info(f"blob store: freed {freed} bytes of unreferenced blobs")
+    return freed
+
+
+def _is_intact(blob: str, sha256: str, size: int) -> bool:
+    # the record is trusted while the blob keeps its size and mtime; past that
+    # the blob is read again
+    if file_integrity.verified_sha256(blob) == sha256:
+        return True
+    if os.path.getsize(blob) != size or file_integrity.file_sha256(blob) != sha256:
+        return False
+    file_integrity.record_verified({blob: sha256})
+    return True
+
+
+def _replace_with_link(src: str, dst: str) -> None:
+    # link next to the destination first so `dst` is never missing
+    tmp = dst + ".tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.link(src, tmp)
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        os.remove(tmp)
+        raise
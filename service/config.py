@@ -49,3 +49,18 @@ git = {
 
 # Default device
 device = "xpu"
+
+# Model downloads: bandwidth cap in bytes per second (0 = unlimited) and the
+# most connections opened to one host at a time
+download_bandwidth_limit = 0
+download_connections_per_host = 8
+
+# Sources tried in order before the original URL for every model file, e.g. a
+# share every seat mounts, a LAN cache, or another AI Playground on the LAN:
+#   "D:/model-mirror" or "file:///mnt/mirror"  a directory, laid out as <host>/<url path>
+#   "http://cache.lan:8080/hf"                 an HTTP server with the same layout
+#   "peer+http://10.0.0.5:59990"               another instance's blob store (see below)
+download_mirrors: list[str] = []
+# "host:port" to serve this machine's verified model files to other instances
+# that list it as a peer mirror; empty to serve nothing
+download_peer_server = ""
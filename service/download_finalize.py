@@ -0,0 +1,153 @@
+import errno
+import json
+import logging
+import os
+import shutil
+import time
+from hashlib import sha256
+
+import blob_store
+import file_integrity
+import install_manifest
+
+# Moving a finished download from its staging dir into the model directory.
+# The staging dir is created inside the model directory it is finalized into,
+# so every step is a rename on one filesystem: whole directories are renamed
+# wherever the destination has nothing of that name, and files replace files
+# atomically. Nothing is copied, however large the repo.
+#
+# The steps are written to a journal before the first one runs. Each step can
+# be repeated safely, so a finalize interrupted by a crash (or by a file that
+# stayed locked) is rolled forward from the journal on the next start instead
+# of leaving a half-merged tree.
+_JOURNAL_DIR = os.path.abspath("./cache/finalize")
+
+# A virus scanner or indexer may briefly hold a file just written on Windows.
+_RETRY_DELAYS = (0.5, 1, 2, 4)
+
+
+def _journal_path(staging_dir: str) -> str:
+    name = sha256(staging_dir.encode("utf-8")).hexdigest()[0:16]
+    return os.path.join(_JOURNAL_DIR, name + ".json")
+
+
+def _write_journal(journal: dict) -> None:
+    os.makedirs(_JOURNAL_DIR, exist_ok=True)
+    journal_path = _journal_path(journal["staging_dir"])
+    tmp = journal_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(journal, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, journal_path)
+
+
+def _move(src: str, dst: str) -> None:
+    """Move `src` to `dst`, merging into a destination directory of the same name.
+
+    Directories present on both sides are descended into, and a directory
+    where a file goes is removed first; everything else is one rename. A
+    `src` that no longer exists was moved before an interruption.
+    """
+    if not os.path.lexists(src):
+        return
+    if os.path.isdir(src):
+        if os.path.isdir(dst):
+            for item in os.listdir(src):
+                _move(os.path.join(src, item), os.path.join(dst, item))
+            os.rmdir(src)
+            return
+        if os.path.lexists(dst):
+            os.remove(dst)
+    elif os.path.isdir(dst) and not os.path.islink(dst):
+        # a file replacing a directory, as the `clear` step does for the top
+        # level; os.replace cannot put a file over a directory
+        shutil.rmtree(dst)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.replace(src, dst)
+    except OSError as ex:
+        if ex.errno != errno.EXDEV:
+            raise
+        # only if a mount point or junction sits inside the model directory
+        logging.warning(f"{src} and {dst} are on different volumes, copying")
+        shutil.move(src, dst)
+
+
+def _roll_forward(journal: dict) -> None:
+    for step in journal["steps"]:
+        match step:
+            case ["clear", target]:
+                # a directory an older, broken download left where a file goes
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+            case ["move", src, dst]:
+                _move(src, dst)
+            case ["remove", target]:
+                # a file the repo's new revision no longer has
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                elif os.path.lexists(target):
+                    os.remove(target)
+    if os.path.isdir(journal["staging_dir"]):
+        shutil.rmtree(journal["staging_dir"])
+    verified = journal["verified"]
+    for final_path, sha in verified.items():
+        blob_store.adopt(final_path, sha)
+    file_integrity.record_verified(verified)
+    if "installed" in journal:
+        install_manifest.record(*journal["installed"])
+
+
+def commit(
+    staging_dir: str,
+    steps: list[list[str]],
+    verified: dict[str, str],
+    installed: list | None = None,
+) -> None:
+    """Apply `steps` and drop the staging dir.
+
+    Steps are "clear" <dir>, "move" <src> <dst> and "remove" <path>.
+    `verified` maps final paths to their sha256; they are recorded and linked
+    to the blob store once in place. `installed` ([root, repo_id, revision,
+    relpaths]) is recorded in the install manifest afterwards. If the steps
+    cannot be completed the journal is kept, and `recover` finishes them on
+    the next start.
+    """
+    journal = {"staging_dir": staging_dir, "steps": steps, "verified": verified}
+    if installed is not None:
+        journal["installed"] = installed
+    _write_journal(journal)
+    for delay in (*_RETRY_DELAYS, None):
+        try:
+            _roll_forward(journal)
+            break
+        except PermissionError as ex:
+            if delay is None:
+                raise
+            logging.warning(f"finalizing {staging_dir} failed, retrying: {ex}")
+            time.sleep(delay)
+    os.remove(_journal_path(staging_dir))
+
+
+def recover() -> int:
+    """Roll forward every finalize interrupted by the last shutdown."""
+    try:
+        names = os.listdir(_JOURNAL_DIR)
+    except FileNotFoundError:
+        return 0
+    recovered = 0
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        journal_path = os.path.join(_JOURNAL_DIR, name)
+        try:
+            with open(journal_path) as f:
+                journal = json.load(f)
+            _roll_forward(journal)
+            os.remove(journal_path)
+            recovered += 1
+            logging.info(f"finished interrupted finalize of {journal['staging_dir']}")
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            logging.warning(f"could not roll forward {journal_path}: {ex}")
+    return recovered
@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import config
+import http_client
+import requests
+
+# Model files are looked for on the configured mirrors before the original
+# (Hugging Face) URL. Only where the bytes come from changes: the file list,
+# sizes and hashes of a repo still come from its Hugging Face listing, and
+# every file is verified against it (LFS files by sha256, the rest by git blob
+# id), so a download is identical whichever source served it. Callers pass
+# use_mirrors=False for a file they cannot verify. Peers are content-addressed
+# and are only asked for files with a known sha256.
+#
+# Mirrors never see the Hugging Face token. A file that failed verification is
+# fetched again from the origin only.
+_PEER_PREFIX = "peer+"
+
+# LAN sources should answer quickly; one that does not is skipped for a while
+# instead of costing a connect timeout per file.
+_MIRROR_TIMEOUT = (3, 60)
+_SKIP_UNREACHABLE_FOR = 60
+
+_unreachable: dict[str, float] = dict()
+_unreachable_lock = threading.Lock()
+
+
+def candidates(url: str, sha256: str | None = None) -> list[tuple[str, str]]:
+    """(mirror, url) for every configured mirror that may have `url`, in order."""
+    parts = urlsplit(url)
+    now = time.monotonic()
+    result = []
+    for mirror in config.download_mirrors:
+        with _unreachable_lock:
+            if _unreachable.get(mirror, 0) > now:
+                continue
+        if mirror.startswith(_PEER_PREFIX):
+            if sha256 is not None:
+                base = mirror[len(_PEER_PREFIX) :].rstrip("/")
+                result.append((mirror, f"{base}/blobs/{sha256}"))
+            continue
+        base = mirror if "://" in mirror else Path(os.path.abspath(mirror)).as_uri()
+        result.append((mirror, f"{base.rstrip('/')}/{parts.netloc}{parts.path}"))
+    return result
+
+
+def get(
+    url: str,
+    sha256: str | None = None,
+    accept=lambda status: status == 200,
+    use_mirrors: bool = True,
+    headers: dict | None = None,
+    **kwargs,
+) -> requests.Response:
+    """GET `url` from the first mirror whose status passes `accept`, else from `url`."""
+    headers = headers or dict()
+    if use_mirrors:
+        # only the range travels to a mirror, never the Authorization header
+        mirror_headers = {k: v for k, v in headers.items() if k == "Range"}
+        mirror_kwargs = dict(kwargs, timeout=_MIRROR_TIMEOUT)
+        for mirror, mirror_url in candidates(url, sha256):
+            try:
+                response = http_client.get(
+                    mirror_url, headers=mirror_headers, **mirror_kwargs
+                )
+            except requests.exceptions.RequestException as ex:
+                logging.warning(f"mirror {mirror} is unreachable: {ex}")
+                with _unreachable_lock:
+                    _unreachable[mirror] = time.monotonic() + _SKIP_UNREACHABLE_FOR
+                continue
+            if accept(response.status_code):
+                return response
+            response.close()
+    return http_client.get(url, headers=headers, **kwargs)
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable
+
+# Progress is pushed by the download threads as bytes arrive instead of being
+# polled. A meter turns the running byte count into samples at most every
+# `_SAMPLE_INTERVAL`, with the speed smoothed over roughly the last few seconds
+# so short stalls do not make the ETA jump around.
+_SAMPLE_INTERVAL = 0.25
+_SPEED_HALF_LIFE = 2.0
+
+# Subscribers get at most this many progress frames per second per job; a
+# client that reads slower only ever sees the latest one.
+_PUBLISH_INTERVAL = 0.5
+
+
+class Progress:
+    downloaded: int
+    total: int
+    # smoothed bytes per second
+    speed: float
+    # seconds left at the current speed, None while it is unknown
+    eta: float | None
+
+    def __init__(
+        self, downloaded: int, total: int, speed: float, eta: float | None
+    ) -> None:
+        self.downloaded = downloaded
+        self.total = total
+        self.speed = speed
+        self.eta = eta
+
+    @property
+    def percent(self) -> float:
+        return round(self.downloaded / self.total * 100, 2) if self.total else 0.0
+
+
+class ProgressMeter:
+    """Samples a byte counter that download threads keep advancing."""
+
+    def __init__(self, on_sample: Callable[[Progress], None]) -> None:
+        self.on_sample = on_sample
+        self._lock = threading.Lock()
+        self._last_time = time.monotonic()
+        self._last_downloaded = None
+        self._speed = 0.0
+
+    def update(self, downloaded: int, total: int, force: bool = False) -> None:
+        """Report the current counters; cheap unless a sample is due."""
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._last_time
+            if self._last_downloaded is None:
+                # the first report is the resume point, not throughput
+                self._last_downloaded = downloaded
+                self._last_time = now
+            elif elapsed >= _SAMPLE_INTERVAL:
+                rate = max(0, downloaded - self._last_downloaded) / elapsed
+                weight = 0.5 ** (elapsed / _SPEED_HALF_LIFE)
+                self._speed = self._speed * weight + rate * (1 - weight)
+                self._last_downloaded = downloaded
+                self._last_time = now
+            elif not force:
+                return
+            speed = self._speed
+        remaining = max(0, total - downloaded)
+        eta = remaining / speed if speed > 0 else (0.0 if remaining == 0 else None)
+        self.on_sample(Progress(downloaded, total, speed, eta))
+
+
+class Subscription:
+    """What one client has not been sent yet for the keys it follows."""
+
+    keys: set
+
+    def __init__(self, hub: "ProgressHub", keys: Iterable) -> None:
+        self.hub = hub
+        self.keys = set(keys)
+        self._events = deque()
+        self._latest = dict()
+        self._last_publish = 0.0
+        # set while an async subscriber waits; called with the hub's lock held
+        self._waker: Callable[[], None] | None = None
+
+    def wait(self, timeout: float | None = None) -> list:
+        """Block until something happens; return the messages to send.
+
+        Events come out in order. Progress frames are coalesced to the latest
+        one per key and released at most every `_PUBLISH_INTERVAL`; a frame
+        is dropped if an event for the same key is already waiting.
+        """
+        with self.hub._cond:
+            must_wait, timeout = self._wait_time(timeout)
+            if must_wait:
+                self.hub._cond.wait(timeout)
+            return self._take()
+
+    async def wait_async(self, timeout: float | None = None) -> list:
+        """`wait` for a subscriber on an event loop, without holding a thread."""
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        with self.hub._cond:
+            must_wait, timeout = self._wait_time(timeout)
+            if must_wait:
+                self._waker = lambda: loop.call_soon_threadsafe(woken.set)
+        if must_wait:
+            try:
+                await asyncio.wait_for(woken.wait(), timeout)
+            except TimeoutError:
+                pass
+            finally:
+                with self.hub._cond:
+                    self._waker = None
+        with self.hub._cond:
+            return self._take()
+
+    def _wait_time(self, timeout: float | None) -> tuple[bool, float | None]:
+        if self._events:
+            return False, None
+        delay = self._last_publish + _PUBLISH_INTERVAL - time.monotonic()
+        if self._latest and delay <= 0:
+            return False, None
+        if self._latest:
+            timeout = delay if timeout is None else min(timeout, delay)
+        return True, timeout
+
+    def _take(self) -> list:
+        messages = []
+        now = time.monotonic()
+        if self._latest and (
+            self._events or now - self._last_publish >= _PUBLISH_INTERVAL
+        ):
+            messages.extend(self._latest.values())
+            self._latest.clear()
+            self._last_publish = now
+        messages.extend(self._events)
+        self._events.clear()
+        return messages
+
+
+class ProgressHub:
+    """Fans progress and events for keys (jobs) out to any number of subscribers."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._subscriptions: list[Subscription] = []
+
+    def subscribe(self, keys: Iterable) -> Subscription:
+        with self._cond:
+            subscription = Subscription(self, keys)
+            self._subscriptions.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._cond:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def is_subscribed(self, key) -> bool:
+        with self._cond:
+            return any(key in s.keys for s in self._subscriptions)
+
+    def progress(self, key, msg) -> None:
+        """Replace the pending progress frame for `key`."""
+        with self._cond:
+            for subscription in self._subscriptions:
+                if key in subscription.keys:
+                    subscription._latest[key] = msg
+            self._notify_all()
+
+    def event(self, key, msg) -> None:
+        """Queue a message every subscriber of `key` must receive."""
+        with self._cond:
+            for subscription in self._subscriptions:
+                if key in subscription.keys:
+                    subscription._latest.pop(key, None)
+                    subscription._events.append(msg)
+            self._notify_all()
+
+    def wake(self) -> None:
+        """Let waiting subscribers re-check their jobs' states."""
+        with self._cond:
+            self._notify_all()
+
+    def _notify_all(self) -> None:
+        self._cond.notify_all()
+        for subscription in self._subscriptions:
+            if subscription._waker is not None:
+                subscription._waker()
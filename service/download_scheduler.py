@@ -0,0 +1,623 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import utils
+from download_progress import Progress, ProgressHub, Subscription
+from huggingface_hub.errors import RepositoryNotFoundError
+from model_downloader import (
+    DownloadException,
+    HFFileItem,
+    HFPlaygroundDownloader,
+    NotEnoughDiskSpaceException,
+)
+from psutil._common import bytes2human
+
+# Repo downloads queued by every /api/downloadModel request. Jobs are persisted
+# so that a backend restart picks up where it stopped. Along with each job the
+# file listing it settled on and the files already verified are kept, so a
+# resumed job neither lists the repo again nor re-hashes finished files; the
+# bytes of unfinished files are tracked by the partial files themselves (and
+# their segment sidecars) in the repo's tmp dir.
+_JOBS_PATH = os.path.abspath("./cache/download-jobs.json")
+
+# A few repos download side by side so a preset is not held up by its slowest
+# repo, and the connections are split between the ones running so the total
+# stays fixed: a lone repo gets all of them.
+MAX_RUNNING_JOBS = 2
+CONNECTION_BUDGET = 8
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+_FINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class DownloadJob:
+    id: str
+    repo_id: str
+    type: str
+    backend: str
+    model_path: str
+    priority: int
+    state: str
+    # sequence number; breaks priority ties first come, first served
+    seq: int
+    hf_token: str | None
+    # jobs restored after a restart have lost their token and wait for one
+    needs_token: bool
+    # the listing the first run settled on (`HFFileItem` fields), and relpath
+    # -> sha256 of the files that passed verification
+    files: list[dict] | None
+    total_size: int
+    verified: dict[str, str]
+    error: dict | None
+    downloader: HFPlaygroundDownloader | None
+
+    def __init__(
+        self,
+        id: str,
+        repo_id: str,
+        type: str,
+        backend: str,
+        model_path: str,
+        priority: int = 0,
+        state: str = QUEUED,
+        seq: int = 0,
+        hf_token: str | None = None,
+        needs_token: bool = False,
+        files: list[dict] | None = None,
+        verified: dict[str, str] | None = None,
+    ) -> None:
+        self.id = id
+        self.repo_id = repo_id
+        self.type = type
+        self.backend = backend
+        self.model_path = model_path
+        self.priority = priority
+        self.state = state
+        self.seq = seq
+        self.hf_token = hf_token
+        self.needs_token = needs_token
+        self.files = files
+        self.total_size = sum(file["size"] for file in files or [])
+        self.verified = verified or dict()
+        self.error = None
+        self.downloader = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "repo_id": self.repo_id,
+            "type": self.type,
+            "backend": self.backend,
+            "model_path": self.model_path,
+            "priority": self.priority,
+            "state": self.state,
+            "seq": self.seq,
+            "needs_token": self.needs_token or self.hf_token is not None,
+            "total_size": self.total_size,
+            "files_verified": len(self.verified),
+        }
+
+    def to_record(self) -> dict:
+        """`to_dict` plus what a resumed run needs, as written to the journal."""
+        return dict(self.to_dict(), files=self.files, verified=self.verified)
+
+
+class JobSubscription:
+    """The SSE messages of a set of jobs, in the shape the WebUI consumes."""
+
+    job_ids: set[str]
+    # open the stream with a `download_jobs` message naming the jobs, so the
+    # client that asked for them can stop exactly those
+    announce: bool
+
+    def __init__(
+        self, scheduler: "DownloadScheduler", subscription: Subscription
+    ) -> None:
+        self.scheduler = scheduler
+        self.subscription = subscription
+        self.job_ids = subscription.keys
+        self.announce = False
+
+    def messages(self):
+        """Yield messages until every job is done; `allComplete` if all succeeded.
+
+        An `error` ends the stream and cancels the jobs still unfinished.
+        """
+        try:
+            if self.announce:
+                yield self._announcement()
+            while True:
+                states, timeout = self._poll()
+                out, done = self._step(states, self.subscription.wait(timeout))
+                yield from out
+                if done:
+                    return
+        finally:
+            self.scheduler.unsubscribe(self)
+
+    async def messages_async(self):
+        """`messages` for the ASGI mode: waits on the event loop, not a thread."""
+        try:
+            if self.announce:
+                yield self._announcement()
+            while True:
+                states, timeout = self._poll()
+                out, done = self._step(
+                    states, await self.subscription.wait_async(timeout)
+                )
+                for msg in out:
+                    yield msg
+                if done:
+                    return
+        finally:
+            self.scheduler.unsubscribe(self)
+
+    def _announcement(self) -> dict:
+        return {"type": "download_jobs", "job_ids": sorted(self.job_ids)}
+
+    def _poll(self) -> tuple[list[str], float]:
+        # states are read before waiting; a job that stops without a message
+        # (pause, cancel) is noticed by the timeout
+        states = self.scheduler.states(self.job_ids)
+        finished = all(state in _FINAL_STATES for state in states)
+        return states, 0 if finished else 1.0
+
+    def _step(self, states: list[str], msgs: list[dict]) -> tuple[list[dict], bool]:
+        """The messages to send for one wait, and whether the stream ends there."""
+        out = []
+        for msg in msgs:
+            out.append(_format(msg))
+            if msg["type"] == "error":
+                self._cancel_rest()
+                return out, True
+        if all(state in _FINAL_STATES for state in states):
+            if all(state == COMPLETED for state in states):
+                out.append({"type": "allComplete"})
+            return out, True
+        return out, False
+
+    def _cancel_rest(self) -> None:
+        # the stream ends on the first error, as a request's download always
+        # did; its other jobs are cancelled rather than left running unwatched
+        for job_id in self.job_ids:
+            self.scheduler.cancel(job_id)
+
+
+class DownloadScheduler:
+    jobs: dict[str, DownloadJob]
+
+    def __init__(self, jobs_path: str = _JOBS_PATH) -> None:
+        self.jobs_path = jobs_path
+        self.jobs = dict()
+        self._lock = threading.RLock()
+        self._hub = ProgressHub()
+        self._seq = 0
+        # jobs whose download threads are alive, including paused or cancelled
+        # ones that are still winding down
+        self._active = 0
+        self._restore()
+
+    def submit(self, items: list, hf_token: str | None = None) -> list[DownloadJob]:
+        """Queue one job per `DownloadModelData` item.
+
+        A repo that is already queued or downloading to the same place is not
+        queued twice; its existing job is returned instead.
+        """
+        with self._lock:
+            jobs = self._add(items, hf_token)
+            self._start()
+            return jobs
+
+    def submit_followed(
+        self, items: list, hf_token: str | None = None
+    ) -> JobSubscription:
+        """`submit`, and follow the jobs from before any of them can start.
+
+        A job can end as soon as it starts (everything already installed, no
+        network, no disk space); a subscription made after `submit` returned
+        would miss its final event, and the finished job would be gone.
+        """
+        with self._lock:
+            subscription = self.subscribe(self._add(items, hf_token))
+            self._start()
+            return subscription
+
+    def _add(self, items: list, hf_token: str | None) -> list[DownloadJob]:
+        submitted = []
+        for item in items:
+            job = self._find_active(item.repo_id, item.model_path)
+            if job is None:
+                self._seq += 1
+                job = DownloadJob(
+                    uuid.uuid4().hex,
+                    item.repo_id,
+                    item.type,
+                    item.backend,
+                    item.model_path,
+                    priority=item.priority or 0,
+                    seq=self._seq,
+                    hf_token=hf_token,
+                )
+                self.jobs[job.id] = job
+            elif job.state == PAUSED:
+                self._resume(job, hf_token)
+            submitted.append(job)
+        return submitted
+
+    def _start(self) -> None:
+        self._save()
+        self._dispatch()
+
+    def pause(self, job_id: str) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state not in (QUEUED, RUNNING):
+                return False
+            job.state = PAUSED
+            if job.downloader is not None:
+                job.downloader.stop_download()
+            self._save()
+            self._stopped(job, "download_paused")
+            return True
+
+    def resume(self, job_id: str, hf_token: str | None = None) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != PAUSED:
+                return False
+            self._resume(job, hf_token)
+            self._save()
+            self._dispatch()
+            return True
+
+    def resume_all(self, hf_token: str | None = None) -> list[DownloadJob]:
+        """Resume every paused job, e.g. the ones restored after a restart."""
+        with self._lock:
+            jobs = self._resume_paused(hf_token)
+            self._start()
+            return jobs
+
+    def resume_all_followed(
+        self, hf_token: str | None = None
+    ) -> JobSubscription | None:
+        """`resume_all`, followed as in `submit_followed`; None if none was paused."""
+        with self._lock:
+            jobs = self._resume_paused(hf_token)
+            if not jobs:
+                return None
+            subscription = self.subscribe(jobs)
+            self._start()
+            return subscription
+
+    def _resume_paused(self, hf_token: str | None) -> list[DownloadJob]:
+        jobs = [job for job in self.jobs.values() if job.state == PAUSED]
+        for job in jobs:
+            self._resume(job, hf_token)
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a job; its partial files stay in the tmp dir for a later retry."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state in _FINAL_STATES:
+                return False
+            job.state = CANCELLED
+            if job.downloader is not None:
+                job.downloader.stop_download()
+            self._stopped(job, "download_cancelled")
+            self._finish(job)
+            return True
+
+    def cancel_all(self) -> None:
+        with self._lock:
+            for job_id in list(self.jobs):
+                self.cancel(job_id)
+
+    def set_priority(self, job_id: str, priority: int) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state in _FINAL_STATES:
+                return False
+            job.priority = priority
+            self._save()
+            self._dispatch()
+            return True
+
+    def list_jobs(self) -> list[dict]:
+        with self._lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def states(self, job_ids) -> list[str]:
+        with self._lock:
+            return [self.jobs[job_id].state for job_id in job_ids]
+
+    def subscribe(self, jobs: list[DownloadJob]) -> JobSubscription:
+        """Follow `jobs`; any number of clients may follow the same job."""
+        with self._lock:
+            return JobSubscription(self, self._hub.subscribe(job.id for job in jobs))
+
+    def subscribe_ids(self, job_ids: list[str]) -> JobSubscription | None:
+        with self._lock:
+            jobs = [self.jobs.get(job_id) for job_id in job_ids]
+            if not jobs or None in jobs:
+                return None
+            return self.subscribe(jobs)
+
+    def unsubscribe(self, subscription: JobSubscription) -> None:
+        with self._lock:
+            self._hub.unsubscribe(subscription.subscription)
+            self._drop_finished()
+
+    def _find_active(self, repo_id: str, model_path: str) -> DownloadJob | None:
+        for job in self.jobs.values():
+            if (
+                job.repo_id == repo_id
+                and job.model_path == model_path
+                and job.state not in _FINAL_STATES
+            ):
+                return job
+        return None
+
+    def _resume(self, job: DownloadJob, hf_token: str | None) -> None:
+        if hf_token is not None:
+            job.hf_token = hf_token
+        job.needs_token = False
+        job.state = QUEUED
+
+    def _dispatch(self) -> None:
+        queued = sorted(
+            (
+                job
+                for job in self.jobs.values()
+                # a resumed job whose previous run is still stopping waits
+                if job.state == QUEUED and job.downloader is None
+            ),
+            key=lambda job: (-job.priority, job.seq),
+        )
+        for job in queued[: max(0, MAX_RUNNING_JOBS - self._active)]:
+            self._active += 1
+            job.state = RUNNING
+            # assigned before the thread starts so pause/cancel can reach it
+            job.downloader = HFPlaygroundDownloader(job.hf_token)
+            job.downloader.on_download_progress = lambda repo_id, progress, job=job: (
+                self._hub.progress(
+                    job.id,
+                    {
+                        "type": "progress",
+                        "job_id": job.id,
+                        "repo_id": repo_id,
+                        "progress": progress,
+                    },
+                )
+            )
+            job.downloader.on_file_list = lambda files, total_size, job=job: (
+                self._record_files(job, files, total_size)
+            )
+            job.downloader.on_file_verified = lambda relpath, sha256, job=job: (
+                self._record_verified(job, relpath, sha256)
+            )
+            job.downloader.on_shard_completed = (
+                lambda relpath, shard, shard_count, staged_path, job=job: (
+                    self._hub.event(
+                        job.id,
+                        {
+                            "type": "download_shard_completed",
+                            "job_id": job.id,
+                            "repo_id": job.repo_id,
+                            "file": relpath,
+                            "shard": shard,
+                            "shard_count": shard_count,
+                            # readable until the job's download_model_completed,
+                            # when the shards are moved into the model directory
+                            "staged_path": staged_path,
+                        },
+                    )
+                )
+            )
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        self._share_connections()
+
+    def _share_connections(self) -> None:
+        # every download starts CONNECTION_BUDGET threads; the limit decides
+        # how many of them may hold a connection
+        running = [
+            job
+            for job in self.jobs.values()
+            if job.state == RUNNING and job.downloader is not None
+        ]
+        share, extra = divmod(CONNECTION_BUDGET, max(1, len(running)))
+        for index, job in enumerate(running):
+            job.downloader.connection_limit = max(1, share + (index < extra))
+
+    def _record_files(
+        self, job: DownloadJob, files: list[HFFileItem], total_size: int
+    ) -> None:
+        with self._lock:
+            job.files = [vars(file) for file in files]
+            job.total_size = total_size
+            self._save()
+
+    def _record_verified(self, job: DownloadJob, relpath: str, sha256: str) -> None:
+        with self._lock:
+            job.verified[relpath] = sha256
+            self._save()
+
+    def _run(self, job: DownloadJob) -> None:
+        downloader = job.downloader
+        error = None
+        try:
+            downloader.download(
+                job.repo_id,
+                job.type,
+                job.backend,
+                job.model_path,
+                thread_count=CONNECTION_BUDGET,
+                file_list=None
+                if job.files is None
+                else [HFFileItem(**file) for file in job.files],
+                verified=dict(job.verified),
+            )
+            error = downloader.error
+            if error is None and not downloader.download_stop:
+                # Copy faceswap/facerestore models to ComfyUI directory after download completes
+                if job.backend == "comfyui" and job.type in ("faceswap", "facerestore"):
+                    utils.copy_faceswap_facerestore_to_comfyui(
+                        job.type, job.repo_id, job.model_path
+                    )
+        except Exception as ex:
+            error = ex
+        with self._lock:
+            self._active -= 1
+            job.downloader = None
+            if error is not None:
+                logging.error(f"download of {job.repo_id} failed: {error!s}")
+                job.state = FAILED
+                job.error = dict(error_message(error), job_id=job.id)
+                self._hub.event(job.id, job.error)
+            elif not downloader.download_stop:
+                job.state = COMPLETED
+                self._hub.event(
+                    job.id,
+                    {
+                        "type": "download_model_completed",
+                        "job_id": job.id,
+                        "repo_id": job.repo_id,
+                    },
+                )
+            elif job.state == RUNNING:
+                # stopped from outside the scheduler
+                job.state = CANCELLED
+                self._stopped(job, "download_cancelled")
+            if job.state in _FINAL_STATES:
+                self._finish(job)
+            else:
+                self._save()
+            self._dispatch()
+
+    def _stopped(self, job: DownloadJob, type: str) -> None:
+        # without it a stream would just end, which clients take for success
+        self._hub.event(
+            job.id, {"type": type, "job_id": job.id, "repo_id": job.repo_id}
+        )
+
+    def _finish(self, job: DownloadJob) -> None:
+        self._save()
+        self._hub.wake()
+        self._drop_finished()
+
+    def _drop_finished(self) -> None:
+        # finished jobs are only kept for the subscribers still reading them
+        for other in list(self.jobs.values()):
+            if other.state in _FINAL_STATES and not self._hub.is_subscribed(other.id):
+                del self.jobs[other.id]
+
+    def _save(self) -> None:
+        jobs = [
+            job.to_record()
+            for job in self.jobs.values()
+            if job.state not in _FINAL_STATES
+        ]
+        try:
+            os.makedirs(os.path.dirname(self.jobs_path), exist_ok=True)
+            tmp = self.jobs_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"saved_at": time.time(), "jobs": jobs}, f)
+            os.replace(tmp, self.jobs_path)
+        except OSError as ex:
+            logging.warning(f"could not persist download jobs {self.jobs_path}: {ex}")
+
+    def _restore(self) -> None:
+        try:
+            with open(self.jobs_path) as f:
+                saved = json.load(f)["jobs"]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as ex:
+            logging.warning(f"ignoring unreadable {self.jobs_path}: {ex}")
+            return
+        for data in saved:
+            job = DownloadJob(
+                data["id"],
+                data["repo_id"],
+                data["type"],
+                data["backend"],
+                data["model_path"],
+                priority=data["priority"],
+                # whatever was running when the process stopped runs again,
+                # unless it needs the HF token, which is never written to disk
+                state=PAUSED
+                if data["state"] == PAUSED or data["needs_token"]
+                else QUEUED,
+                seq=data["seq"],
+                needs_token=data["needs_token"],
+                files=data.get("files"),
+                verified=data.get("verified"),
+            )
+            self.jobs[job.id] = job
+            self._seq = max(self._seq, job.seq)
+        if self.jobs:
+            logging.info(f"restored {len(self.jobs)} download jobs")
+            with self._lock:
+                self._dispatch()
+
+
+def _format(msg: dict) -> dict:
+    if msg["type"] != "progress":
+        return msg
+    progress: Progress = msg["progress"]
+    # the human readable strings the WebUI shows, plus the raw numbers
+    return {
+        "type": "download_model_progress",
+        "job_id": msg["job_id"],
+        "repo_id": msg["repo_id"],
+        "download_size": bytes2human(progress.downloaded),
+        "total_size": bytes2human(progress.total),
+        "percent": progress.percent,
+        "speed": f"{bytes2human(int(progress.speed))}/s",
+        "downloaded_bytes": progress.downloaded,
+        "total_bytes": progress.total,
+        "speed_bytes": round(progress.speed),
+        "eta_seconds": None if progress.eta is None else round(progress.eta, 1),
+    }
+
+
+def error_message(ex: Exception) -> dict:
+    if (
+        isinstance(ex, NotImplementedError)
+        and ex.__str__() == "Access to repositories lists is not implemented."
+    ) or isinstance(ex, RepositoryNotFoundError):
+        return {"type": "error", "err_type": "repositories_not_found"}
+    elif isinstance(ex, NotEnoughDiskSpaceException):
+        return {
+            "type": "error",
+            "err_type": "not_enough_disk_space",
+            "requires_space": bytes2human(ex.requires_space),
+            "free_space": bytes2human(ex.free_space),
+        }
+    elif isinstance(ex, DownloadException):
+        return {"type": "error", "err_type": "download_exception"}
+    elif isinstance(ex, RuntimeError):
+        return {"type": "error", "err_type": "runtime_error"}
+    else:
+        return {"type": "error", "err_type": "unknown_exception"}
+
+
+_scheduler: DownloadScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> DownloadScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DownloadScheduler()
+        return _scheduler
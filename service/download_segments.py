@@ -0,0 +1,194 @@
+import errno
+import json
+import logging
+import os
+from threading import Lock
+
+# Resume state lives next to the partial file. Its presence is what marks a
+# segmented file as incomplete: the target itself is preallocated to its final
+# size, so the size comparison used for plain files cannot tell.
+SEGMENTS_SUFFIX = ".aipg-segments"
+
+# Persist segment progress at most this often per file; a crash loses at most
+# this much already-downloaded data, which is simply fetched again.
+_SAVE_INTERVAL = 32 * 1024 * 1024
+
+
+def preallocate(f, size: int) -> None:
+    """Give the open file `f` its final size, with the disk blocks reserved.
+
+    A plain truncate leaves a sparse file on most POSIX filesystems, which
+    fragments as the ranges fill in and can still run out of space near the
+    end. posix_fallocate claims the blocks up front instead and raises ENOSPC
+    right away. On Windows, extending an NTFS file already allocates it.
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except OSError as ex:
+            if ex.errno == errno.ENOSPC:
+                raise
+            # not supported by this filesystem; a sparse file still works
+    f.truncate(size)
+
+
+class FileSegment:
+    start: int
+    end: int
+    written: int
+
+    def __init__(self, start: int, end: int, written: int = 0) -> None:
+        self.start = start
+        self.end = end
+        self.written = written
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+    @property
+    def position(self) -> int:
+        """Absolute file offset the next byte of this segment is written to."""
+        return self.start + self.written
+
+    @property
+    def done(self) -> bool:
+        return self.written >= self.length
+
+
+class SegmentedFile:
+    """A single file downloaded as several byte ranges on separate connections.
+
+    Every segment tracks how much of its range is on disk, so an interrupted
+    download resumes each range where it stopped instead of restarting the file.
+    The state is kept in a small JSON sidecar (`<file>.aipg-segments`) that is
+    removed once every segment is complete.
+    """
+
+    path: str
+    size: int
+    segments: list[FileSegment]
+
+    def __init__(self, path: str, size: int, segments: list[FileSegment]) -> None:
+        self.path = path
+        self.size = size
+        self.segments = segments
+        self._lock = Lock()
+        self._allocated = False
+        self._finished = False
+        self._unsaved = 0
+
+    @property
+    def sidecar_path(self) -> str:
+        return self.path + SEGMENTS_SUFFIX
+
+    @classmethod
+    def open(cls, path: str, size: int, segment_size: int) -> "SegmentedFile | None":
+        """Return the resume state for `path`, or None if the file is complete.
+
+        Reads an existing sidecar when there is one. A partial file without a
+        sidecar was written by the sequential downloader, so its bytes are a
+        contiguous prefix and are credited to the leading segments. Nothing is
+        written to disk here; see `ensure_allocated`.
+        """
+        sidecar = path + SEGMENTS_SUFFIX
+        if os.path.exists(sidecar):
+            state = cls._load(path, size)
+            if state is not None:
+                if state.finish_if_complete():
+                    return None
+                return state
+            logging.warning(f"discarding unusable segment state {sidecar}")
+            os.remove(sidecar)
+            prefix = 0
+        elif os.path.exists(path):
+            prefix = os.path.getsize(path)
+            if prefix >= size:
+                return None
+        else:
+            prefix = 0
+
+        segments = []
+        for start in range(0, size, segment_size):
+            end = min(start + segment_size, size)
+            written = min(max(prefix - start, 0), end - start)
+            segments.append(FileSegment(start, end, written))
+        return cls(path, size, segments)
+
+    @classmethod
+    def _load(cls, path: str, size: int) -> "SegmentedFile | None":
+        try:
+            with open(path + SEGMENTS_SUFFIX) as f:
+                data = json.load(f)
+            if data["size"] != size or not os.path.exists(path):
+                return None
+            segments = [FileSegment(*item) for item in data["segments"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cls(path, size, segments)
+
+    def downloaded_size(self) -> int:
+        return sum(min(segment.written, segment.length) for segment in self.segments)
+
+    def pending_segments(self) -> list[FileSegment]:
+        return [segment for segment in self.segments if not segment.done]
+
+    def ensure_allocated(self) -> None:
+        """Preallocate the target at its final size and write the sidecar.
+
+        Deferred until the download actually starts, so that merely planning
+        one (e.g. for an access check) touches no files. Reserving blocks that
+        are already allocated is cheap, so resumed files go through it too.
+        """
+        with self._lock:
+            if self._allocated:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Sidecar first: a full-size target without one reads as complete.
+            self._save()
+            mode = "r+b" if os.path.exists(self.path) else "wb"
+            with open(self.path, mode) as f:
+                preallocate(f, self.size)
+            self._allocated = True
+
+    def advance(self, segment: FileSegment, length: int) -> None:
+        with self._lock:
+            segment.written += length
+            self._unsaved += length
+            if segment.done or self._unsaved >= _SAVE_INTERVAL:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            if self._allocated and not self._finished:
+                self._save()
+
+    def finish_if_complete(self) -> bool:
+        """Drop the sidecar once every segment is on disk.
+
+        True only for the call that completed the file, so exactly one of the
+        threads sharing it goes on to verify it.
+        """
+        with self._lock:
+            if self._finished or any(not s.done for s in self.segments):
+                return False
+            if os.path.exists(self.sidecar_path):
+                os.remove(self.sidecar_path)
+            self._finished = True
+            return True
+
+    def _save(self) -> None:
+        tmp = self.sidecar_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "size": self.size,
+                    "segments": [
+                        [segment.start, segment.end, segment.written]
+                        for segment in self.segments
+                    ],
+                },
+                f,
+            )
+        os.replace(tmp, self.sidecar_path)
+        self._unsaved = 0
@@ -0,0 +1,84 @@
+import time
+from collections.abc import Callable
+
+import http_client
+import requests
+
+# Reads start at 1 MB and grow up to 8 MB while the link keeps filling the
+# buffer quickly, so a fast link costs a handful of Python iterations per
+# second instead of one per 4 KB chunk, and a slow one still reports progress
+# about every quarter second.
+_MIN_BUFFER_SIZE = 1024 * 1024
+_MAX_BUFFER_SIZE = 8 * 1024 * 1024
+_TARGET_READ_SECONDS = 0.25
+
+
+def write_fully(fw, data) -> int:
+    """Write all of `data` to a file that may accept it in parts (unbuffered)."""
+    view = memoryview(data)
+    while view:
+        view = view[fw.write(view) :]
+    return len(data)
+
+
+def stream_to_file(
+    response: requests.Response,
+    fw,
+    limit: int | None = None,
+    on_data: Callable[[memoryview], None] | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> int:
+    """Copy a streamed response body into `fw`; returns the bytes written.
+
+    The body is read straight from the connection into one reused buffer and
+    written from a view of it. `on_data` gets a view of every buffer once it is
+    on its way to disk (valid only during the call), which is also the
+    granularity progress is counted at. At most `limit` bytes are copied when
+    it is given. Every buffer is charged to the shared bandwidth cap.
+    """
+    encoding = response.headers.get("Content-Encoding", "identity").lower()
+    if encoding != "identity":
+        # requests reads the raw stream undecoded; let it decompress
+        return _stream_decoded(response, fw, limit, on_data, should_stop)
+
+    raw = response.raw
+    buffer = memoryview(bytearray(_MAX_BUFFER_SIZE))
+    read_size = _MIN_BUFFER_SIZE
+    copied = 0
+    while limit is None or copied < limit:
+        wanted = read_size if limit is None else min(read_size, limit - copied)
+        if http_client.bandwidth.rate:
+            # under a cap, keep each read to about a quarter second of budget
+            wanted = min(wanted, max(_MIN_BUFFER_SIZE, http_client.bandwidth.rate // 4))
+        started = time.monotonic()
+        length = raw.readinto(buffer[:wanted])
+        if not length:
+            break
+        elapsed = time.monotonic() - started
+        write_fully(fw, buffer[:length])
+        copied += length
+        http_client.bandwidth.consume(length)
+        if on_data is not None:
+            on_data(buffer[:length])
+        if should_stop is not None and should_stop():
+            break
+        if length == wanted and elapsed < _TARGET_READ_SECONDS / 2:
+            read_size = min(read_size * 2, _MAX_BUFFER_SIZE)
+        elif elapsed > _TARGET_READ_SECONDS * 2:
+            read_size = max(read_size // 2, _MIN_BUFFER_SIZE)
+    return copied
+
+
+def _stream_decoded(response, fw, limit, on_data, should_stop) -> int:
+    copied = 0
+    for data in response.iter_content(chunk_size=_MIN_BUFFER_SIZE):
+        if limit is not None and len(data) > limit - copied:
+            data = data[: limit - copied]
+        write_fully(fw, data)
+        copied += len(data)
+        http_client.bandwidth.consume(len(data))
+        if on_data is not None:
+            on_data(memoryview(data))
+        if (should_stop is not None and should_stop()) or copied == limit:
+            break
+    return copied
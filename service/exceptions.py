@@ -5,6 +5,31 @@ class DownloadException(Exception):
         super().__init__(f"download {url} failed")
 
 
+class FileVerificationError(DownloadException):
+    """Raised when a downloaded file still does not match its LFS sha256 (or
+    git blob id) after being downloaded again, so retrying the transfer will
+    not help."""
+
+    def __init__(self, url: str, expected: str, actual: str, algorithm="sha256"):
+        self.url = url
+        self.expected = expected
+        self.actual = actual
+        Exception.__init__(
+            self,
+            f"download {url} failed verification: {algorithm} {actual} != {expected}",
+        )
+
+
+class GGUFShardError(DownloadException):
+    """Raised when a downloaded split GGUF shard does not have the header its
+    file name promises, which downloading it again will not change."""
+
+    def __init__(self, url: str, reason: str):
+        self.url = url
+        self.reason = reason
+        Exception.__init__(self, f"download {url} is not a valid GGUF shard: {reason}")
+
+
 class HFReachabilityError(Exception):
     """Raised when the Hugging Face API could not be reached to answer a query
     (network timeout, connection error, transient HTTP failure).
@@ -5,15 +5,19 @@ from collections.abc import Callable
 from io import BufferedWriter
 from threading import Thread
 
+import download_mirrors
 import requests
-from exceptions import DownloadException
+from download_progress import Progress, ProgressMeter
+from download_stream import stream_to_file
+from exceptions import DownloadException, FileVerificationError
+from file_integrity import file_sha256
 
 # (connect, read); read applies per chunk, so large files are unaffected.
 _DOWNLOAD_TIMEOUT = (10, 60)
 
 
 class FileDownloader:
-    on_download_progress: Callable[[str, int, int, int], None] = None
+    on_download_progress: Callable[[str, Progress], None] = None
     on_download_completed: Callable[[str, Exception], None] = None
     url: str
     filename: str
@@ -21,39 +25,49 @@ class FileDownloader:
     total_size: int
     download_size: int
     download_stop: bool
-    prev_sec_download_size: int
+    meter: ProgressMeter | None
+    # Expected sha256 of the file; only a file with one may come from a mirror,
+    # and one that fails the check is fetched again from the origin only.
+    sha256: str | None
+    use_mirrors: bool
 
     def __init__(self):
         self.download_stop = False
         self.download_size = 0
         self.completed = False
         self.total_size = 0
-        self.prev_sec_download_size = 0
-        self.report_thread = None
+        self.meter = None
+        self.sha256 = None
+        self.use_mirrors = False
 
-    def download_file(self, url: str, file_path: str):
+    def download_file(self, url: str, file_path: str, sha256: str | None = None):
         self.url = url
+        self.sha256 = sha256
+        self.use_mirrors = sha256 is not None
         self.basename = os.path.basename(file_path)
         self.download_stop = False
         self.filename = file_path
-        self.prev_sec_download_size = 0
         self.download_size = 0
         self.completed = False
-        self.report_thread = None
+        self.meter = None
         error = None
-        report_thread = None
         try:
             response, fw = self.__init_download(self.url, self.filename)
             self.total_size = int(response.headers.get("Content-Length"))
             if self.on_download_progress is not None:
-                report_thread = self.__start_report_download_progress()
+                self.meter = ProgressMeter(
+                    lambda progress: self.on_download_progress(self.basename, progress)
+                )
+                self.meter.update(self.download_size, self.total_size, force=True)
             self.__start_download(response, fw)
+            if sha256 is not None and not self.download_stop:
+                self.__verify()
         except Exception as e:
             error = e
         finally:
             self.completed = True
-            if report_thread is not None:
-                report_thread.join()
+            if self.meter is not None:
+                self.meter.update(self.download_size, self.total_size, force=True)
 
         if self.on_download_completed is not None:
             self.on_download_completed(self.basename, error)
@@ -69,15 +83,24 @@ class FileDownloader:
 
         if start_pos > 0:
             # download skip exists part
-            response = requests.get(
+            response = download_mirrors.get(
                 url,
+                sha256=self.sha256,
+                accept=lambda code: code == 206,
+                use_mirrors=self.use_mirrors,
                 stream=True,
                 headers={"Range": f"bytes={start_pos}-"},
                 timeout=_DOWNLOAD_TIMEOUT,
             )
             fw = open(file_path, "ab")
         else:
-            response = requests.get(url, stream=True, timeout=_DOWNLOAD_TIMEOUT)
+            response = download_mirrors.get(
+                url,
+                sha256=self.sha256,
+                use_mirrors=self.use_mirrors,
+                stream=True,
+                timeout=_DOWNLOAD_TIMEOUT,
+            )
             fw = open(file_path, "wb")
 
         return response, fw
@@ -88,15 +111,14 @@ class FileDownloader:
             try:
                 with response:
                     with fw:
-                        for bytes in response.iter_content(chunk_size=4096):
-                            self.download_size += bytes.__len__()
-                            fw.write(bytes)
-
-                            if self.download_stop:
-                                print(
-                                    f"FileDownloader thread {Thread.native_id} exit by stop"
-                                )
-                                break
+                        stream_to_file(
+                            response,
+                            fw,
+                            on_data=self.__count_downloaded,
+                            should_stop=lambda: self.download_stop,
+                        )
+                if self.download_stop:
+                    print(f"FileDownloader thread {Thread.native_id} exit by stop")
                 break
             except Exception:
                 traceback.print_exc()
@@ -110,22 +132,24 @@ class FileDownloader:
                     time.sleep(1)
                     response, fw = self.__init_download(self.url, self.filename)
 
-    def __start_report_download_progress(self):
-        report_thread = Thread(target=self.__report_download_progress)
-        report_thread.start()
-        return report_thread
-
-    def __report_download_progress(self):
-        while not self.download_stop and not self.completed:
-            self.on_download_progress(
-                self.basename,
-                self.download_size,
-                self.total_size,
-                self.download_size - self.prev_sec_download_size,
-            )
-
-            self.prev_sec_download_size = self.download_size
-            time.sleep(1)
+    def __verify(self):
+        digest = file_sha256(self.filename)
+        if digest == self.sha256:
+            return
+        os.remove(self.filename)
+        if not self.use_mirrors:
+            raise FileVerificationError(self.url, self.sha256, digest)
+        self.use_mirrors = False
+        self.download_size = 0
+        response, fw = self.__init_download(self.url, self.filename)
+        self.__start_download(response, fw)
+        if not self.download_stop:
+            self.__verify()
+
+    def __count_downloaded(self, data: memoryview):
+        self.download_size += len(data)
+        if self.meter is not None:
+            self.meter.update(self.download_size, self.total_size)
 
     def stop_download(self):
         self.download_stop = True
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+from threading import Lock
+
+# sha256 of every file whose download was verified against its HF LFS hash,
+# keyed by final path. A record is only trusted while the file still has the
+# size and mtime it had when it was verified, so later existence checks can
+# rely on it without reading multi-GB files again.
+_VERIFIED_FILES_PATH = os.path.abspath("./cache/verified-files.json")
+_READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+_verified_lock = Lock()
+_verified: dict[str, dict] | None = None
+
+
+class StreamingHasher:
+    """SHA-256 of a file computed while it is being written.
+
+    Bytes are hashed as they pass through the download loop whenever they
+    continue exactly where hashing stopped. Ranges written out of order (by
+    other segments) are read back from disk once the hash reaches them, which
+    for a sequential download means never.
+    """
+
+    path: str
+    position: int
+
+    def __init__(self, path: str, position: int = 0) -> None:
+        self.path = path
+        self.position = 0
+        self._hash = hashlib.sha256()
+        self._lock = Lock()
+        if position > 0:
+            # resuming: the prefix already on disk has to be hashed once
+            self._read_back(position)
+
+    def update(self, offset: int, data, written_from: int | None = None) -> None:
+        """Hash `data`, which was written at `offset`.
+
+        `written_from` is where the contiguous run of bytes that ends at
+        `offset` starts on disk (the start of a segment); if hashing stopped
+        inside that run, the gap is read back first. Threads never wait for
+        each other here: a busy hasher simply leaves the bytes for later.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if written_from is None:
+                written_from = offset
+            if not written_from <= self.position <= offset:
+                return
+            if self.position < offset:
+                self._read_back(offset)
+            self._hash.update(data)
+            self.position = offset + len(data)
+        finally:
+            self._lock.release()
+
+    def hexdigest(self, size: int) -> str:
+        """Finish hashing a complete file of `size` bytes."""
+        with self._lock:
+            self._read_back(size)
+            return self._hash.hexdigest()
+
+    def _read_back(self, until: int) -> None:
+        if self.position >= until:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.position)
+            while self.position < until:
+                chunk = f.read(min(_READ_CHUNK_SIZE, until - self.position))
+                if not chunk:
+                    raise OSError(f"{self.path} is shorter than {until} bytes")
+                self._hash.update(chunk)
+                self.position += len(chunk)
+
+
+def _load_verified() -> dict[str, dict]:
+    global _verified
+    if _verified is None:
+        try:
+            with open(_VERIFIED_FILES_PATH) as f:
+                _verified = json.load(f)
+        except FileNotFoundError:
+            _verified = dict()
+        except (OSError, ValueError) as ex:
+            logging.warning(f"ignoring unreadable {_VERIFIED_FILES_PATH}: {ex}")
+            _verified = dict()
+    return _verified
+
+
+def _save_verified() -> None:
+    try:
+        os.makedirs(os.path.dirname(_VERIFIED_FILES_PATH), exist_ok=True)
+        tmp = _VERIFIED_FILES_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_verified, f)
+        os.replace(tmp, _VERIFIED_FILES_PATH)
+    except OSError as ex:
+        logging.warning(f"could not persist {_VERIFIED_FILES_PATH}: {ex}")
+
+
+def record_verified(paths: dict[str, str]) -> None:
+    """Remember `{final path: sha256}` for files that passed verification."""
+    if not paths:
+        return
+    with _verified_lock:
+        verified = _load_verified()
+        for file_path, sha256 in paths.items():
+            file_path = os.path.abspath(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            verified[file_path] = {
+                "sha256": sha256,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+        _save_verified()
+
+
+def verified_sha256(file_path: str) -> str | None:
+    """The recorded sha256 of `file_path`, if it is unchanged since verification."""
+    file_path = os.path.abspath(file_path)
+    with _verified_lock:
+        record = _load_verified().get(file_path)
+    if record is None:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    if stat.st_size != record["size"] or stat.st_mtime_ns != record["mtime_ns"]:
+        return None
+    return record["sha256"]
+
+
+def is_intact_file(file_path: str) -> bool:
+    """Whether `file_path` is a file that is not known to be damaged.
+
+    A file that was verified at download time and has since changed size was
+    truncated or overwritten; anything else is taken at face value.
+    """
+    if not os.path.isfile(file_path):
+        return False
+    size = verified_size(file_path)
+    return size is None or os.path.getsize(file_path) == size
+
+
+def verified_size(file_path: str) -> int | None:
+    """The size `file_path` had when it was verified, if it ever was."""
+    with _verified_lock:
+        record = _load_verified().get(os.path.abspath(file_path))
+    return None if record is None else record["size"]
+
+
+def _hash_file(file_path: str, hash, header: bytes = b"") -> str:
+    hash.update(header)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(_READ_CHUNK_SIZE):
+            hash.update(chunk)
+    return hash.hexdigest()
+
+
+def file_sha256(file_path: str) -> str:
+    return _hash_file(file_path, hashlib.sha256())
+
+
+def git_blob_id(file_path: str) -> str:
+    """The git object id HF lists for a (non-LFS) file with these contents."""
+    header = b"blob %d\0" % os.path.getsize(file_path)
+    return _hash_file(file_path, hashlib.sha1(), header)
+
+
+def matches_listing(
+    file_path: str, size: int, sha256: str | None, blob_id: str | None
+) -> bool:
+    """Whether `file_path` already has the contents a repo listing describes.
+
+    LFS files compare by sha256, read from the verification record when there
+    is one and otherwise hashed once and recorded; small files compare by git
+    blob id. A file the listing gives no hash for never matches.
+    """
+    try:
+        if os.path.getsize(file_path) != size:
+            return False
+        if sha256 is not None:
+            known = verified_sha256(file_path)
+            if known is not None:
+                return known == sha256
+            if file_sha256(file_path) != sha256:
+                return False
+            record_verified({file_path: sha256})
+            return True
+        if blob_id is not None:
+            return git_blob_id(file_path) == blob_id
+    except OSError:
+        return False
+    return False
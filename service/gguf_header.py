@@ -0,0 +1,114 @@
+import io
+import re
+import struct
+
+# Just enough of the GGUF container format to tell whether a downloaded file
+# is the shard its name claims to be: the magic, version and counts, then the
+# metadata key/values up to the `split.*` keys llama.cpp's gguf-split writes.
+# Tensor infos and data are not read.
+
+SPLIT_GGUF_SHARD = re.compile(r"-(\d{5})-of-(\d{5})\.gguf$")
+
+_MAGIC = b"GGUF"
+_MAX_COUNT = 1 << 32
+
+# value type id -> struct format of one value (8 = string, 9 = array)
+_SCALARS = {
+    0: "<B",
+    1: "<b",
+    2: "<H",
+    3: "<h",
+    4: "<I",
+    5: "<i",
+    6: "<f",
+    7: "<?",
+    10: "<Q",
+    11: "<q",
+    12: "<d",
+}
+_STRING = 8
+_ARRAY = 9
+
+
+def split_shard(name: str) -> tuple[int, int] | None:
+    """(shard number, shard count) from a `*-NNNNN-of-NNNNN.gguf` name."""
+    match = SPLIT_GGUF_SHARD.search(name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class _Reader:
+    def __init__(self, f: io.BufferedReader) -> None:
+        self.f = f
+
+    def read(self, n: int) -> bytes:
+        data = self.f.read(n)
+        if len(data) != n:
+            raise ValueError("truncated GGUF header")
+        return data
+
+    def unpack(self, fmt: str):
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))[0]
+
+    def count(self) -> int:
+        n = self.unpack("<Q")
+        if n >= _MAX_COUNT:
+            raise ValueError(f"implausible GGUF count {n}")
+        return n
+
+    def string(self) -> bytes:
+        return self.read(self.count())
+
+    def skip(self, n: int) -> None:
+        self.f.seek(n, io.SEEK_CUR)
+
+    def value(self, value_type: int):
+        if value_type in _SCALARS:
+            return self.unpack(_SCALARS[value_type])
+        if value_type == _STRING:
+            return self.string()
+        if value_type == _ARRAY:
+            item_type = self.unpack("<I")
+            n = self.count()
+            if item_type in _SCALARS:
+                self.skip(n * struct.calcsize(_SCALARS[item_type]))
+            else:
+                for _ in range(n):
+                    self.value(item_type)
+            return None
+        raise ValueError(f"unknown GGUF value type {value_type}")
+
+
+def read_split_keys(file_path: str) -> dict[str, int]:
+    """The `split.*` metadata of a GGUF file; raises ValueError if it is not one."""
+    with open(file_path, "rb") as f:
+        reader = _Reader(f)
+        if reader.read(4) != _MAGIC:
+            raise ValueError("not a GGUF file")
+        version = reader.unpack("<I")
+        if version not in (2, 3):
+            raise ValueError(f"unsupported GGUF version {version}")
+        reader.count()  # tensors
+        split = {}
+        for _ in range(reader.count()):
+            key = reader.string()
+            value = reader.value(reader.unpack("<I"))
+            if key.startswith(b"split."):
+                split[key.decode()] = value
+        return split
+
+
+def check_shard(file_path: str, shard: int, shard_count: int) -> None:
+    """Raise ValueError unless `file_path` is shard `shard` of `shard_count`.
+
+    Shard numbers in file names start at 1, `split.no` at 0. A file without
+    split metadata only has to be a readable GGUF.
+    """
+    split = read_split_keys(file_path)
+    if "split.no" in split and split["split.no"] != shard - 1:
+        raise ValueError(f"header says split {split['split.no'] + 1}, not {shard}")
+    if "split.count" in split and split["split.count"] != shard_count:
+        raise ValueError(
+            f"header says {split['split.count']} splits, not {shard_count}"
+        )
@@ -0,0 +1,151 @@
+import io
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+import config
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+# One pooled session for every file download in this service. Connections
+# (and their TLS sessions) are kept alive between files and segments instead of
+# being set up again for each request, and at most `download_connections_per_host`
+# are open to any one host; further requests wait for a free connection.
+#
+# All downloaded bytes also pass through one token bucket, so model pulls can be
+# capped below the link speed and leave room for interactive traffic.
+#
+# file:// URLs are served from disk by the same session, ranges included, so a
+# local mirror directory goes through the exact code path of an HTTP source.
+
+
+class TokenBucket:
+    """Bandwidth cap shared by all download threads; 0 means unlimited."""
+
+    rate: int
+    capacity: int
+
+    def __init__(self, rate: int = 0) -> None:
+        self._lock = threading.Lock()
+        self.set_rate(rate)
+
+    def set_rate(self, rate: int) -> None:
+        with self._lock:
+            self.rate = max(0, int(rate))
+            # a quarter second of burst keeps the flow smooth without letting
+            # an idle period turn into a long unthrottled spike
+            self.capacity = self.rate // 4
+            self._tokens = self.capacity
+            self._updated = time.monotonic()
+
+    def consume(self, amount: int) -> None:
+        """Account for `amount` bytes, sleeping while over the rate.
+
+        Tokens may go negative: a thread that took a large read pays it back
+        by sleeping, and the threads after it wait their turn for the refill.
+        """
+        with self._lock:
+            if self.rate == 0:
+                return
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+bandwidth = TokenBucket(config.download_bandwidth_limit)
+
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+
+class _FileRange(io.RawIOBase):
+    """At most `length` bytes of an open file, read as a response body."""
+
+    def __init__(self, f, length: int) -> None:
+        self._f = f
+        self._left = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer)[: self._left]
+        length = self._f.readinto(view) or 0
+        self._left -= length
+        return length
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+class LocalFileAdapter(BaseAdapter):
+    """GET for file:// URLs, answering like a static file server would."""
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.raw = io.BytesIO(b"")
+        try:
+            f = open(url2pathname(urlsplit(request.url).path), "rb")
+        except OSError:
+            response.status_code = 404
+            return response
+        size = os.fstat(f.fileno()).st_size
+        start, end = 0, size
+        response.status_code = 200
+        match = _RANGE.match(request.headers.get("Range", ""))
+        if match is not None:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(end, int(match.group(2)) + 1)
+            if start >= size:
+                f.close()
+                response.status_code = 416
+                return response
+            response.status_code = 206
+            response.headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        f.seek(start)
+        response.headers["Content-Length"] = str(end - start)
+        response.raw = _FileRange(f, end - start)
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=config.download_connections_per_host,
+                pool_block=True,
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.mount("file://", LocalFileAdapter())
+        return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return session().get(url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    return session().head(url, **kwargs)
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+from threading import Lock
+
+# The files each download put into a model directory, and the revision they
+# were listed at. When the repo moves to a new commit, the next download of it
+# fetches only what changed (see HFPlaygroundDownloader.skip_installed) and
+# prunes the files the new revision no longer has. Entries are keyed by model
+# directory and then by the repo id that was asked for, because several repo
+# ids (single files of one repo) can share a directory.
+_MANIFESTS_PATH = os.path.abspath("./cache/installed-files.json")
+
+_lock = Lock()
+_manifests: dict[str, dict[str, dict]] | None = None
+
+
+def _key(root: str) -> str:
+    return os.path.normcase(os.path.abspath(root))
+
+
+def _load() -> dict[str, dict[str, dict]]:
+    global _manifests
+    if _manifests is None:
+        try:
+            with open(_MANIFESTS_PATH) as f:
+                _manifests = json.load(f)
+        except FileNotFoundError:
+            _manifests = {}
+        except (OSError, ValueError) as ex:
+            logging.warning(f"ignoring unreadable {_MANIFESTS_PATH}: {ex}")
+            _manifests = {}
+    return _manifests
+
+
+def _save() -> None:
+    try:
+        os.makedirs(os.path.dirname(_MANIFESTS_PATH), exist_ok=True)
+        tmp = _MANIFESTS_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(_manifests, f)
+        os.replace(tmp, _MANIFESTS_PATH)
+    except OSError as ex:
+        logging.warning(f"could not persist {_MANIFESTS_PATH}: {ex}")
+
+
+def get(root: str, repo_id: str) -> dict | None:
+    """`{"revision": ..., "files": [relpath, ...]}` of the last download, or None."""
+    with _lock:
+        return _load().get(_key(root), {}).get(repo_id)
+
+
+def record(root: str, repo_id: str, revision: str | None, relpaths: list[str]) -> None:
+    with _lock:
+        manifests = _load()
+        manifests.setdefault(_key(root), {})[repo_id] = {
+            "revision": revision,
+            "files": sorted(relpaths),
+        }
+        _save()
+
+
+def prunable(root: str, repo_id: str, relpaths: list[str]) -> list[str]:
+    """Files the last download of `repo_id` installed that `relpaths` drops.
+
+    Files another repo id installed into the same directory are kept. Nothing
+    is pruned for a directory downloaded before manifests were recorded.
+    """
+    with _lock:
+        installed = _load().get(_key(root), {})
+        previous = installed.get(repo_id)
+        if previous is None:
+            return []
+        keep = set(relpaths)
+        for other_repo_id, other in installed.items():
+            if other_repo_id != repo_id:
+                keep.update(other["files"])
+        return [relpath for relpath in previous["files"] if relpath not in keep]
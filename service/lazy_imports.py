@@ -0,0 +1,111 @@
+import importlib
+import importlib.abc
+import importlib.util
+import os
+import re
+import subprocess
+import sys
+import types
+
+# The Electron service registry polls /healthy until the backend answers, so
+# everything it does not need (huggingface_hub, requests, httpx, psutil and
+# the download stack built on them) is imported on first use or by the
+# background startup in web_api, not before the server binds.
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is first read."""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        # the import system's per-module locks make this safe from any thread
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}>"
+
+
+def module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+class _AliasFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def __init__(self, alias: str, target: str) -> None:
+        self.alias = alias
+        self.target = target
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname != self.alias:
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def create_module(self, spec):
+        # a placeholder: the import system sets the alias's __spec__ on what
+        # this returns, and the target module's own must stay as it is
+        return types.ModuleType(spec.name)
+
+    def exec_module(self, module) -> None:
+        # the import returns whatever sys.modules holds for the alias afterwards
+        sys.modules[self.alias] = importlib.import_module(self.target)
+
+
+def alias_missing_module(alias: str, target: str) -> None:
+    """Resolve `import alias` to `target` if no module `alias` exists.
+
+    Nothing is imported until something asks for `alias`.
+    """
+    # last, so a real module of that name is still found first
+    sys.meta_path.append(_AliasFinder(alias, target))
+
+
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_imports(phases: dict[str, list[str]], top: int = 25) -> dict:
+    """Import each phase's modules in a fresh interpreter under `-X importtime`.
+
+    Returns the cumulative microseconds of every phase and the `top` slowest
+    imports (by cumulative time, nested ones included) with their phase.
+    """
+    lines = ["import sys"]
+    for phase, modules in phases.items():
+        lines.append(f"sys.stderr.write('import phase: {phase}\\n')")
+        lines.extend(f"import {name}" for name in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(lines)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    totals = dict.fromkeys(phases, 0)
+    imports = []
+    phase = None
+    for line in result.stderr.splitlines():
+        if line.startswith("import phase: "):
+            phase = line.removeprefix("import phase: ")
+            continue
+        match = _IMPORT_TIME.match(line)
+        if match is None or phase is None:
+            continue
+        self_us, cumulative_us = int(match.group(1)), int(match.group(2))
+        depth = (len(match.group(3)) - 1) // 2
+        if depth == 0:
+            totals[phase] += cumulative_us
+        imports.append(
+            {
+                "module": match.group(4),
+                "phase": phase,
+                "depth": depth,
+                "self_us": self_us,
+                "cumulative_us": cumulative_us,
+            }
+        )
+    imports.sort(key=lambda entry: entry["cumulative_us"], reverse=True)
+    return {
+        "returncode": result.returncode,
+        "phases_us": totals,
+        "slowest": imports[:top],
+    }
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+# Repo file listings persisted across backend restarts, so size queries for the
+# model catalog are answered from disk instead of re-walking every repo on HF.
+# One JSON file per (repo id, model type); the HF commit sha the listing was
+# taken at is stored with it and acts as the entry's etag.
+_CACHE_DIR = os.path.abspath("./cache/manifests")
+
+# How long a listing is trusted without asking HF whether the repo moved.
+DEFAULT_TTL = 7 * 24 * 3600
+_MAX_ENTRIES = 1024
+
+_lock = Lock()
+_entries: "OrderedDict[str, RepoManifest]" = OrderedDict()
+
+
+class RepoManifest:
+    repo_id: str
+    model_type: str
+    sha: str | None
+    total_size: int
+    files: list[dict]
+    validated_at: float
+
+    def __init__(
+        self,
+        repo_id: str,
+        model_type: str,
+        sha: str | None,
+        total_size: int,
+        files: list[dict],
+        validated_at: float,
+    ) -> None:
+        self.repo_id = repo_id
+        self.model_type = model_type
+        self.sha = sha
+        self.total_size = total_size
+        self.files = files
+        self.validated_at = validated_at
+
+    def age(self) -> float:
+        return time.time() - self.validated_at
+
+
+def _key(repo_id: str, model_type: str) -> str:
+    return f"{repo_id}_{model_type}"
+
+
+def _entry_path(key: str) -> str:
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()[0:32]
+    return os.path.join(_CACHE_DIR, f"{name}.json")
+
+
+def get(repo_id: str, model_type: str) -> RepoManifest | None:
+    """Return the stored listing for a repo, whatever its age, or None."""
+    key = _key(repo_id, model_type)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry
+        entry = _read(key)
+        if entry is not None:
+            _remember(key, entry)
+        return entry
+
+
+def put(
+    repo_id: str, model_type: str, sha: str | None, total_size: int, files: list[dict]
+) -> RepoManifest:
+    key = _key(repo_id, model_type)
+    entry = RepoManifest(repo_id, model_type, sha, total_size, files, time.time())
+    with _lock:
+        _remember(key, entry)
+        _write(key, entry)
+        _evict()
+    return entry
+
+
+def mark_validated(entry: RepoManifest) -> None:
+    """Record that HF still serves `entry.sha`, restarting its TTL."""
+    entry.validated_at = time.time()
+    with _lock:
+        _write(_key(entry.repo_id, entry.model_type), entry)
+
+
+def _remember(key: str, entry: RepoManifest) -> None:
+    _entries[key] = entry
+    _entries.move_to_end(key)
+    while len(_entries) > _MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+def _read(key: str) -> RepoManifest | None:
+    entry_path = _entry_path(key)
+    try:
+        with open(entry_path) as f:
+            data = json.load(f)
+        entry = RepoManifest(
+            data["repo_id"],
+            data["model_type"],
+            data["sha"],
+            data["total_size"],
+            data["files"],
+            data["validated_at"],
+        )
+        # file mtime doubles as the last-used time for on-disk eviction
+        os.utime(entry_path)
+        return entry
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as ex:
+        logging.warning(f"ignoring unreadable manifest {entry_path}: {ex}")
+        return None
+
+
+def _write(key: str, entry: RepoManifest) -> None:
+    entry_path = _entry_path(key)
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        tmp = entry_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(vars(entry), f)
+        os.replace(tmp, entry_path)
+    except OSError as ex:
+        # the cache is an optimization; failing to persist must not fail a query
+        logging.warning(f"could not persist manifest {entry_path}: {ex}")
+
+
+def _evict() -> None:
+    try:
+        names = [name for name in os.listdir(_CACHE_DIR) if name.endswith(".json")]
+        if len(names) <= _MAX_ENTRIES:
+            return
+        paths = [os.path.join(_CACHE_DIR, name) for name in names]
+        paths.sort(key=os.path.getmtime)
+        for entry_path in paths[: len(paths) - _MAX_ENTRIES]:
+            os.remove(entry_path)
+    except OSError as ex:
+        logging.warning(f"could not evict manifests from {_CACHE_DIR}: {ex}")
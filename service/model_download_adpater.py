@@ -1,165 +1,63 @@
 import json
-import threading
-from queue import Empty, Queue
 
-import utils
-from file_downloader import FileDownloader
-from model_downloader import (
-    DownloadException,
-    HFPlaygroundDownloader,
-    NotEnoughDiskSpaceException,
-)
-from psutil._common import bytes2human
+import download_scheduler
 from web_request_bodies import DownloadModelData
 
 
 class Model_Downloader_Adapter:
-    msg_queue: Queue
-    finish: bool
-    signal: threading.Event
-    file_downloader: FileDownloader
-    hf_downloader: HFPlaygroundDownloader
-    has_error: bool
-    user_stop: bool
+    """One /api/downloadModel request: its jobs on the shared scheduler and the
+    SSE stream reporting on them."""
 
-    def __init__(self, hf_token=None):
-        self.msg_queue = Queue(-1)
-        self.finish = False
-        self.user_stop = False
-        self.signal = threading.Event()
-        self.file_downloader = FileDownloader()
-        self.file_downloader.on_download_progress = (
-            self.download_model_progress_callback
-        )
-        self.file_downloader.on_download_completed = (
-            self.download_model_completed_callback
-        )
-        self.hf_downloader = HFPlaygroundDownloader(hf_token)
-        self.hf_downloader.on_download_progress = self.download_model_progress_callback
-        self.hf_downloader.on_download_completed = (
-            self.download_model_completed_callback
-        )
+    hf_token: str | None
+    job_ids: set[str]
+    # stream with async generators, for the ASGI mode
+    asynchronous: bool
 
-    def put_msg(self, data):
-        self.msg_queue.put_nowait(data)
-        self.signal.set()
-
-    def download_model_progress_callback(
-        self, repo_id: str, download_size: int, total_size: int, speed: int
-    ):
-        print(
-            f"download {repo_id} {bytes2human(download_size)}/{bytes2human(total_size)} speed {bytes2human(speed)}"
-        )
-        data = {
-            "type": "download_model_progress",
-            "repo_id": repo_id,
-            "download_size": bytes2human(download_size),
-            "total_size": bytes2human(total_size),
-            "percent": round(download_size / total_size * 100, 2),
-            "speed": f"{bytes2human(speed)}/s",
-        }
-        self.put_msg(data)
-
-    def download_model_completed_callback(self, repo_id: str, ex: Exception | None):
-        if ex is not None:
-            self.put_msg({"type": "error", "err_type": "download_exception"})
-            self.has_error = True
-        else:
-            self.put_msg({"type": "download_model_completed", "repo_id": repo_id})
-
-    def error_callback(self, ex: Exception):
-        self.has_error = True
-        if (
-            isinstance(ex, NotImplementedError)
-            and ex.__str__() == "Access to repositories lists is not implemented."
-        ):
-            self.put_msg(
-                {
-                    "type": "error",
-                    "err_type": "repositories_not_found",
-                }
-            )
-        elif isinstance(ex, NotEnoughDiskSpaceException):
-            self.put_msg(
-                {
-                    "type": "error",
-                    "err_type": "not_enough_disk_space",
-                    "requires_space": bytes2human(ex.requires_space),
-                    "free_space": bytes2human(ex.free_space),
-                }
-            )
-        elif isinstance(ex, DownloadException):
-            self.put_msg({"type": "error", "err_type": "download_exception"})
-        elif isinstance(ex, RuntimeError):
-            self.put_msg({"type": "error", "err_type": "runtime_error"})
-        else:
-            self.put_msg({"type": "error", "err_type": "unknown_exception"})
-        print(f"exception:{ex!s}")
+    def __init__(self, hf_token=None, asynchronous=False):
+        self.hf_token = hf_token
+        self.job_ids = set()
+        self.asynchronous = asynchronous
 
     def download(self, model_download_list: list[DownloadModelData]):
-        self.has_error = False
-        threading.Thread(
-            target=self.__start_download,
-            kwargs={"model_download_list": model_download_list},
-        ).start()
-        return self.generator()
-
-    def __start_download(self, model_download_list: list[DownloadModelData]):
-        global _adapter
-        self.finish = False
-        self.user_stop = False
-        try:
-            for item in model_download_list:
-                if self.user_stop:
-                    break
-                if self.has_error:
-                    break
-                self.hf_downloader.download(
-                    item.repo_id, item.type, item.backend, item.model_path
-                )
-
-                # Copy faceswap/facerestore models to ComfyUI directory after download completes
-                # This must happen here (not in callback) to ensure file is fully written
-                if item.backend == "comfyui" and item.type in (
-                    "faceswap",
-                    "facerestore",
-                ):
-                    utils.copy_faceswap_facerestore_to_comfyui(
-                        item.type,
-                        item.repo_id,
-                        item.model_path,
-                    )
-            if not self.has_error and not self.user_stop:
-                self.put_msg({"type": "allComplete"})
-        except Exception as ex:
-            self.error_callback(ex)
-        finally:
-            self.finish = True
-            self.signal.set()
-            if _adapter is self:
-                _adapter = None
+        scheduler = download_scheduler.get_scheduler()
+        subscription = scheduler.submit_followed(model_download_list, self.hf_token)
+        subscription.announce = True
+        self.job_ids = subscription.job_ids
+        return self.stream(subscription)
+
+    def resume_all(self):
+        """Resume every paused job, e.g. those restored after a restart, and
+        stream them; None if no job was paused."""
+        scheduler = download_scheduler.get_scheduler()
+        subscription = scheduler.resume_all_followed(self.hf_token)
+        if subscription is None:
+            return None
+        subscription.announce = True
+        self.job_ids = subscription.job_ids
+        return self.stream(subscription)
+
+    def follow(self, job_ids: list[str]):
+        """Stream the progress of jobs queued by an earlier request, or None."""
+        scheduler = download_scheduler.get_scheduler()
+        subscription = scheduler.subscribe_ids(job_ids)
+        if subscription is None:
+            return None
+        return self.stream(subscription)
 
     def stop_download(self):
-        self.user_stop = True
-        if not self.file_downloader.completed:
-            self.file_downloader.stop_download()
-        if not self.hf_downloader.completed:
-            self.hf_downloader.stop_download()
-
-    def generator(self):
-        while True:
-            while not self.msg_queue.empty():
-                try:
-                    data = self.msg_queue.get_nowait()
-                    msg = f"data:{json.dumps(data)}\0"
-                    yield msg
-                except Empty:
-                    break
-            if not self.finish:
-                self.signal.clear()
-                self.signal.wait()
-            else:
-                break
-
-
-_adapter: Model_Downloader_Adapter = None
+        scheduler = download_scheduler.get_scheduler()
+        for job_id in self.job_ids:
+            scheduler.cancel(job_id)
+
+    def stream(self, subscription: download_scheduler.JobSubscription):
+        if self.asynchronous:
+            return self.generator_async(subscription)
+        return self.generator(subscription)
+
+    def generator(self, subscription: download_scheduler.JobSubscription):
+        for data in subscription.messages():
+            yield f"data:{json.dumps(data)}\0"
+
+    async def generator_async(self, subscription: download_scheduler.JobSubscription):
+        async for data in subscription.messages_async():
+            yield f"data:{json.dumps(data)}\0"
@@ -1,25 +1,42 @@
 import concurrent.futures
+import errno
 import logging
 import os
 import queue
-import re
-import shutil
 import time
 import traceback
+from collections import defaultdict
 from collections.abc import Callable
 from hashlib import sha256
-from os import makedirs, path, rename
+from os import makedirs, path
 from threading import Lock, Thread
 from time import sleep
 from typing import Any
 
+import download_finalize
+import download_mirrors
+import file_integrity
+import gguf_header
+import http_client
 import httpx
+import install_manifest
+import manifest_cache
 import psutil
 import requests
 import utils
-from exceptions import DownloadException, HFReachabilityError
-from huggingface_hub import HfFileSystem, hf_hub_url, model_info
+from download_progress import Progress, ProgressMeter
+from download_segments import SEGMENTS_SUFFIX, FileSegment, SegmentedFile
+from download_stream import stream_to_file
+from exceptions import (
+    DownloadException,
+    FileVerificationError,
+    GGUFShardError,
+    HFReachabilityError,
+)
+from file_integrity import StreamingHasher, git_blob_id
+from huggingface_hub import HfApi, HfFileSystem, hf_hub_url, model_info
 from huggingface_hub.errors import HfHubHTTPError
+from huggingface_hub.hf_api import RepoFolder
 from psutil._common import bytes2human
 from utils import is_specific_file_reference
 
@@ -38,39 +55,89 @@ _HF_EXISTS_RETRIES = 3
 _DOWNLOAD_TIMEOUT = (10, 60)
 _REQUEST_TIMEOUT = (10, 30)
 
-model_list_cache = dict()
-model_lock = Lock()
-
-
-def _merge_move(src: str, dst: str) -> None:
-    """Move `src` to `dst`, merging into an existing destination directory tree.
-
-    Plain `shutil.move` raises `shutil.Error: Destination path '...' already exists`
-    when moving a directory whose name already exists at the destination. That happens
-    when two downloads from the same HF repo land files into the same subdirectory
-    (e.g. ERNIE-Image's `diffusion_models/turbo.safetensors` then `diffusion_models/main.safetensors`).
-    We recurse instead, replacing files at the leaves.
-    """
-    if os.path.isdir(src) and os.path.isdir(dst):
-        for item in os.listdir(src):
-            _merge_move(os.path.join(src, item), os.path.join(dst, item))
-        os.rmdir(src)
-        return
-    if os.path.isfile(dst):
-        os.remove(dst)
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    shutil.move(src, dst)
+# Files at least this large are fetched as several byte ranges on separate
+# connections, so a repo that is a single multi-GB checkpoint still uses every
+# download thread instead of one HTTP stream.
+_SEGMENT_SIZE = 128 * 1024 * 1024
+_SEGMENT_MIN_FILE_SIZE = 2 * _SEGMENT_SIZE
+
+# Files at least this large are preallocated and tracked with a segment sidecar
+# even when they are fetched as one range, so they are laid out contiguously
+# and their disk space is reserved before the first byte arrives. Smaller
+# files (configs, tokenizers) are simply appended to.
+_PREALLOCATE_MIN_FILE_SIZE = 16 * 1024 * 1024
+
+# model_info results shared by the gated, access and revision checks: opening
+# the download dialog asks all of them about the same repos within seconds.
+_MODEL_INFO_TTL = 60
+_model_info_cache: dict[tuple[str | None, str], tuple[float, Any]] = dict()
+_model_info_lock = Lock()
+
+
+def cached_model_info(repo_id: str, hf_token: str | None):
+    key = (hf_token, utils.trim_repo(repo_id))
+    with _model_info_lock:
+        cached = _model_info_cache.get(key)
+    if cached is not None and time.time() - cached[0] < _MODEL_INFO_TTL:
+        return cached[1]
+    return None
+
+
+def remember_model_info(repo_id: str, hf_token: str | None, info) -> None:
+    now = time.time()
+    with _model_info_lock:
+        for stale in [
+            k for k, v in _model_info_cache.items() if now - v[0] >= _MODEL_INFO_TTL
+        ]:
+            del _model_info_cache[stale]
+        _model_info_cache[(hf_token, utils.trim_repo(repo_id))] = (now, info)
+
+
+def access_probe_file(repo_id: str, info) -> str:
+    """A small file of the repo (or its subfolder) from its model_info listing."""
+    subfolder = utils.extract_model_id_pathsegments(repo_id)
+    names = [
+        sibling.rfilename
+        for sibling in info.siblings or []
+        if not subfolder or sibling.rfilename.startswith(subfolder + "/")
+    ]
+    if not names:
+        raise FileNotFoundError(f"{repo_id} has no files to probe")
+    # configs are tiny and present in nearly every repo
+    return next((name for name in names if name.endswith(".json")), names[0])
+
+
+def _open_or_close(response, file_path: str, mode: str, **kwargs):
+    # a response left open would hold one of the host's pooled connections
+    try:
+        return open(file_path, mode, **kwargs)
+    except BaseException:
+        response.close()
+        raise
 
 
 class HFFileItem:
     relpath: str
     size: int
     url: str
+    # LFS sha256 from the repo listing; None for small files kept in git.
+    sha256: str | None
+    # git object id from the repo listing, which identifies small files
+    blob_id: str | None
 
-    def __init__(self, relpath: str, size: int, url: str) -> None:
+    def __init__(
+        self,
+        relpath: str,
+        size: int,
+        url: str,
+        sha256: str | None = None,
+        blob_id: str | None = None,
+    ) -> None:
         self.relpath = relpath
         self.size = size
         self.url = url
+        self.sha256 = sha256
+        self.blob_id = blob_id
 
 
 class HFDownloadItem:
@@ -79,15 +146,44 @@ class HFDownloadItem:
     url: str
     disk_file_size: int
     save_filename: str
+    # Set when this item is one byte range of a file that is downloaded in
+    # segments; `disk_file_size` then counts bytes written within the range.
+    segment: FileSegment | None
+    segmented_file: SegmentedFile | None
+    # Expected LFS sha256 and the hash being computed as bytes arrive; every
+    # segment of a file shares one hasher.
+    sha256: str | None
+    hasher: StreamingHasher | None
+    # Expected git object id, checked for small files that have no sha256.
+    blob_id: str | None
+    # Set once the file failed verification and is being downloaded again.
+    refetched: bool
 
     def __init__(
-        self, name: str, size: int, url: str, disk_file_size: int, save_filename: str
+        self,
+        name: str,
+        size: int,
+        url: str,
+        disk_file_size: int,
+        save_filename: str,
+        segment: FileSegment | None = None,
+        segmented_file: SegmentedFile | None = None,
+        sha256: str | None = None,
+        hasher: StreamingHasher | None = None,
+        refetched: bool = False,
+        blob_id: str | None = None,
     ) -> None:
         self.name = name
         self.size = size
         self.url = url
         self.disk_file_size = disk_file_size
         self.save_filename = save_filename
+        self.segment = segment
+        self.segmented_file = segmented_file
+        self.sha256 = sha256
+        self.hasher = hasher
+        self.refetched = refetched
+        self.blob_id = blob_id
 
 
 class NotEnoughDiskSpaceException(Exception):
@@ -110,9 +206,22 @@ class HFPlaygroundDownloader:
     file_queue: queue.Queue[HFDownloadItem]
     total_size: int
     download_size: int
-    prev_sec_download_size: int
-    on_download_progress: Callable[[str, int, int, int], None] = None
+    on_download_progress: Callable[[str, Progress], None] = None
+    meter: ProgressMeter | None = None
     on_download_completed: Callable[[str, Exception], None] = None
+    # the listing a download settled on, and each file that passed verification
+    on_file_list: Callable[[list[HFFileItem], int], None] = None
+    on_file_verified: Callable[[str, str], None] = None
+    # each split GGUF shard once it is complete and its header checked:
+    # (relpath, shard number, shard count, staged path)
+    on_shard_completed: Callable[[str, int, int, str], None] = None
+    # the full listing of the current download and the commit it was taken
+    # at, recorded as what the model directory holds once it is finalized
+    file_list: list[HFFileItem] | None = None
+    revision: str | None = None
+    # how many of the download threads may hold a connection right now; None
+    # for all of them. The scheduler lowers it while other repos download.
+    connection_limit: int | None = None
     thread_alive: int
     thread_lock: Lock
     download_stop: bool
@@ -130,6 +239,9 @@ class HFPlaygroundDownloader:
         self.download_size = 0
         self.thread_lock = Lock()
         self.hf_token = hf_token
+        # set once by stop_download; a stop that arrives while the repo is
+        # still being enumerated must not be lost
+        self.download_stop = False
 
     def hf_url_exists(self, repo_id: str) -> bool:
         """Return whether the given HF repo/file exists.
@@ -161,9 +273,17 @@ class HFPlaygroundDownloader:
     def probe_type(self, repo_id: str):
         return model_info(utils.trim_repo(repo_id)).pipeline_tag
 
+    def get_model_info(self, repo_id: str):
+        """`model_info` for the repo, cached briefly per token."""
+        info = cached_model_info(repo_id, self.hf_token)
+        if info is None:
+            info = model_info(utils.trim_repo(repo_id), token=self.hf_token)
+            remember_model_info(repo_id, self.hf_token, info)
+        return info
+
     def is_gated(self, repo_id: str):
         try:
-            info = model_info(utils.trim_repo(repo_id), token=self.hf_token)
+            info = self.get_model_info(repo_id)
             return info.gated or info.private
         except Exception as ex:
             print(f"Error while trying to determine whether {repo_id} is gated: {ex}")
@@ -176,64 +296,205 @@ class HFPlaygroundDownloader:
         backend: str,
         model_path: str,
         thread_count: int = 4,
+        file_list: list[HFFileItem] | None = None,
+        verified: dict[str, str] | None = None,
     ):
+        """Download a repo into `model_path`.
+
+        A job resumed after a restart passes the `file_list` it was started
+        with and the files already `verified`, so the repo is neither listed
+        again nor moved to a newer revision halfway through.
+        """
         print(f"at download {backend}")
         self.repo_id = repo_id
         self.total_size = 0
         self.download_size = 0
         self.file_queue = queue.Queue()
-        self.download_stop = False
         self.completed = False
         self.error = None
+        self.verified = dict(verified or {})
         self.save_path = path.abspath(model_path)
         logging.info(f"save_path: {self.save_path}")
+        # staged inside the model directory, so that finalizing is a rename on
+        # the same filesystem (see download_finalize)
         self.save_path_tmp = path.abspath(
             path.join(self.save_path, getTmpPath(self.repo_id))
         )
         if not path.exists(self.save_path_tmp):
             makedirs(self.save_path_tmp)
-        key = f"{repo_id}_{model_type}"
-        cache_item = model_list_cache.get(key)
-        if cache_item is None:
-            file_list = list()
-            self.populate_file_list(file_list, repo_id, model_type)
-            model_list_cache.__setitem__(
-                key, {"size": self.total_size, "queue": file_list}
-            )
+        self.revision = None
+        if file_list is None:
+            # always confirm the listing still matches the repo before downloading
+            file_list, self.total_size = self.get_file_list(repo_id, model_type, 0)
+            entry = manifest_cache.get(repo_id, model_type)
+            self.revision = entry.sha if entry is not None else None
+            if self.on_file_list is not None:
+                self.on_file_list(file_list, self.total_size)
         else:
-            self.total_size = cache_item["size"]
-            file_list: list = cache_item["queue"]
+            self.total_size = sum(file.size for file in file_list)
+        self.file_list = file_list
+
+        self.build_queue(self.skip_installed(file_list))
+        self.reserve_disk_space()
+        self.multiple_thread_download(thread_count)
 
-        self.build_queue(file_list)
+    def skip_installed(self, file_list: list[HFFileItem]) -> list[HFFileItem]:
+        """Drop the files the installed copy of the repo already has.
 
-        usage = psutil.disk_usage(self.save_path)
-        if self.total_size - self.download_size > usage.free:
-            raise NotEnoughDiskSpaceException(
-                self.total_size - self.download_size, usage.free
+        When a repo moves to a new revision only the files whose sha256 or
+        git blob id changed are fetched again; the rest count as downloaded.
+        A staged copy of an unchanged file, left by an attempt at an older
+        revision, is deleted so finalizing cannot put it in place.
+        """
+        root, _, single_file = self.install_target()
+        if single_file or not path.isdir(root):
+            return file_list
+        pending = []
+        for file in file_list:
+            installed = path.join(root, file.relpath)
+            if not file_integrity.matches_listing(
+                installed, file.size, file.sha256, file.blob_id
+            ):
+                pending.append(file)
+                continue
+            self.download_size += file.size
+            staged = path.join(self.save_path_tmp, file.relpath)
+            for stale in (staged, staged + SEGMENTS_SUFFIX):
+                if path.exists(stale):
+                    os.remove(stale)
+        if len(pending) < len(file_list):
+            logging.info(
+                f"{self.repo_id}: {len(file_list) - len(pending)} files unchanged, "
+                f"fetching {len(pending)}"
             )
-        self.multiple_thread_download(thread_count)
+        return pending
 
-    def build_queue(self, file_list: list[HFFileItem]):
+    def build_queue(self, file_list: list[HFFileItem], refetched: bool = False):
         for file in file_list:
             save_filename = path.abspath(path.join(self.save_path_tmp, file.relpath))
-            if path.exists(save_filename):
+            if file.size >= _PREALLOCATE_MIN_FILE_SIZE:
+                self.queue_segmented_file(file, save_filename, refetched)
+            elif path.exists(save_filename):
                 local_file_size = path.getsize(save_filename)
+                # a file as large as the network file is verified, not downloaded
+                if local_file_size >= file.size:
+                    self.finish_existing_file(file, save_filename, refetched)
+                    continue
                 self.download_size += local_file_size
-                # if local file size less thand network file size download it, else skip it!
-                if local_file_size < file.size:
-                    self.file_queue.put(
-                        HFDownloadItem(
-                            file.relpath,
-                            file.size,
-                            file.url,
-                            local_file_size,
-                            save_filename,
-                        )
+                self.file_queue.put(
+                    HFDownloadItem(
+                        file.relpath,
+                        file.size,
+                        file.url,
+                        local_file_size,
+                        save_filename,
+                        sha256=file.sha256,
+                        refetched=refetched,
+                        blob_id=file.blob_id,
                     )
+                )
             else:
                 self.file_queue.put(
-                    HFDownloadItem(file.relpath, file.size, file.url, 0, save_filename)
+                    HFDownloadItem(
+                        file.relpath,
+                        file.size,
+                        file.url,
+                        0,
+                        save_filename,
+                        sha256=file.sha256,
+                        refetched=refetched,
+                        blob_id=file.blob_id,
+                    )
+                )
+
+    def queue_segmented_file(
+        self, file: HFFileItem, save_filename: str, refetched: bool = False
+    ):
+        """Queue every unfinished byte range of a large file as its own item.
+
+        The ranges of one file are queued back to back, so the download threads
+        pick them up together and the file is fetched on all connections at once.
+        A file below `_SEGMENT_MIN_FILE_SIZE` is a single range.
+        """
+        segment_size = (
+            _SEGMENT_SIZE if file.size >= _SEGMENT_MIN_FILE_SIZE else file.size
+        )
+        state = SegmentedFile.open(save_filename, file.size, segment_size)
+        if state is None:
+            self.finish_existing_file(file, save_filename, refetched)
+            return
+        self.download_size += state.downloaded_size()
+        hasher = StreamingHasher(save_filename) if file.sha256 else None
+        for segment in state.pending_segments():
+            self.file_queue.put(
+                HFDownloadItem(
+                    file.relpath,
+                    file.size,
+                    file.url,
+                    segment.written,
+                    save_filename,
+                    segment=segment,
+                    segmented_file=state,
+                    sha256=file.sha256,
+                    hasher=hasher,
+                    refetched=refetched,
+                    blob_id=file.blob_id,
                 )
+            )
+
+    def finish_existing_file(
+        self, file: HFFileItem, save_filename: str, refetched: bool = False
+    ):
+        """Verify a staged file that was already complete before this attempt.
+
+        An earlier attempt may have stopped between writing the last byte and
+        verifying it, so the file goes through `finish_file` like a freshly
+        completed one. A file that attempt already verified is taken as it is.
+        """
+        self.download_size += file.size
+        if file.sha256 is not None and self.verified.get(file.relpath) == file.sha256:
+            return
+        self.finish_file(
+            HFDownloadItem(
+                file.relpath,
+                file.size,
+                file.url,
+                file.size,
+                save_filename,
+                sha256=file.sha256,
+                refetched=refetched,
+                blob_id=file.blob_id,
+            )
+        )
+
+    def reserve_disk_space(self):
+        """Preallocate the queued files before any download thread starts.
+
+        Only what the targets still have to grow by is required: a file
+        preallocated by an earlier attempt already holds its space. The
+        reservation is real, so a full disk fails the download here instead
+        of after most of it was fetched.
+        """
+        files: dict[str, HFDownloadItem] = dict()
+        for item in list(self.file_queue.queue):
+            files.setdefault(item.save_filename, item)
+        required = 0
+        for save_filename, item in files.items():
+            on_disk = path.getsize(save_filename) if path.exists(save_filename) else 0
+            required += max(0, item.size - on_disk)
+        free = psutil.disk_usage(self.save_path).free
+        if required > free:
+            raise NotEnoughDiskSpaceException(required, free)
+        try:
+            for item in files.values():
+                if item.segmented_file is not None:
+                    item.segmented_file.ensure_allocated()
+        except OSError as ex:
+            if ex.errno != errno.ENOSPC:
+                raise
+            raise NotEnoughDiskSpaceException(
+                required, psutil.disk_usage(self.save_path).free
+            ) from ex
 
     def enum_specific_file(
         self, file_list: list, repo_id: str, model_type: str
@@ -252,6 +513,7 @@ class HFPlaygroundDownloader:
 
             file_info = self.fs.info(repo_id)
             size = file_info.get("size", 0)
+            sha256 = (file_info.get("lfs") or {}).get("sha256")
             self.total_size += size
 
             relative_path = path.relpath(repo_id, utils.trim_repo(repo_id))
@@ -260,7 +522,9 @@ class HFPlaygroundDownloader:
             url = hf_hub_url(
                 repo_id=utils.trim_repo(repo_id), subfolder=subfolder, filename=filename
             )
-            file_list.append(HFFileItem(relative_path, size, url))
+            file_list.append(
+                HFFileItem(relative_path, size, url, sha256, file_info.get("blob_id"))
+            )
             return True
         except Exception as e:
             print(f"Warning: Failed to get info for specific file {repo_id}: {e}")
@@ -275,7 +539,7 @@ class HFPlaygroundDownloader:
         handling).
         """
         basename = path.basename(repo_id)
-        shard_match = re.search(r"-\d{5}-of-\d{5}\.gguf$", basename)
+        shard_match = gguf_header.SPLIT_GGUF_SHARD.search(basename)
         if not shard_match:
             return False
 
@@ -288,16 +552,19 @@ class HFPlaygroundDownloader:
             return False
 
         added = False
-        for item in entries:
+        # in shard order, so the first shards are complete (and announced
+        # through on_shard_completed) while the later ones still download
+        for item in sorted(entries, key=lambda item: item.get("name")):
             if item.get("type") == "directory":
                 continue
             name = item.get("name")
             base = path.basename(name)
             if not (
-                base.startswith(prefix) and re.search(r"-\d{5}-of-\d{5}\.gguf$", base)
+                base.startswith(prefix) and gguf_header.SPLIT_GGUF_SHARD.search(base)
             ):
                 continue
             size = item.get("size", 0)
+            sha256 = (item.get("lfs") or {}).get("sha256")
             self.total_size += size
             relative_path = path.relpath(name, utils.trim_repo(repo_id))
             subfolder = path.dirname(relative_path).replace("\\", "/")
@@ -305,13 +572,19 @@ class HFPlaygroundDownloader:
             url = hf_hub_url(
                 repo_id=utils.trim_repo(repo_id), subfolder=subfolder, filename=filename
             )
-            file_list.append(HFFileItem(relative_path, size, url))
+            file_list.append(
+                HFFileItem(relative_path, size, url, sha256, item.get("blob_id"))
+            )
             added = True
 
         return added
 
     def populate_file_list(
-        self, file_list: list, repo_id: str, model_type: str
+        self,
+        file_list: list,
+        repo_id: str,
+        model_type: str,
+        revision: str | None = None,
     ) -> None:
         """
         Populate file list with either specific file or directory enumeration.
@@ -323,33 +596,113 @@ class HFPlaygroundDownloader:
                 file_list, repo_id, model_type
             )
             if not specific_file_found:
-                self.enum_file_list(file_list, repo_id, model_type)
+                self.enum_file_list(file_list, repo_id, model_type, revision)
         else:
-            self.enum_file_list(file_list, repo_id, model_type)
+            self.enum_file_list(file_list, repo_id, model_type, revision)
 
     def get_model_total_size(self, repo_id: str, model_type: str):
-        key = f"{repo_id}_{model_type}"
         self.repo_id = repo_id
-        with model_lock:
-            item = model_list_cache.get(key)
+        _, total_size = self.get_file_list(repo_id, model_type)
+        return total_size
 
-        if item is None:
-            file_list = list()
-            self.populate_file_list(file_list, repo_id, model_type)
+    def get_file_list(
+        self,
+        repo_id: str,
+        model_type: str,
+        max_age: float = manifest_cache.DEFAULT_TTL,
+    ) -> tuple[list[HFFileItem], int]:
+        """Return the files to download for a repo and their total size.
+
+        Listings come from the on-disk manifest store while they are younger
+        than `max_age`. Past that, a single `model_info` call tells whether the
+        repo moved to a new commit, and only then is it enumerated again. When
+        HF cannot be reached a stale listing is returned rather than none.
+        """
+        entry = manifest_cache.get(repo_id, model_type)
+        if entry is not None and entry.age() < max_age:
+            return [HFFileItem(**item) for item in entry.files], entry.total_size
 
-            with model_lock:
-                model_list_cache.__setitem__(
-                    key, {"size": self.total_size, "queue": file_list}
-                )
-            return self.total_size
-        else:
-            return item["size"]
+        sha = self.get_repo_sha(repo_id)
+        if entry is not None and (sha is None or sha == entry.sha):
+            if sha is not None:
+                manifest_cache.mark_validated(entry)
+            return [HFFileItem(**item) for item in entry.files], entry.total_size
+
+        self.total_size = 0
+        file_list = list()
+        self.populate_file_list(file_list, repo_id, model_type, sha)
+        manifest_cache.put(
+            repo_id,
+            model_type,
+            sha,
+            self.total_size,
+            [vars(item) for item in file_list],
+        )
+        return file_list, self.total_size
+
+    def get_repo_sha(self, repo_id: str) -> str | None:
+        """Current commit sha of the repo, or None if HF could not tell us."""
+        try:
+            return self.get_model_info(repo_id).sha
+        except Exception as ex:
+            logging.warning(f"could not fetch the revision of {repo_id}: {ex}")
+            return None
 
     def enum_file_list(
-        self, file_list: list, enum_path: str, model_type: str, is_root=True
+        self,
+        file_list: list,
+        enum_path: str,
+        model_type: str,
+        revision: str | None = None,
+    ):
+        """Enumerate every file under `enum_path` with one recursive tree listing.
+
+        Diffusers-style repos have many subfolders, and listing them one
+        `fs.ls` round-trip at a time dominated enumeration. The tree is fetched
+        in a single (paginated) call and the filters run over it in memory.
+        """
+        tree = self.list_repo_tree(enum_path, revision)
+        self.select_tree_files(file_list, tree, enum_path, model_type, revision)
+
+    def list_repo_tree(
+        self, enum_path: str, revision: str | None
+    ) -> dict[str, list[dict[str, Any]]]:
+        """Map each directory under `enum_path` to its entries.
+
+        Entries have the `HfFileSystem.ls(detail=True)` shape (`name` prefixed
+        with the repo id, `size`, `type`, `blob_id`, plus the LFS `sha256`
+        when there is one) so the filters below work unchanged.
+        """
+        repo = utils.trim_repo(enum_path)
+        path_in_repo = utils.extract_model_id_pathsegments(enum_path) or None
+        listing = HfApi(token=self.hf_token).list_repo_tree(
+            repo, path_in_repo=path_in_repo, recursive=True, revision=revision
+        )
+        tree = defaultdict(list)
+        for entry in listing:
+            name = f"{repo}/{entry.path}"
+            item = {"name": name, "size": 0, "type": "directory"}
+            if not isinstance(entry, RepoFolder):
+                sha256 = entry.lfs.sha256 if entry.lfs else None
+                item.update(
+                    size=entry.size,
+                    type="file",
+                    sha256=sha256,
+                    blob_id=entry.blob_id,
+                )
+            tree[name.rsplit("/", 1)[0]].append(item)
+        return tree
+
+    def select_tree_files(
+        self,
+        file_list: list,
+        tree: dict[str, list[dict[str, Any]]],
+        enum_path: str,
+        model_type: str,
+        revision: str | None,
+        is_root=True,
     ):
-        # repo = "/".join(enum_path.split("/")[:2])
-        list = self.fs.ls(enum_path, detail=True)
+        list = tree.get(enum_path, [])
         if model_type == "stableDiffusion" and enum_path == self.repo_id + "/unet":
             list = self.enum_sd_unet(list)
         for item in list:
@@ -357,7 +710,9 @@ class HFPlaygroundDownloader:
             size: int = item.get("size")
             type: str = item.get("type")
             if type == "directory":
-                self.enum_file_list(file_list, name, model_type, False)
+                self.select_tree_files(
+                    file_list, tree, name, model_type, revision, False
+                )
             else:
                 # sd model ignore root .safetensors .pt .ckpt files
                 if (
@@ -393,8 +748,17 @@ class HFPlaygroundDownloader:
                     repo_id=utils.trim_repo(self.repo_id),
                     subfolder=subfolder,
                     filename=filename,
+                    revision=revision,
+                )
+                file_list.append(
+                    HFFileItem(
+                        relative_path,
+                        size,
+                        url,
+                        item.get("sha256"),
+                        item.get("blob_id"),
+                    )
                 )
-                file_list.append(HFFileItem(relative_path, size, url))
 
     def enum_sd_unet(self, file_list: list[str | dict[str, Any]]):
         cur_level = 0
@@ -412,100 +776,103 @@ class HFPlaygroundDownloader:
                             first_model = item
             else:
                 new_list.append(item)
-        new_list.append(first_model)
+        if first_model is not None:
+            new_list.append(first_model)
         return new_list
 
     def multiple_thread_download(self, thread_count: int):
-        self.download_stop = False
-        report_thread = None
+        self.meter = None
         if self.on_download_progress is not None:
-            self.prev_sec_download_size = 0
-            report_thread = self.start_report_download_progress()
+            self.meter = ProgressMeter(
+                lambda progress: self.on_download_progress(self.repo_id, progress)
+            )
+            self.meter.update(self.download_size, self.total_size, force=True)
         with concurrent.futures.ThreadPoolExecutor(
             max_workers=thread_count
         ) as executor:
             futures = [
-                executor.submit(self.download_model_file)
-                for _ in range(min(thread_count, self.file_queue.qsize()))
+                executor.submit(self.download_model_file, worker)
+                for worker in range(min(thread_count, self.file_queue.qsize()))
             ]
             concurrent.futures.wait(futures)
             executor.shutdown()
         self.completed = True
-        if report_thread is not None:
-            report_thread.join()
+        if self.meter is not None:
+            self.meter.update(self.download_size, self.total_size, force=True)
         if self.on_download_completed is not None:
             self.on_download_completed(self.repo_id, self.error)
         if not self.download_stop and self.error is None:
             self.move_to_desired_position()
         # On failure or user stop, keep save_path_tmp so partial files can resume later.
 
-    def move_to_desired_position(self, retriable: bool = True):
-        desired_repo_root_dir_name = os.path.join(
-            self.save_path, utils.repo_local_root_dir_name(self.repo_id)
-        )
-        move_to_flat_structure = False
+    def install_target(self) -> tuple[str, bool, bool]:
+        """Where the repo is installed: (root, flat structure, single file)."""
         # face restore and insightface models must land as a single flat *file*
         # named "<owner>---<repo>---<file>" so the reactor node can load them.
-        flatten_to_single_file = False
-        # face restore and insightface model need to be in a flat structure to work with reactor node
         if "facerestore" in self.save_path or "insightface" in self.save_path:
-            move_to_flat_structure = True
-            flatten_to_single_file = True
-            desired_repo_root_dir_name = path.abspath(
-                path.join(self.save_path, self.repo_id.replace("/", "---"))
+            return (
+                path.abspath(
+                    path.join(self.save_path, self.repo_id.replace("/", "---"))
+                ),
+                True,
+                True,
             )
-        elif "nsfw_detector" in self.save_path:
-            move_to_flat_structure = True
-            desired_repo_root_dir_name = path.abspath(
-                path.join(self.save_path, "vit-base-nsfw-detector")
+        if "nsfw_detector" in self.save_path:
+            return (
+                path.abspath(path.join(self.save_path, "vit-base-nsfw-detector")),
+                True,
+                False,
             )
-            if not os.path.exists(desired_repo_root_dir_name):
-                os.makedirs(desired_repo_root_dir_name)
-        try:
-            if os.path.exists(desired_repo_root_dir_name) or move_to_flat_structure:
-                if flatten_to_single_file:
-                    # The reactor node expects the flat name to be the file itself,
-                    # not a directory containing it. Clear any stale directory left
-                    # by an earlier (broken) download before moving the file into place.
-                    utils.remove_existing_filesystem_resource(
-                        desired_repo_root_dir_name
-                    )
-                for item in os.listdir(self.save_path_tmp):
-                    dst = (
-                        desired_repo_root_dir_name
-                        if flatten_to_single_file
-                        else os.path.join(desired_repo_root_dir_name, item)
-                    )
-                    _merge_move(
-                        os.path.join(self.save_path_tmp, item),
-                        dst,
-                    )
-                shutil.rmtree(self.save_path_tmp)
-            else:
-                rename(self.save_path_tmp, path.abspath(desired_repo_root_dir_name))
-        except Exception as e:
-            if retriable:
-                sleep(5)
-                self.move_to_desired_position(retriable=False)
-            else:
-                raise e
-
-    def start_report_download_progress(self):
-        thread = Thread(target=self.report_download_progress)
-        thread.start()
-        return thread
+        return (
+            os.path.join(self.save_path, utils.repo_local_root_dir_name(self.repo_id)),
+            False,
+            False,
+        )
 
-    def report_download_progress(self):
-        while not self.download_stop and not self.completed:
-            self.on_download_progress(
+    def move_to_desired_position(self):
+        (
+            desired_repo_root_dir_name,
+            move_to_flat_structure,
+            flatten_to_single_file,
+        ) = self.install_target()
+        if move_to_flat_structure and not flatten_to_single_file:
+            os.makedirs(desired_repo_root_dir_name, exist_ok=True)
+        steps = []
+        if os.path.exists(desired_repo_root_dir_name) or move_to_flat_structure:
+            if flatten_to_single_file:
+                # The reactor node expects the flat name to be the file itself,
+                # not a directory containing it. Clear any stale directory left
+                # by an earlier (broken) download before moving the file into place.
+                steps.append(["clear", desired_repo_root_dir_name])
+            for item in sorted(os.listdir(self.save_path_tmp)):
+                dst = (
+                    desired_repo_root_dir_name
+                    if flatten_to_single_file
+                    else os.path.join(desired_repo_root_dir_name, item)
+                )
+                steps.append(["move", os.path.join(self.save_path_tmp, item), dst])
+        else:
+            steps.append(["move", self.save_path_tmp, desired_repo_root_dir_name])
+        verified = {
+            desired_repo_root_dir_name
+            if flatten_to_single_file
+            else path.join(desired_repo_root_dir_name, relpath): sha256
+            for relpath, sha256 in self.verified.items()
+        }
+        installed = None
+        if self.file_list is not None and not flatten_to_single_file:
+            relpaths = [file.relpath for file in self.file_list]
+            for relpath in install_manifest.prunable(
+                desired_repo_root_dir_name, self.repo_id, relpaths
+            ):
+                steps.append(["remove", path.join(desired_repo_root_dir_name, relpath)])
+            installed = [
+                desired_repo_root_dir_name,
                 self.repo_id,
-                self.download_size,
-                self.total_size,
-                self.download_size - self.prev_sec_download_size,
-            )
-
-            self.prev_sec_download_size = self.download_size
-            time.sleep(1)
+                self.revision,
+                relpaths,
+            ]
+        download_finalize.commit(self.save_path_tmp, steps, verified, installed)
 
     def init_download(self, file: HFDownloadItem):
         makedirs(path.dirname(file.save_filename), exist_ok=True)
@@ -514,69 +881,113 @@ class HFPlaygroundDownloader:
         if self.hf_token is not None:
             headers["Authorization"] = f"Bearer {self.hf_token}"
 
-        if file.disk_file_size > 0:
+        # the same bytes may be on a mirror, but only a file whose contents
+        # can be checked (by sha256 or git blob id) is taken from one; a file
+        # that failed verification is fetched again from Hugging Face itself
+        verifiable = file.sha256 is not None or file.blob_id is not None
+        source = dict(
+            sha256=file.sha256,
+            use_mirrors=verifiable and not file.refetched,
+            stream=True,
+            headers=headers,
+            timeout=_DOWNLOAD_TIMEOUT,
+        )
+        if file.segment is not None:
+            # write this range in place into the preallocated file
+            file.segmented_file.ensure_allocated()
+            headers["Range"] = f"bytes={file.segment.position}-{file.segment.end - 1}"
+            response = download_mirrors.get(
+                file.url, accept=lambda code: code == 206, **source
+            )
+            # unbuffered, so the sidecar never records bytes still in a buffer
+            fw = _open_or_close(response, file.save_filename, "r+b", buffering=0)
+            fw.seek(file.segment.position)
+        elif file.disk_file_size > 0:
             # download skip exists part
             headers["Range"] = f"bytes={file.disk_file_size}-"
-            response = requests.get(
-                file.url,
-                stream=True,
-                headers=headers,
-                timeout=_DOWNLOAD_TIMEOUT,
+            response = download_mirrors.get(
+                file.url, accept=lambda code: code == 206, **source
             )
-            fw = open(file.save_filename, "ab")
+            fw = _open_or_close(response, file.save_filename, "ab")
         else:
-            response = requests.get(
-                file.url, stream=True, headers=headers, timeout=_DOWNLOAD_TIMEOUT
-            )
-            fw = open(file.save_filename, "wb")
+            response = download_mirrors.get(file.url, **source)
+            fw = _open_or_close(response, file.save_filename, "wb")
 
         return response, fw
 
     def is_access_granted(self, repo_id: str, model_type: str, backend: str):
+        """Whether the token may download the repo, probed with one HEAD request.
 
-        repo_id = utils.trim_repo(repo_id)
+        A gated repo answers 401/403 for every file without access, so there is
+        no need to enumerate it: a specific file reference is probed directly,
+        anything else through a small file from the cached model_info listing.
+        Safe to call from several threads at once.
+        """
         headers = {}
         if self.hf_token is not None:
             headers["Authorization"] = f"Bearer {self.hf_token}"
 
-        self.file_queue = queue.Queue()
-        self.repo_id = repo_id
-        self.save_path = path.join(utils.get_model_path(model_type, backend))
-        self.save_path_tmp = path.abspath(
-            path.join(self.save_path, getTmpPath(repo_id))
-        )
-
         try:
-            file_list = list()
-            self.populate_file_list(file_list, repo_id, model_type)
-            self.build_queue(file_list)
-            file = self.file_queue.get_nowait()
+            url = hf_hub_url(
+                repo_id=utils.trim_repo(repo_id),
+                filename=self.get_access_probe_file(repo_id),
+            )
+            response = http_client.head(
+                url,
+                headers=headers,
+                allow_redirects=True,
+                timeout=_REQUEST_TIMEOUT,
+            )
         except Exception as ex:
             print(f"Error checking access for {repo_id}: {ex}")
             return False
 
-        response = requests.head(
-            file.url,
-            headers=headers,
-            allow_redirects=True,
-            timeout=_REQUEST_TIMEOUT,
-        )
-
         return response.status_code == 200
 
-    def download_model_file(self):
+    def get_access_probe_file(self, repo_id: str) -> str:
+        if is_specific_file_reference(repo_id):
+            return utils.extract_model_id_pathsegments(repo_id)
+        return access_probe_file(repo_id, self.get_model_info(repo_id))
+
+    def wait_for_connection(self, worker: int) -> bool:
+        """Hold `worker` back while it is over the connection limit.
+
+        Returns whether the worker should take another file; the limit is
+        only checked between files, so a change takes effect at the next one.
+        """
+        while (
+            self.connection_limit is not None
+            and worker >= self.connection_limit
+            and not self.download_stop
+            and not self.file_queue.empty()
+        ):
+            time.sleep(0.2)
+        return not self.download_stop and not self.file_queue.empty()
+
+    def download_model_file(self, worker: int = 0):
         try:
-            while not self.download_stop and not self.file_queue.empty():
+            while self.wait_for_connection(worker):
                 file = self.file_queue.get_nowait()
                 download_retry = 0
                 while True:
                     try:
                         response, fw = self.init_download(file)
                         code = response.status_code
+                        if file.segment is not None:
+                            if code != 206:
+                                # a server ignoring Range would send the whole
+                                # file into the middle of ours
+                                response.close()
+                                fw.close()
+                                download_retry += 2
+                                raise DownloadException(file.url)
+                            self.download_segment(file, response, fw)
+                            break
                         if file.disk_file_size > 0 and code == 416:
                             response.close()
                             fw.close()
                             if path.getsize(file.save_filename) >= file.size:
+                                self.finish_file(file)
                                 break
                             download_retry += 2
                             raise DownloadException(file.url)
@@ -585,20 +996,31 @@ class HFPlaygroundDownloader:
                             fw.close()
                             download_retry += 2
                             raise DownloadException(file.url)
+                        if file.sha256 is not None and file.hasher is None:
+                            file.hasher = StreamingHasher(
+                                file.save_filename, file.disk_file_size
+                            )
                         # start download file
                         with response:
                             with fw:
-                                for bytes in response.iter_content(chunk_size=4096):
-                                    download_len = bytes.__len__()
-                                    with self.thread_lock:
-                                        self.download_size += download_len
-                                    file.disk_file_size += fw.write(bytes)
-                                    if self.download_stop:
-                                        print(
-                                            f"thread {Thread.native_id} exit by user stop"
-                                        )
-                                        break
+                                stream_to_file(
+                                    response,
+                                    fw,
+                                    on_data=lambda data: self.count_downloaded(
+                                        file, data
+                                    ),
+                                    should_stop=self.is_download_stopped,
+                                )
+                        if self.download_stop:
+                            print(f"thread {Thread.native_id} exit by user stop")
+                        elif file.disk_file_size < file.size:
+                            # connection closed early; the retry resumes
+                            raise DownloadException(file.url)
+                        else:
+                            self.finish_file(file)
                         break
+                    except (FileVerificationError, GGUFShardError):
+                        raise
                     except Exception:
                         traceback.print_exc()
                         download_retry += 1
@@ -614,15 +1036,110 @@ class HFPlaygroundDownloader:
             self.error = ex
             traceback.print_exc()
 
+    def count_downloaded(self, file: HFDownloadItem, data: memoryview):
+        length = len(data)
+        if file.segment is not None:
+            if file.hasher is not None:
+                file.hasher.update(file.segment.position, data, file.segment.start)
+            file.segmented_file.advance(file.segment, length)
+        elif file.hasher is not None:
+            file.hasher.update(file.disk_file_size, data)
+        file.disk_file_size += length
+        with self.thread_lock:
+            self.download_size += length
+            download_size = self.download_size
+        if self.meter is not None:
+            self.meter.update(download_size, self.total_size)
+
+    def is_download_stopped(self) -> bool:
+        return self.download_stop
+
+    def download_segment(self, file: HFDownloadItem, response: requests.Response, fw):
+        segment = file.segment
+        state = file.segmented_file
+        try:
+            with response:
+                with fw:
+                    stream_to_file(
+                        response,
+                        fw,
+                        limit=segment.end - segment.position,
+                        on_data=lambda data: self.count_downloaded(file, data),
+                        should_stop=self.is_download_stopped,
+                    )
+            if self.download_stop:
+                print(f"thread {Thread.native_id} exit by user stop")
+        finally:
+            state.save()
+        if not segment.done and not self.download_stop:
+            # connection closed early; the retry resumes from segment.position
+            raise DownloadException(file.url)
+        if state.finish_if_complete():
+            self.finish_file(file)
+
+    def finish_file(self, file: HFDownloadItem):
+        """Verify a file whose last byte arrived and announce finished shards.
+
+        A split GGUF shard must also carry the `split.*` header its name
+        promises; it is announced while the other shards still download.
+        """
+        if not self.verify_file(file):
+            return
+        shard = gguf_header.split_shard(file.name)
+        if shard is None:
+            return
+        try:
+            gguf_header.check_shard(file.save_filename, *shard)
+        except (OSError, ValueError) as ex:
+            raise GGUFShardError(file.url, str(ex)) from ex
+        if self.on_shard_completed is not None:
+            self.on_shard_completed(file.name, *shard, file.save_filename)
+
+    def verify_file(self, file: HFDownloadItem) -> bool:
+        """Check a completed file against its LFS sha256 or git blob id.
+
+        The sha256 was computed while the bytes were written, so this normally
+        reads nothing from disk; small files without one are checked against
+        their blob id. A mismatch deletes the file and downloads it once more
+        (returning False); a second mismatch fails the download.
+        """
+        if file.sha256 is not None:
+            hasher = file.hasher or StreamingHasher(file.save_filename)
+            algorithm, expected = "sha256", file.sha256
+            digest = hasher.hexdigest(file.size)
+        elif file.blob_id is not None:
+            algorithm, expected = "git blob id", file.blob_id
+            digest = git_blob_id(file.save_filename)
+        else:
+            return True
+        if digest == expected:
+            if file.sha256 is not None:
+                with self.thread_lock:
+                    self.verified[file.name] = digest
+                if self.on_file_verified is not None:
+                    self.on_file_verified(file.name, digest)
+            return True
+        logging.warning(
+            f"{file.name} failed verification: expected {algorithm} {expected}, got {digest}"
+        )
+        if file.refetched:
+            raise FileVerificationError(file.url, expected, digest, algorithm)
+        os.remove(file.save_filename)
+        with self.thread_lock:
+            self.download_size -= file.size
+        self.build_queue(
+            [HFFileItem(file.name, file.size, file.url, file.sha256, file.blob_id)],
+            refetched=True,
+        )
+        return False
+
     def stop_download(self):
         self.download_stop = True
 
 
-def test_download_progress(
-    repo_id: int, dowanlod_size: int, total_size: int, speed: int
-):
+def test_download_progress(repo_id: int, progress: Progress):
     print(
-        f"download {repo_id} {dowanlod_size / 1024}/{total_size / 1024}KB  speed {speed}/s"
+        f"download {repo_id} {progress.downloaded / 1024}/{progress.total / 1024}KB  speed {progress.speed:.0f}/s"
     )
 
 
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+import file_integrity
+
+# Directory listings of the model roots, so that asking whether hundreds of
+# catalog models are installed does not cost hundreds of isfile/listdir round
+# trips to a slow disk or network share. A listing is read once with
+# os.scandir and reused for as long as the directory's mtime is unchanged;
+# adding, removing or renaming an entry (which is how finished downloads land)
+# updates the mtime of the directory holding it.
+#
+# Some filesystems (FAT, many SMB shares) keep mtimes at a coarse granularity,
+# so a change right after a scan may leave the mtime as it was. A listing taken
+# while the mtime was that recent is not trusted and is read again next time.
+_MTIME_GRANULARITY_NS = 2_000_000_000
+
+# Windows paths are case-insensitive, like the os.path checks this replaces
+_key = os.path.normcase
+
+
+class _Listing:
+    mtime_ns: int
+    # entry name -> whether it is a directory
+    entries: dict[str, bool]
+    trusted: bool
+
+    def __init__(self, mtime_ns: int, entries: dict[str, bool]) -> None:
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self.trusted = time.time_ns() - mtime_ns > _MTIME_GRANULARITY_NS
+
+
+def _scan(directory: str) -> dict[str, bool]:
+    entries = dict()
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                entries[_key(entry.name)] = entry.is_dir()
+            except OSError:
+                continue
+    return entries
+
+
+class ModelIndex:
+    """Cached listings of every directory that existence checks looked into."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._listings: dict[str, _Listing] = dict()
+
+    def listing(self, directory: str) -> dict[str, bool] | None:
+        """The entries of `directory`, or None if it is not a directory."""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._listings.pop(directory, None)
+            return None
+        with self._lock:
+            cached = self._listings.get(directory)
+        if cached is not None and cached.trusted and cached.mtime_ns == mtime_ns:
+            return cached.entries
+        try:
+            listing = _Listing(mtime_ns, _scan(directory))
+        except OSError:
+            return None
+        with self._lock:
+            self._listings[directory] = listing
+        return listing.entries
+
+
+class Lookup:
+    """Existence checks for one batch query.
+
+    Each directory is revalidated at most once per lookup, so a batch costs
+    one stat per distinct directory and a dict lookup per path.
+    """
+
+    def __init__(self, index: ModelIndex) -> None:
+        self.index = index
+        self._listings: dict[str, dict[str, bool] | None] = dict()
+
+    def names(self, directory: str) -> list[str]:
+        entries = self._listing(os.path.abspath(directory))
+        return [] if entries is None else list(entries)
+
+    def exists(self, path: str) -> bool:
+        return self._entry(path) is not None
+
+    def is_dir(self, path: str) -> bool:
+        return self._entry(path) is True
+
+    def is_file(self, path: str) -> bool:
+        return self._entry(path) is False
+
+    def is_intact_file(self, path: str) -> bool:
+        """Like file_integrity.is_intact_file, without the isfile round trip."""
+        if not self.is_file(path):
+            return False
+        size = file_integrity.verified_size(path)
+        if size is None:
+            return True
+        try:
+            return os.path.getsize(path) == size
+        except OSError:
+            return False
+
+    def _entry(self, path: str) -> bool | None:
+        directory, name = os.path.split(os.path.abspath(path))
+        entries = self._listing(directory)
+        return None if entries is None else entries.get(_key(name))
+
+    def _listing(self, directory: str) -> dict[str, bool] | None:
+        key = _key(directory)
+        if key not in self._listings:
+            self._listings[key] = self.index.listing(directory)
+        return self._listings[key]
+
+
+_index = ModelIndex()
+
+
+def lookup() -> Lookup:
+    return Lookup(_index)
@@ -0,0 +1,228 @@
+"""Throughput and resume benchmark for the model download path.
+
+Starts tests/fake_hf_server.py in its own process, points huggingface_hub at
+it and downloads its repo with `HFPlaygroundDownloader.download` and
+`FileDownloader.download_file`, cleanly and with injected faults:
+
+    python tests/bench_download.py --size-mb 512 --threads 4 --json before.json
+
+For every scenario it reports MB/s, CPU seconds per GB (of this process only;
+the server runs in its own), the peak RSS of this process so far, the requests
+and bytes the server handled, and whether every downloaded file is intact.
+`overfetch` is how much more than the repo size was sent, e.g. ranges fetched
+again after a reset or a resumed stop. Nothing touches the network, and the
+service's ./cache is redirected to a scratch directory.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+_TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+_SERVICE_DIR = os.path.dirname(_TESTS_DIR)
+_REPO_ID = "bench/model"
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class Bench:
+    def __init__(self, endpoint: str, workdir: str, threads: int) -> None:
+        self.endpoint = endpoint
+        self.workdir = workdir
+        self.threads = threads
+        with urllib.request.urlopen(
+            f"{endpoint}/api/models/{_REPO_ID}/tree/main?recursive=true"
+        ) as response:
+            tree = json.load(response)
+        # sha256 for LFS files, git blob id (sha1) for the rest
+        self.expected = {
+            entry["path"]: entry["lfs"]["oid"] if "lfs" in entry else entry["oid"]
+            for entry in tree
+            if entry["type"] == "file"
+        }
+        self.total_size = sum(
+            entry["size"] for entry in tree if entry["type"] == "file"
+        )
+
+    def _control(self, path: str, data: dict | None = None) -> dict:
+        request = urllib.request.Request(
+            self.endpoint + path,
+            data=None if data is None else json.dumps(data).encode("utf-8"),
+            method="GET" if data is None else "POST",
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    def _intact(self, files: dict[str, str]) -> bool:
+        for relpath, file_path in files.items():
+            expected = self.expected[relpath]
+            if len(expected) == 64:
+                digest = hashlib.sha256()
+            else:
+                digest = hashlib.sha1(b"blob %d\0" % os.path.getsize(file_path))
+            with open(file_path, "rb") as f:
+                while chunk := f.read(8 * 1024 * 1024):
+                    digest.update(chunk)
+            if digest.hexdigest() != expected:
+                return False
+        return True
+
+    def run(self, name: str, download, **faults):
+        self._control("/_faults", faults)
+        self._control("/_stats/reset", {})
+        target = os.path.join(self.workdir, "models", name)
+        started, cpu_started = time.perf_counter(), time.process_time()
+        files, size = download(target)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        stats = self._control("/_stats")
+        return {
+            "scenario": name,
+            "mb_per_s": round(size / 2**20 / elapsed, 1),
+            "cpu_s_per_gb": round(cpu / (size / 2**30), 2),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "requests": stats["requests"],
+            "resets": stats["resets"],
+            "overfetch": round(stats["bytes_sent"] / size - 1, 3),
+            "intact": self._intact(files),
+        }
+
+    def repo(self, stop_at: float | None = None):
+        """Download the repo; optionally stop at `stop_at` and resume in a new downloader."""
+        from model_downloader import HFPlaygroundDownloader
+
+        def download(target: str):
+            if stop_at is not None:
+                first = HFPlaygroundDownloader()
+
+                def stop_early(repo_id, progress):
+                    if progress.downloaded >= stop_at * progress.total:
+                        first.stop_download()
+
+                first.on_download_progress = stop_early
+                first.download(_REPO_ID, "ggufLLM", "llama_cpp", target, self.threads)
+            downloader = HFPlaygroundDownloader()
+            downloader.download(_REPO_ID, "ggufLLM", "llama_cpp", target, self.threads)
+            if downloader.error is not None:
+                raise downloader.error
+            root = os.path.join(target, "bench---model")
+            files = {relpath: os.path.join(root, relpath) for relpath in self.expected}
+            return files, self.total_size
+
+        return download
+
+    def single_file(self):
+        from file_downloader import FileDownloader
+
+        relpath = max(self.expected, key=lambda p: len(self.expected[p]))
+
+        def download(target: str):
+            errors = []
+            downloader = FileDownloader()
+            downloader.on_download_completed = lambda name, error: errors.append(error)
+            file_path = os.path.join(target, relpath)
+            downloader.download_file(
+                f"{self.endpoint}/{_REPO_ID}/resolve/main/{relpath}", file_path
+            )
+            if errors[0] is not None:
+                raise errors[0]
+            return {relpath: file_path}, os.path.getsize(file_path)
+
+        return download
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--throttle-mbps",
+        type=float,
+        default=0,
+        help="also run a scenario with each response limited to this many MB/s",
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(_TESTS_DIR, "fake_hf_server.py"),
+            "--size-mb",
+            str(args.size_mb),
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    workdir = tempfile.mkdtemp(prefix="aipg-bench-")
+    try:
+        port = json.loads(server.stdout.readline())["port"]
+        endpoint = f"http://127.0.0.1:{port}"
+        # read by huggingface_hub at import, and ./cache is resolved at import
+        os.environ["HF_ENDPOINT"] = endpoint
+        os.environ["HF_HUB_DISABLE_TELEMETRY"] = "1"
+        os.chdir(workdir)
+        sys.path.insert(0, _SERVICE_DIR)
+
+        bench = Bench(endpoint, workdir, args.threads)
+        scenarios = [
+            ("repo", bench.repo(), {}),
+            ("repo_resets", bench.repo(), {"reset_every": 3}),
+            ("repo_stop_resume", bench.repo(stop_at=0.4), {}),
+            ("file", bench.single_file(), {}),
+            (
+                "file_reset",
+                bench.single_file(),
+                {"reset_every": 1, "max_resets": 1},
+            ),
+        ]
+        if args.throttle_mbps:
+            throttle = int(args.throttle_mbps * 2**20)
+            scenarios.append(("repo_throttled", bench.repo(), {"throttle": throttle}))
+        results = []
+        for name, download, faults in scenarios:
+            result = bench.run(name, download, **faults)
+            results.append(result)
+            print(
+                "  ".join(f"{key}={value}" for key, value in result.items()),
+                flush=True,
+            )
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(
+                    {
+                        "size_mb": args.size_mb,
+                        "threads": args.threads,
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                )
+        if not all(result["intact"] for result in results):
+            sys.exit(1)
+    finally:
+        server.stdin.close()
+        server.wait(10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
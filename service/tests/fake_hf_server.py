@@ -0,0 +1,299 @@
+"""A local stand-in for the parts of the Hugging Face Hub the downloader talks to.
+
+Serves `model_info`, the recursive tree listing and `resolve` downloads (with
+ranges, 206/416 and keep-alive) for repos of generated files, so the download
+path can be exercised and measured without the network. Faults can be injected
+while it runs: a per-response bandwidth limit and connections that are reset
+halfway through every Nth file body.
+
+Run it in its own process for benchmarks, so its CPU time is not counted
+against the client:
+
+    python tests/fake_hf_server.py --size-mb 256
+
+prints `{"port": ...}` once it listens. POST /_faults with
+`{"throttle": bytes_per_second, "reset_every": n, "max_resets": k}` changes the faults and
+GET /_stats returns (and POST /_stats/reset clears) the request counters.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+REVISION = "0123456789abcdef0123456789abcdef01234567"
+_BLOCK_SIZE = 1024 * 1024
+_SEND_SIZE = 256 * 1024
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+
+class FakeFile:
+    """A file of `size` bytes generated from a seed, never held in memory whole."""
+
+    def __init__(self, path: str, size: int, lfs: bool = True, seed: int = 0) -> None:
+        self.path = path
+        self.size = size
+        self.lfs = lfs
+        self._block = random.Random(seed).randbytes(_BLOCK_SIZE)
+        digest = hashlib.sha256()
+        blob = hashlib.sha1(b"blob %d\0" % size)
+        for start in range(0, size, _BLOCK_SIZE):
+            chunk = self.read(start, min(start + _BLOCK_SIZE, size))
+            digest.update(chunk)
+            blob.update(chunk)
+        self.sha256 = digest.hexdigest()
+        self.blob_id = blob.hexdigest()
+
+    def read(self, start: int, end: int) -> bytes:
+        chunks = []
+        while start < end:
+            offset = start % _BLOCK_SIZE
+            length = min(end - start, _BLOCK_SIZE - offset)
+            chunks.append(self._block[offset : offset + length])
+            start += length
+        return b"".join(chunks)
+
+
+class FakeHub:
+    repos: dict[str, list[FakeFile]]
+    # bytes per second per response, 0 for unlimited
+    throttle: int
+    # cut every Nth file body halfway, 0 for never
+    reset_every: int
+    # stop cutting after this many resets, 0 for no limit
+    max_resets: int
+
+    def __init__(self, repos: dict[str, list[FakeFile]]) -> None:
+        self.repos = repos
+        self.throttle = 0
+        self.reset_every = 0
+        self.max_resets = 0
+        self._lock = threading.Lock()
+        self.clear_stats()
+
+    def clear_stats(self) -> None:
+        with self._lock:
+            self.stats = {
+                "requests": 0,
+                "file_requests": 0,
+                "bytes_sent": 0,
+                "resets": 0,
+            }
+
+    def count(self, **deltas) -> int:
+        with self._lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+            return self.stats["file_requests"]
+
+    def find(self, repo_id: str, file_path: str) -> FakeFile | None:
+        for file in self.repos.get(repo_id, []):
+            if file.path == file_path:
+                return file
+        return None
+
+
+class _HubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hub: FakeHub
+
+    def do_HEAD(self) -> None:
+        self._route(send_body=False)
+
+    def do_GET(self) -> None:
+        self._route(send_body=True)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/_faults":
+            self.hub.throttle = int(body.get("throttle", 0))
+            self.hub.reset_every = int(body.get("reset_every", 0))
+            self.hub.max_resets = int(body.get("max_resets", 0))
+            self._json({})
+        elif self.path == "/_stats/reset":
+            self.hub.clear_stats()
+            self._json({})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def _route(self, send_body: bool) -> None:
+        self.hub.count(requests=1)
+        path = unquote(urlsplit(self.path).path)
+        if path == "/_stats":
+            self._json(self.hub.stats)
+            return
+        match = re.match(r"/api/models/([^/]+/[^/]+)(?:/revision/[^/]+)?$", path)
+        if match:
+            self._model_info(match.group(1))
+            return
+        match = re.match(r"/api/models/([^/]+/[^/]+)/tree/[^/]+/?(.*)$", path)
+        if match:
+            self._tree(match.group(1), match.group(2))
+            return
+        match = re.match(r"/([^/]+/[^/]+)/resolve/[^/]+/(.+)$", path)
+        if match:
+            self._resolve(match.group(1), match.group(2), send_body)
+            return
+        self._json({"error": "not found"}, 404)
+
+    def _model_info(self, repo_id: str) -> None:
+        if repo_id not in self.hub.repos:
+            self._json({"error": "Repository not found"}, 404)
+            return
+        self._json(
+            {
+                "id": repo_id,
+                "modelId": repo_id,
+                "sha": REVISION,
+                "private": False,
+                "gated": False,
+                "siblings": [{"rfilename": f.path} for f in self.hub.repos[repo_id]],
+            }
+        )
+
+    def _tree(self, repo_id: str, prefix: str) -> None:
+        if repo_id not in self.hub.repos:
+            self._json({"error": "Repository not found"}, 404)
+            return
+        entries, folders = [], set()
+        for file in self.hub.repos[repo_id]:
+            if prefix and not file.path.startswith(prefix.rstrip("/") + "/"):
+                continue
+            parts = file.path.split("/")
+            for depth in range(1, len(parts)):
+                folders.add("/".join(parts[:depth]))
+            entry = {
+                "type": "file",
+                "oid": file.blob_id,
+                "size": file.size,
+                "path": file.path,
+            }
+            if file.lfs:
+                entry["lfs"] = {
+                    "oid": file.sha256,
+                    "size": file.size,
+                    "pointerSize": 134,
+                }
+            entries.append(entry)
+        for folder in sorted(folders):
+            if not prefix or folder.startswith(prefix.rstrip("/") + "/"):
+                entries.append({"type": "directory", "oid": "0" * 40, "path": folder})
+        self._json(entries)
+
+    def _resolve(self, repo_id: str, file_path: str, send_body: bool) -> None:
+        file = self.hub.find(repo_id, file_path)
+        if file is None:
+            self._json({"error": "Entry not found"}, 404)
+            return
+        start, end = 0, file.size
+        requested = _RANGE.match(self.headers.get("Range", ""))
+        if requested is not None:
+            start = int(requested.group(1))
+            if requested.group(2):
+                end = min(end, int(requested.group(2)) + 1)
+            if start >= file.size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{file.size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{file.size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{file.sha256}"')
+        self.send_header("X-Repo-Commit", REVISION)
+        self.end_headers()
+        if not send_body:
+            return
+        number = self.hub.count(file_requests=1)
+        cut = None
+        resets_left = (
+            not self.hub.max_resets or self.hub.stats["resets"] < self.hub.max_resets
+        )
+        if self.hub.reset_every and number % self.hub.reset_every == 0 and resets_left:
+            cut = start + (end - start) // 2
+        self._send_range(file, start, end, cut)
+
+    def _send_range(
+        self, file: FakeFile, start: int, end: int, cut: int | None
+    ) -> None:
+        started = time.monotonic()
+        sent = 0
+        position = start
+        while position < end:
+            if cut is not None and position >= cut:
+                self.hub.count(resets=1)
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            length = min(_SEND_SIZE, end - position)
+            if cut is not None:
+                length = min(length, cut - position)
+            try:
+                self.wfile.write(file.read(position, position + length))
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+                return
+            position += length
+            sent += length
+            self.hub.count(bytes_sent=length)
+            if self.hub.throttle:
+                ahead = sent / self.hub.throttle - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def _json(self, data, status: int = 200) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve(hub: FakeHub, port: int = 0) -> ThreadingHTTPServer:
+    """Serve `hub` on 127.0.0.1 from a daemon thread."""
+    handler = type("HubHandler", (_HubHandler,), {"hub": hub})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark_repos(size: int) -> dict[str, list[FakeFile]]:
+    """One large LFS weight file plus the small git files a model repo has."""
+    return {
+        "bench/model": [
+            FakeFile("config.json", 1024, lfs=False, seed=1),
+            FakeFile("tokenizer/tokenizer.json", 2 * 1024 * 1024, lfs=False, seed=2),
+            FakeFile("model.safetensors", size, seed=3),
+        ]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--size-mb", type=int, default=256)
+    args = parser.parse_args()
+    server = serve(FakeHub(benchmark_repos(args.size_mb * 1024 * 1024)), args.port)
+    print(json.dumps({"port": server.server_port}), flush=True)
+    try:
+        sys.stdin.read()  # exit with the parent
+    finally:
+        server.shutdown()
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+_SERVICE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, _SERVICE_DIR)
+sys.path.insert(0, os.path.join(_SERVICE_DIR, "..", "backend_shared"))
+
+import async_api  # noqa: E402
+import download_scheduler  # noqa: E402
+import httpx  # noqa: E402
+import manifest_cache  # noqa: E402
+import model_downloader  # noqa: E402
+from download_progress import ProgressHub  # noqa: E402
+from flask import Flask, jsonify, request  # noqa: E402
+
+_TOKEN = "test-token"
+_AUTH = {"X-AIPG-Auth": _TOKEN}
+
+
+class FakeScheduler:
+    """Just enough of DownloadScheduler for one streamed job."""
+
+    def __init__(self) -> None:
+        self._hub = ProgressHub()
+        self.state = download_scheduler.QUEUED
+
+    def submit(self, items, hf_token=None):
+        item = items[0]
+        return [
+            download_scheduler.DownloadJob(
+                "job", item.repo_id, item.type, item.backend, item.model_path
+            )
+        ]
+
+    def submit_followed(self, items, hf_token=None):
+        return self.subscribe(self.submit(items, hf_token))
+
+    def resume_all_followed(self, hf_token=None):
+        return None
+
+    def subscribe(self, jobs):
+        subscription = self._hub.subscribe(job.id for job in jobs)
+        return download_scheduler.JobSubscription(self, subscription)
+
+    def states(self, job_ids):
+        return [self.state for _ in job_ids]
+
+    def unsubscribe(self, subscription):
+        self._hub.unsubscribe(subscription.subscription)
+
+    def complete(self) -> None:
+        self.state = download_scheduler.COMPLETED
+        self._hub.event("job", {"type": "download_model_completed"})
+
+
+class TestAsyncApi(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        flask_app = Flask(__name__)
+
+        @flask_app.post("/api/echo")
+        def echo():
+            return jsonify(
+                {"remote_addr": request.remote_addr, "json": request.get_json()}
+            )
+
+        self.hf_requests = []
+        self.in_flight = self.max_in_flight = 0
+        hf = httpx.AsyncClient(transport=httpx.MockTransport(self.fake_hf))
+        self.api = async_api.AsyncApi(flask_app, _TOKEN, client=hf)
+        patcher = mock.patch.dict(model_downloader._model_info_cache, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def fake_hf(self, hf_request: httpx.Request) -> httpx.Response:
+        self.hf_requests.append(hf_request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        repo_id = hf_request.url.path.removeprefix("/api/models/")
+        if hf_request.method == "HEAD":
+            granted = "Authorization" in hf_request.headers
+            return httpx.Response(200 if granted else 401)
+        return httpx.Response(
+            200,
+            json={
+                "id": repo_id,
+                "sha": "abc",
+                "gated": "auto" if repo_id.endswith("gated") else False,
+                "private": False,
+                "siblings": [{"rfilename": "model.bin"}, {"rfilename": "config.json"}],
+            },
+        )
+
+    def client(self, remote_addr="127.0.0.1") -> httpx.AsyncClient:
+        transport = httpx.ASGITransport(self.api, client=(remote_addr, 50000))
+        return httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1")
+
+    async def test_loopback_auth_and_cors_match_the_flask_hooks(self):
+        async with self.client("10.0.0.2") as client:
+            response = await client.get("/healthy")
+            self.assertEqual(response.status_code, 403)
+        async with self.client() as client:
+            self.assertEqual((await client.get("/healthy")).status_code, 200)
+            response = await client.post("/api/getModelSize", json=[])
+            self.assertEqual(response.status_code, 401)
+
+            response = await client.options(
+                "/api/getModelSize", headers={"Origin": "http://localhost:5173"}
+            )
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(
+                response.headers["Access-Control-Allow-Origin"],
+                "http://localhost:5173",
+            )
+            response = await client.get(
+                "/healthy", headers={"Origin": "https://example.com"}
+            )
+            self.assertNotIn("Access-Control-Allow-Origin", response.headers)
+
+    async def test_gating_probes_share_a_bounded_number_of_hf_requests(self):
+        self.api._hf_slots = asyncio.Semaphore(2)
+        items = [{"repo_id": f"org/repo{i}"} for i in range(10)]
+        items += [{"repo_id": "org/repo0"}, {"repo_id": "org/gated"}]
+        async with self.client() as client:
+            response = await client.post(
+                "/api/isModelGated", json=[items, ""], headers=_AUTH
+            )
+            gated = response.json()["gatedList"]
+            # the access checks reuse the model_info just fetched
+            response = await client.post(
+                "/api/isAccessGranted",
+                json=[[{"repo_id": "org/gated"}], "hf_token"],
+                headers=_AUTH,
+            )
+        self.assertEqual(len(gated), 11)
+        self.assertTrue(gated["org/gated"])
+        self.assertFalse(gated["org/repo0"])
+        self.assertEqual(self.max_in_flight, 2)
+        self.assertEqual(response.json(), {"accessList": {"org/gated": True}})
+        head = self.hf_requests[-1]
+        self.assertEqual(head.method, "HEAD")
+        self.assertTrue(head.url.path.endswith("/config.json"))
+
+    async def test_stale_size_is_revalidated_without_enumerating(self):
+        entry = manifest_cache.RepoManifest("org/repo", "llm", "abc", 2048, [], 0.0)
+        with (
+            mock.patch.object(manifest_cache, "get", return_value=entry),
+            mock.patch.object(manifest_cache, "mark_validated") as mark_validated,
+            mock.patch.object(model_downloader, "HFPlaygroundDownloader") as downloader,
+        ):
+            async with self.client() as client:
+                response = await client.post(
+                    "/api/getModelSize",
+                    json=[{"repo_id": "org/repo", "type": "llm"}],
+                    headers=_AUTH,
+                )
+        self.assertEqual(response.json()["sizeList"], {"org/repo_llm": "2.00K"})
+        mark_validated.assert_called_once_with(entry)
+        downloader.assert_not_called()
+
+    async def test_download_stream_is_served_from_the_event_loop(self):
+        scheduler = FakeScheduler()
+        body = {
+            "data": [
+                {
+                    "type": "llm",
+                    "repo_id": "org/repo",
+                    "backend": "openvino",
+                    "model_path": "models",
+                    "additionalLicenseLink": None,
+                }
+            ]
+        }
+        finisher = threading.Timer(0.2, scheduler.complete)
+        with mock.patch.object(
+            download_scheduler, "get_scheduler", return_value=scheduler
+        ):
+            async with self.client() as client:
+                finisher.start()
+                started = time.monotonic()
+                response = await client.post(
+                    "/api/downloadModel", json=body, headers=_AUTH
+                )
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(response.headers["content-type"], "text/event-stream")
+        self.assertEqual(
+            response.text,
+            'data:{"type": "download_jobs", "job_ids": ["job"]}\0'
+            'data:{"type": "download_model_completed"}\0data:{"type": "allComplete"}\0',
+        )
+        self.assertFalse(scheduler._hub.is_subscribed("job"))
+
+    async def test_resume_with_nothing_paused_is_not_reported_complete(self):
+        with mock.patch.object(
+            download_scheduler, "get_scheduler", return_value=FakeScheduler()
+        ):
+            async with self.client() as client:
+                response = await client.post("/api/downloadJobs/resume", headers=_AUTH)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["message"], "no paused download jobs")
+
+    async def test_every_request_is_announced_before_it_is_handled(self):
+        seen = []
+        self.api.on_request = lambda: seen.append(time.monotonic())
+        async with self.client("10.0.0.2") as client:
+            await client.get("/healthy")
+        self.assertEqual(len(seen), 1)
+
+    async def test_other_routes_are_served_by_the_flask_app(self):
+        async with self.client() as client:
+            response = await client.post("/api/echo", json={"a": 1}, headers=_AUTH)
+        self.assertEqual(
+            response.json(), {"remote_addr": "127.0.0.1", "json": {"a": 1}}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
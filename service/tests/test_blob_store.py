@@ -0,0 +1,87 @@
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import blob_store
+import file_integrity
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved_dir = blob_store._STORE_DIR
+        blob_store._STORE_DIR = os.path.join(self._tmp.name, "blobs")
+        self._saved_records = file_integrity._VERIFIED_FILES_PATH
+        file_integrity._VERIFIED_FILES_PATH = os.path.join(
+            self._tmp.name, "verified-files.json"
+        )
+        file_integrity._verified = None
+
+    def tearDown(self):
+        blob_store._STORE_DIR = self._saved_dir
+        file_integrity._VERIFIED_FILES_PATH = self._saved_records
+        file_integrity._verified = None
+        self._tmp.cleanup()
+
+    def _write(self, relpath: str, data: bytes) -> str:
+        file_path = os.path.join(self._tmp.name, relpath)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return file_path
+
+    def test_same_weights_in_two_backends_share_one_blob(self):
+        comfy = self._write("comfy/vae/ae.safetensors", b"weights")
+        openvino = self._write("openvino/vae/ae.safetensors", b"weights")
+
+        self.assertTrue(blob_store.adopt(comfy, _sha(b"weights")))
+        self.assertTrue(blob_store.adopt(openvino, _sha(b"weights")))
+
+        self.assertTrue(os.path.samefile(comfy, openvino))
+        self.assertEqual(os.stat(blob_store.blob_path(_sha(b"weights"))).st_nlink, 3)
+        with open(openvino, "rb") as f:
+            self.assertEqual(f.read(), b"weights")
+
+    def test_a_blob_edited_in_place_is_replaced_not_linked(self):
+        comfy = self._write("comfy/vae/ae.safetensors", b"weights")
+        openvino = self._write("openvino/vae/ae.safetensors", b"weights")
+        blob_store.adopt(comfy, _sha(b"weights"))
+        with open(comfy, "r+b") as f:
+            f.write(b"W")  # same size, different bytes
+
+        self.assertTrue(blob_store.adopt(openvino, _sha(b"weights")))
+        self.assertFalse(os.path.samefile(comfy, openvino))
+        self.assertTrue(
+            os.path.samefile(openvino, blob_store.blob_path(_sha(b"weights")))
+        )
+        with open(openvino, "rb") as f:
+            self.assertEqual(f.read(), b"weights")
+
+    def test_garbage_collection_keeps_blobs_still_linked(self):
+        kept = self._write("comfy/kept.bin", b"kept")
+        deleted = self._write("comfy/deleted.bin", b"deleted")
+        blob_store.adopt(kept, "aa01")
+        blob_store.adopt(deleted, "bb02")
+        os.remove(deleted)  # the user deleted that model
+
+        self.assertEqual(blob_store.collect_garbage(), len(b"deleted"))
+        self.assertTrue(os.path.exists(blob_store.blob_path("aa01")))
+        self.assertFalse(os.path.exists(os.path.dirname(blob_store.blob_path("bb02"))))
+
+    def test_link_or_copy_replaces_the_destination(self):
+        src = self._write("storage/model.onnx", b"new")
+        dst = self._write("ComfyUI/models/insightface/model.onnx", b"old")
+        blob_store.link_or_copy(src, dst)
+        self.assertTrue(os.path.samefile(src, dst))
+
+
+if __name__ == "__main__":
+    unittest.main()
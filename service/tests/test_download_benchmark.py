@@ -0,0 +1,35 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+_BENCH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_download.py")
+
+
+@unittest.skipIf(
+    importlib.util.find_spec("huggingface_hub") is None
+    or importlib.util.find_spec("requests") is None,
+    "needs the real download stack",
+)
+class TestDownloadBenchmark(unittest.TestCase):
+    def test_every_scenario_survives_resets_and_resumes_intact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            results_path = os.path.join(tmp, "results.json")
+            subprocess.run(
+                [sys.executable, _BENCH, "--size-mb", "24", "--json", results_path],
+                check=True,
+                capture_output=True,
+                timeout=120,
+            )
+            with open(results_path) as f:
+                results = {r["scenario"]: r for r in json.load(f)["results"]}
+        self.assertTrue(all(r["intact"] for r in results.values()))
+        self.assertGreater(results["repo_resets"]["resets"], 0)
+        self.assertEqual(results["file_reset"]["resets"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
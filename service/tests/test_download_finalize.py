@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import download_finalize
+
+
+class TestDownloadFinalize(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        patcher = mock.patch.object(
+            download_finalize, "_JOURNAL_DIR", os.path.join(self.root, "journal")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.staging = os.path.join(self.root, "models", "abc_tmp")
+        self.target = os.path.join(self.root, "models", "org---repo")
+        self._write(os.path.join(self.target, "unet", "turbo.safetensors"), b"turbo")
+        self._write(os.path.join(self.staging, "unet", "main.safetensors"), b"main")
+        self._write(os.path.join(self.staging, "vae", "ae.safetensors"), b"vae")
+        self.steps = [
+            ["move", os.path.join(self.staging, item), os.path.join(self.target, item)]
+            for item in ("unet", "vae")
+        ]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, file_path, data):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    def _assert_merged(self):
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.target, "unet"))),
+            ["main.safetensors", "turbo.safetensors"],
+        )
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.target, "vae", "ae.safetensors"))
+        )
+        self.assertFalse(os.path.exists(self.staging))
+        self.assertEqual(os.listdir(download_finalize._JOURNAL_DIR), [])
+
+    def test_new_directories_are_renamed_whole_into_an_existing_tree(self):
+        vae_inode = os.stat(os.path.join(self.staging, "vae")).st_ino
+        download_finalize.commit(self.staging, self.steps, {})
+
+        self._assert_merged()
+        self.assertEqual(os.stat(os.path.join(self.target, "vae")).st_ino, vae_inode)
+
+    def test_a_file_replaces_a_directory_of_the_same_name(self):
+        # an older, broken download left a directory where the repo has a file
+        self._write(os.path.join(self.target, "vae", "ae.safetensors", "x"), b"old")
+        download_finalize.commit(self.staging, self.steps, {})
+
+        self._assert_merged()
+        with open(os.path.join(self.target, "vae", "ae.safetensors"), "rb") as f:
+            self.assertEqual(f.read(), b"vae")
+
+    def test_interrupted_finalize_is_rolled_forward(self):
+        moved = []
+        real_replace = os.replace
+
+        # the journal is written, then unet/ is merged and vae/ stays locked
+        def replace_once(src, dst):
+            if len(moved) == 2:
+                raise PermissionError(src)
+            moved.append(dst)
+            real_replace(src, dst)
+
+        with (
+            mock.patch.object(download_finalize, "_RETRY_DELAYS", ()),
+            mock.patch.object(download_finalize.os, "replace", replace_once),
+        ):
+            with self.assertRaises(PermissionError):
+                download_finalize.commit(self.staging, self.steps, {})
+        (journal,) = os.listdir(download_finalize._JOURNAL_DIR)
+        with open(os.path.join(download_finalize._JOURNAL_DIR, journal)) as f:
+            self.assertEqual(json.load(f)["steps"], self.steps)
+
+        self.assertEqual(download_finalize.recover(), 1)
+        self._assert_merged()
+
+
+if __name__ == "__main__":
+    unittest.main()
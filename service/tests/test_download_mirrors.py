@@ -0,0 +1,139 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fake_hf_server import FakeFile, FakeHub, serve
+from test_model_downloader import _install_heavy_import_stubs
+
+_install_heavy_import_stubs()
+
+import blob_server  # noqa: E402
+import blob_store  # noqa: E402
+import config  # noqa: E402
+import download_mirrors  # noqa: E402
+import file_downloader  # noqa: E402
+import http_client  # noqa: E402
+
+_URL = "https://huggingface.co/org/repo/resolve/abc/unet/model.bin"
+_SHA = "ab" * 32
+
+
+class TestCandidates(unittest.TestCase):
+    def test_mirrors_keep_the_url_layout_and_peers_need_a_sha(self):
+        mirrors = ["http://cache.lan/hf/", "peer+http://10.0.0.5:59990"]
+        with mock.patch.object(config, "download_mirrors", mirrors):
+            self.assertEqual(
+                download_mirrors.candidates(_URL),
+                [
+                    (
+                        "http://cache.lan/hf/",
+                        "http://cache.lan/hf/huggingface.co/org/repo/resolve/abc/unet/model.bin",
+                    )
+                ],
+            )
+            self.assertEqual(
+                download_mirrors.candidates(_URL, _SHA)[1],
+                ("peer+http://10.0.0.5:59990", f"http://10.0.0.5:59990/blobs/{_SHA}"),
+            )
+
+
+@unittest.skipIf(http_client.requests.Session is object, "needs requests")
+class TestMirrorChain(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.mirror_dir = os.path.join(self._tmp.name, "mirror")
+        patcher = mock.patch.object(
+            blob_store, "_STORE_DIR", os.path.join(self._tmp.name, "blobs")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _get(self, mirrors, **kwargs):
+        with mock.patch.object(config, "download_mirrors", mirrors):
+            return download_mirrors.get(
+                _URL,
+                _SHA,
+                accept=lambda code: code == 206,
+                headers={"Range": "bytes=2-5", "Authorization": "Bearer hf_x"},
+                **kwargs,
+            )
+
+    def test_range_is_read_from_a_local_mirror_directory(self):
+        path = os.path.join(
+            self.mirror_dir, "huggingface.co/org/repo/resolve/abc/unet/model.bin"
+        )
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"0123456789")
+        with self._get([self.mirror_dir]) as response:
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response.content, b"2345")
+
+    def test_peer_is_asked_after_a_mirror_without_the_file(self):
+        os.makedirs(os.path.dirname(blob_store.blob_path(_SHA)))
+        with open(blob_store.blob_path(_SHA), "wb") as f:
+            f.write(b"0123456789")
+        server = blob_server.serve("127.0.0.1:0")
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        peer = f"peer+http://127.0.0.1:{server.server_port}"
+        with self._get([self.mirror_dir, peer], stream=True) as response:
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response.content, b"2345")
+            self.assertNotIn("Authorization", response.request.headers)
+
+
+@unittest.skipIf(http_client.requests.Session is object, "needs requests")
+class TestFileDownloaderMirrors(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.file = FakeFile("model.bin", 4096, seed=7)
+        server = serve(FakeHub({"org/repo": [self.file]}))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = (
+            f"http://127.0.0.1:{server.server_port}/org/repo/resolve/main/model.bin"
+        )
+        mirror_dir = os.path.join(self._tmp.name, "mirror")
+        self.mirror_copy = os.path.join(
+            mirror_dir,
+            f"127.0.0.1:{server.server_port}/org/repo/resolve/main/model.bin",
+        )
+        os.makedirs(os.path.dirname(self.mirror_copy))
+        with open(self.mirror_copy, "wb") as f:
+            f.write(b"not the model" * 100)
+        patcher = mock.patch.object(config, "download_mirrors", [mirror_dir])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _download(self, sha256):
+        errors = []
+        downloader = file_downloader.FileDownloader()
+        downloader.on_download_completed = lambda name, error: errors.append(error)
+        target = os.path.join(self._tmp.name, "out", "model.bin")
+        downloader.download_file(self.url, target, sha256)
+        return target, errors[0]
+
+    def test_a_corrupt_mirror_copy_is_fetched_again_from_the_origin(self):
+        target, error = self._download(self.file.sha256)
+        self.assertIsNone(error)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), self.file.read(0, self.file.size))
+
+    def test_a_file_without_a_digest_never_comes_from_a_mirror(self):
+        with mock.patch.object(http_client, "get", wraps=http_client.get) as get:
+            _, error = self._download(None)
+        self.assertIsNone(error)
+        self.assertEqual([c.args[0] for c in get.call_args_list], [self.url])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import download_progress
+
+
+class TestProgressMeter(unittest.TestCase):
+    def test_samples_are_rate_limited_and_estimate_eta(self):
+        samples = []
+        meter = download_progress.ProgressMeter(samples.append)
+        meter.update(100, 1100, force=True)  # resumed at 100 bytes
+        for downloaded in range(110, 200, 10):
+            meter.update(downloaded, 1100)
+        self.assertEqual(len(samples), 1)
+
+        time.sleep(download_progress._SAMPLE_INTERVAL)
+        meter.update(600, 1100)
+        progress = samples[-1]
+        self.assertEqual((progress.downloaded, progress.percent), (600, 54.55))
+        self.assertGreater(progress.speed, 0)
+        self.assertAlmostEqual(progress.eta, 500 / progress.speed)
+
+
+class TestProgressHub(unittest.TestCase):
+    def test_slow_subscriber_only_gets_the_latest_frame(self):
+        hub = download_progress.ProgressHub()
+        subscription = hub.subscribe(["job"])
+        for downloaded in range(5):
+            hub.progress("job", {"type": "progress", "downloaded": downloaded})
+        self.assertEqual(subscription.wait(0), [{"type": "progress", "downloaded": 4}])
+        # the next frame waits for the publish interval
+        hub.progress("job", {"type": "progress", "downloaded": 5})
+        self.assertEqual(subscription.wait(0), [])
+
+    def test_every_subscriber_gets_every_event(self):
+        hub = download_progress.ProgressHub()
+        first = hub.subscribe(["job"])
+        second = hub.subscribe(["job", "other"])
+        hub.progress("job", {"type": "progress"})
+        hub.event("job", {"type": "done"})
+        hub.event("other", {"type": "other done"})
+
+        # a frame made stale by the job's own event is not sent
+        self.assertEqual(first.wait(0), [{"type": "done"}])
+        self.assertEqual(second.wait(0), [{"type": "done"}, {"type": "other done"}])
+        hub.unsubscribe(first)
+        self.assertTrue(hub.is_subscribed("job"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from test_model_downloader import _install_heavy_import_stubs
+
+_install_heavy_import_stubs()
+
+import download_scheduler  # noqa: E402
+from download_progress import Progress  # noqa: E402
+from model_downloader import HFFileItem  # noqa: E402
+
+# repos in the order their downloads started, and the events that finish them
+_started: list[str] = []
+# the (file_list, verified) each download started with
+_resumed_from: list[tuple] = []
+_release: dict[str, threading.Event] = {}
+# repos whose download fails when released
+_failing: set[str] = set()
+# repos whose download ends as soon as it starts, without waiting to be released
+_instant: set[str] = set()
+_lock = threading.Lock()
+
+
+class FakeDownloader:
+    """Stands in for HFPlaygroundDownloader; each download blocks until released."""
+
+    def __init__(self, hf_token=None):
+        self.hf_token = hf_token
+        self.download_stop = False
+        self.error = None
+        self.on_download_progress = None
+        self.on_file_list = None
+        self.on_file_verified = None
+
+    def download(
+        self,
+        repo_id,
+        model_type,
+        backend,
+        model_path,
+        thread_count=4,
+        file_list=None,
+        verified=None,
+    ):
+        with _lock:
+            _started.append(repo_id)
+            _resumed_from.append((file_list, verified))
+            event = _release.setdefault(repo_id, threading.Event())
+        if repo_id in _instant:
+            if repo_id in _failing:
+                self.error = RuntimeError(f"{repo_id} failed")
+            return
+        if file_list is None:
+            self.on_file_list([HFFileItem("model.bin", 10, "url", "ab12")], 10)
+        self.on_file_verified("config.json", "cd34")
+        self.on_download_progress(repo_id, Progress(5, 10, 1.0, 5.0))
+        while not event.wait(0.01):
+            if self.download_stop:
+                return
+        if repo_id in _failing:
+            self.error = RuntimeError(f"{repo_id} failed")
+
+    def stop_download(self):
+        self.download_stop = True
+
+
+def _item(repo_id, priority=0):
+    return types.SimpleNamespace(
+        repo_id=repo_id,
+        type="llm",
+        backend="llamaCPP",
+        model_path="/models",
+        priority=priority,
+    )
+
+
+class TestDownloadScheduler(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.jobs_path = os.path.join(self._tmp.name, "download-jobs.json")
+        self._saved_downloader = download_scheduler.HFPlaygroundDownloader
+        download_scheduler.HFPlaygroundDownloader = FakeDownloader
+        _started.clear()
+        _resumed_from.clear()
+        _release.clear()
+        _failing.clear()
+        _instant.clear()
+        self.schedulers = []
+
+    def tearDown(self):
+        for scheduler in self.schedulers:
+            scheduler.cancel_all()
+            self._wait_until(lambda: scheduler._active == 0)
+        download_scheduler.HFPlaygroundDownloader = self._saved_downloader
+        self._tmp.cleanup()
+
+    def _scheduler(self, jobs_path):
+        scheduler = download_scheduler.DownloadScheduler(jobs_path)
+        self.schedulers.append(scheduler)
+        return scheduler
+
+    def _wait_until(self, predicate):
+        for _ in range(500):
+            if predicate():
+                return
+            threading.Event().wait(0.01)
+        self.fail("condition not reached")
+
+    def _finish(self, repo_id):
+        with _lock:
+            _release.setdefault(repo_id, threading.Event()).set()
+
+    def test_repos_run_concurrently_in_priority_order(self):
+        scheduler = self._scheduler(self.jobs_path)
+        scheduler.submit([_item("a/first"), _item("a/second"), _item("a/low")])
+        scheduler.submit([_item("a/urgent", priority=5)])
+        self._wait_until(lambda: len(_started) == 2)
+
+        self._finish("a/first")
+        self._wait_until(lambda: len(_started) == 3)
+        self.assertEqual(_started, ["a/first", "a/second", "a/urgent"])
+
+    def test_connections_are_shared_by_the_jobs_running(self):
+        scheduler = self._scheduler(self.jobs_path)
+        (alone,) = scheduler.submit([_item("a/alone")])
+        self._wait_until(lambda: len(_started) == 1)
+        downloader = alone.downloader
+        self.assertEqual(downloader.connection_limit, 8)
+
+        (other,) = scheduler.submit([_item("a/other")])
+        self.assertEqual(downloader.connection_limit, 4)
+        self.assertEqual(other.downloader.connection_limit, 4)
+        self._finish("a/other")
+        self._wait_until(lambda: downloader.connection_limit == 8)
+
+    def test_subscription_reports_completion_of_its_jobs(self):
+        scheduler = self._scheduler(self.jobs_path)
+        jobs = scheduler.submit([_item("a/one"), _item("a/two")])
+        subscription = scheduler.subscribe(jobs)
+        self._finish("a/one")
+        self._finish("a/two")
+
+        types_seen = [msg["type"] for msg in subscription.messages()]
+        self.assertEqual(types_seen.count("download_model_completed"), 2)
+        self.assertEqual(types_seen[-1], "allComplete")
+        self.assertEqual(scheduler.list_jobs(), [])
+
+    def test_an_error_cancels_the_rest_of_the_subscription(self):
+        scheduler = self._scheduler(self.jobs_path)
+        _failing.add("a/broken")
+        jobs = scheduler.submit([_item("a/fine"), _item("a/broken"), _item("a/next")])
+        subscription = scheduler.subscribe(jobs)
+        self._finish("a/broken")
+
+        errors = [msg for msg in subscription.messages() if msg["type"] == "error"]
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(
+            [job.state for job in jobs], ["cancelled", "failed", "cancelled"]
+        )
+        self._wait_until(lambda: scheduler._active == 0)
+
+    def test_jobs_that_end_at_once_are_still_reported(self):
+        scheduler = self._scheduler(self.jobs_path)
+        _instant.update({"a/installed", "a/offline"})
+        _failing.add("a/offline")
+
+        done = scheduler.submit_followed([_item("a/installed")])
+        self._wait_until(lambda: scheduler._active == 0)
+        types_seen = [msg["type"] for msg in done.messages()]
+        self.assertEqual(types_seen, ["download_model_completed", "allComplete"])
+
+        failed = scheduler.submit_followed([_item("a/offline")])
+        self._wait_until(lambda: scheduler._active == 0)
+        self.assertEqual([msg["type"] for msg in failed.messages()], ["error"])
+        self.assertEqual(scheduler.list_jobs(), [])
+
+    def test_pausing_and_cancelling_are_reported(self):
+        scheduler = self._scheduler(self.jobs_path)
+        paused, cancelled = scheduler.submit([_item("a/paused"), _item("a/gone")])
+        subscription = scheduler.subscribe([paused, cancelled])
+        self._wait_until(lambda: len(_started) == 2)
+        scheduler.pause(paused.id)
+        scheduler.cancel(cancelled.id)
+        scheduler.cancel(paused.id)
+
+        stops = [
+            (msg["type"], msg["repo_id"])
+            for msg in subscription.messages()
+            if msg["type"] != "download_model_progress"
+        ]
+        self.assertEqual(
+            stops,
+            [
+                ("download_paused", "a/paused"),
+                ("download_cancelled", "a/gone"),
+                ("download_cancelled", "a/paused"),
+            ],
+        )
+
+    def test_paused_job_resumes_and_queue_survives_restart(self):
+        scheduler = self._scheduler(self.jobs_path)
+        job, queued = scheduler.submit([_item("a/big"), _item("a/next")])
+        scheduler.submit([_item("a/gated")], hf_token="hf_secret")
+        self._wait_until(lambda: len(_started) == 2)
+        self.assertTrue(scheduler.pause(job.id))
+        self._wait_until(lambda: len(_started) == 3)
+
+        # a new process reading the same jobs file
+        shutil.copy(self.jobs_path, self.jobs_path + ".restarted")
+        restarted = self._scheduler(self.jobs_path + ".restarted")
+        states = {job["repo_id"]: job["state"] for job in restarted.list_jobs()}
+        restarted.cancel_all()
+        self.assertEqual(
+            states, {"a/big": "paused", "a/next": "running", "a/gated": "paused"}
+        )
+        # the token is not persisted, so the gated job waits for a resume
+        with open(self.jobs_path) as f:
+            self.assertNotIn("hf_secret", f.read())
+
+        self.assertTrue(scheduler.resume(job.id))
+        self._finish("a/next")
+        self._wait_until(lambda: _started.count("a/big") == 2)
+        self._wait_until(lambda: queued.state == "completed")
+
+    def test_restarted_jobs_resume_with_their_listing_in_one_call(self):
+        scheduler = self._scheduler(self.jobs_path)
+        scheduler.submit([_item("a/gated")], hf_token="hf_secret")
+        self._wait_until(lambda: scheduler.list_jobs()[0]["files_verified"] == 1)
+
+        # a new process reading the same jobs file
+        shutil.copy(self.jobs_path, self.jobs_path + ".restarted")
+        restarted = self._scheduler(self.jobs_path + ".restarted")
+        (job,) = restarted.resume_all("hf_secret")
+        self.assertEqual(job.hf_token, "hf_secret")
+        self._wait_until(lambda: len(_started) == 2)
+        file_list, verified = _resumed_from[-1]
+        self.assertEqual(
+            [(f.relpath, f.size, f.sha256) for f in file_list],
+            [("model.bin", 10, "ab12")],
+        )
+        self.assertEqual(verified, {"config.json": "cd34"})
+
+
+if __name__ == "__main__":
+    unittest.main()
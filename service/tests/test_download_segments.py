@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from download_segments import SEGMENTS_SUFFIX, SegmentedFile
+
+
+class TestSegmentedFile(unittest.TestCase):
+    def test_new_file_is_split_into_ranges(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state = SegmentedFile.open(os.path.join(tmp, "model.gguf"), 250, 100)
+            self.assertEqual(
+                [(s.start, s.end) for s in state.segments],
+                [(0, 100), (100, 200), (200, 250)],
+            )
+            self.assertEqual(state.downloaded_size(), 0)
+            # planning alone must not touch the disk
+            self.assertEqual(os.listdir(tmp), [])
+
+    def test_sequential_partial_file_is_credited_as_prefix(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "model.gguf")
+            with open(target, "wb") as f:
+                f.write(b"x" * 150)
+            state = SegmentedFile.open(target, 250, 100)
+            self.assertEqual([s.written for s in state.segments], [100, 50, 0])
+            self.assertEqual(len(state.pending_segments()), 2)
+
+    def test_complete_file_without_sidecar_needs_nothing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "model.gguf")
+            with open(target, "wb") as f:
+                f.write(b"x" * 250)
+            self.assertIsNone(SegmentedFile.open(target, 250, 100))
+
+    def test_progress_survives_reopen(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "sub", "model.gguf")
+            state = SegmentedFile.open(target, 250, 100)
+            state.ensure_allocated()
+            self.assertEqual(os.path.getsize(target), 250)
+            state.advance(state.segments[1], 100)
+            state.advance(state.segments[2], 20)
+            state.save()
+
+            reopened = SegmentedFile.open(target, 250, 100)
+            self.assertEqual([s.written for s in reopened.segments], [0, 100, 20])
+            self.assertEqual(
+                [s.position for s in reopened.pending_segments()], [0, 220]
+            )
+
+    @unittest.skipUnless(hasattr(os, "posix_fallocate"), "POSIX only")
+    def test_allocation_reserves_blocks_and_keeps_written_data(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "model.gguf")
+            with open(target, "wb") as f:
+                f.write(b"x" * 150)
+            state = SegmentedFile.open(target, 64 * 1024, 16 * 1024)
+            state.ensure_allocated()
+            stat = os.stat(target)
+            self.assertEqual(stat.st_size, 64 * 1024)
+            self.assertGreaterEqual(stat.st_blocks * 512, 64 * 1024)
+            with open(target, "rb") as f:
+                self.assertEqual(f.read(151), b"x" * 150 + b"\0")
+
+    def test_sidecar_removed_once_every_segment_is_done(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "model.gguf")
+            state = SegmentedFile.open(target, 250, 100)
+            state.ensure_allocated()
+            for segment in state.segments[:-1]:
+                state.advance(segment, segment.length)
+            self.assertFalse(state.finish_if_complete())
+            last = state.segments[-1]
+            state.advance(last, last.length)
+            self.assertTrue(state.finish_if_complete())
+            # a late save from another segment thread must not resurrect it
+            state.save()
+            self.assertFalse(os.path.exists(target + SEGMENTS_SUFFIX))
+            self.assertIsNone(SegmentedFile.open(target, 250, 100))
+
+    def test_sidecar_for_a_different_size_starts_over(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "model.gguf")
+            state = SegmentedFile.open(target, 250, 100)
+            state.ensure_allocated()
+            state.advance(state.segments[0], 100)
+            state.save()
+
+            state = SegmentedFile.open(target, 300, 100)
+            self.assertEqual(state.downloaded_size(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import gzip
+import io
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from test_model_downloader import _install_heavy_import_stubs
+
+_install_heavy_import_stubs()
+
+import download_stream  # noqa: E402
+
+
+def _response(body: bytes, headers=None):
+    raw = io.BytesIO(body)
+    return types.SimpleNamespace(
+        raw=raw,
+        headers=headers or {},
+        iter_content=lambda chunk_size: iter(
+            [gzip.decompress(body)[i : i + 3] for i in range(0, 9, 3)]
+        ),
+    )
+
+
+class TestStreamToFile(unittest.TestCase):
+    def test_copies_body_in_few_large_reads(self):
+        body = os.urandom(3 * 1024 * 1024 + 17)
+        fw = io.BytesIO()
+        reads = []
+        copied = download_stream.stream_to_file(
+            _response(body), fw, on_data=lambda data: reads.append(len(data))
+        )
+        self.assertEqual(copied, len(body))
+        self.assertEqual(fw.getvalue(), body)
+        self.assertEqual(sum(reads), len(body))
+        self.assertLessEqual(len(reads), 4)
+
+    def test_limit_stops_at_the_range_end(self):
+        fw = io.BytesIO()
+        copied = download_stream.stream_to_file(_response(b"0123456789"), fw, limit=4)
+        self.assertEqual((copied, fw.getvalue()), (4, b"0123"))
+
+    def test_stop_request_is_honoured_between_buffers(self):
+        body = b"x" * (3 * 1024 * 1024)
+        fw = io.BytesIO()
+        copied = download_stream.stream_to_file(
+            _response(body), fw, should_stop=lambda: True
+        )
+        self.assertEqual(copied, 1024 * 1024)
+
+    def test_encoded_bodies_are_decoded(self):
+        fw = io.BytesIO()
+        response = _response(gzip.compress(b"abcdefghi"), {"Content-Encoding": "gzip"})
+        copied = download_stream.stream_to_file(response, fw, limit=7)
+        self.assertEqual((copied, fw.getvalue()), (7, b"abcdefg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import file_integrity
+from test_model_downloader import _install_heavy_import_stubs
+
+
+class _TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved_path = file_integrity._VERIFIED_FILES_PATH
+        file_integrity._VERIFIED_FILES_PATH = os.path.join(
+            self._tmp.name, "verified-files.json"
+        )
+        file_integrity._verified = None
+
+    def tearDown(self):
+        file_integrity._VERIFIED_FILES_PATH = self._saved_path
+        file_integrity._verified = None
+        self._tmp.cleanup()
+
+    def _write(self, name: str, data: bytes) -> str:
+        file_path = os.path.join(self._tmp.name, name)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return file_path
+
+
+class TestStreamingHasher(_TempDirTestCase):
+    def test_sequential_writes_are_hashed_without_reading_back(self):
+        data = os.urandom(1000)
+        file_path = self._write("model.bin", b"")
+        hasher = file_integrity.StreamingHasher(file_path)
+        for offset in range(0, len(data), 300):
+            hasher.update(offset, data[offset : offset + 300])
+        os.remove(file_path)  # hexdigest must not need the file
+        self.assertEqual(hasher.hexdigest(len(data)), hashlib.sha256(data).hexdigest())
+
+    def test_resumed_prefix_and_out_of_order_segments(self):
+        data = os.urandom(1000)
+        file_path = self._write("model.bin", data)
+        hasher = file_integrity.StreamingHasher(file_path, position=100)
+        # the second segment arrives first and is left for the read-back
+        hasher.update(600, data[600:700], written_from=500)
+        self.assertEqual(hasher.position, 100)
+        hasher.update(100, data[100:500], written_from=100)
+        # the second segment's first bytes are behind it: the gap is read back
+        hasher.update(700, data[700:800], written_from=500)
+        self.assertEqual(hasher.position, 800)
+        self.assertEqual(hasher.hexdigest(len(data)), hashlib.sha256(data).hexdigest())
+
+
+class TestVerifiedRecords(_TempDirTestCase):
+    def test_record_is_trusted_until_the_file_changes(self):
+        file_path = self._write("model.gguf", b"weights")
+        file_integrity.record_verified({file_path: "abc"})
+        file_integrity._verified = None  # what a new process starts with
+
+        self.assertEqual(file_integrity.verified_sha256(file_path), "abc")
+        self.assertTrue(file_integrity.is_intact_file(file_path))
+
+        self._write("model.gguf", b"wei")
+        self.assertIsNone(file_integrity.verified_sha256(file_path))
+        self.assertFalse(file_integrity.is_intact_file(file_path))
+
+    def test_unrecorded_files_are_taken_at_face_value(self):
+        file_path = self._write("model.gguf", b"weights")
+        self.assertTrue(file_integrity.is_intact_file(file_path))
+        self.assertFalse(file_integrity.is_intact_file(self._tmp.name))
+
+
+class TestVerifyFile(_TempDirTestCase):
+    def _make_downloader(self):
+        _install_heavy_import_stubs()
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.save_path_tmp = self._tmp.name
+        dl.verified = {}
+        dl.download_size = 0
+        dl.file_queue = model_downloader.queue.Queue()
+        dl.thread_lock = model_downloader.Lock()
+        return model_downloader, dl
+
+    def _item(self, model_downloader, data, sha256, refetched=False):
+        file_path = self._write("model.bin", data)
+        return model_downloader.HFDownloadItem(
+            "model.bin",
+            len(data),
+            "url",
+            len(data),
+            file_path,
+            sha256=sha256,
+            refetched=refetched,
+        )
+
+    def test_matching_file_is_recorded(self):
+        model_downloader, dl = self._make_downloader()
+        sha256 = hashlib.sha256(b"weights").hexdigest()
+        dl.verify_file(self._item(model_downloader, b"weights", sha256))
+        self.assertEqual(dl.verified, {"model.bin": sha256})
+        self.assertTrue(dl.file_queue.empty())
+
+    def test_mismatch_discards_the_file_and_downloads_it_again(self):
+        model_downloader, dl = self._make_downloader()
+        dl.download_size = 7
+        sha256 = hashlib.sha256(b"weights").hexdigest()
+        file = self._item(model_downloader, b"wEights", sha256)
+        dl.verify_file(file)
+
+        self.assertFalse(os.path.exists(file.save_filename))
+        self.assertEqual(dl.download_size, 0)
+        requeued = dl.file_queue.get_nowait()
+        self.assertEqual((requeued.name, requeued.disk_file_size), ("model.bin", 0))
+        self.assertTrue(requeued.refetched)
+        self.assertEqual(dl.verified, {})
+
+    def test_second_mismatch_fails_the_download(self):
+        model_downloader, dl = self._make_downloader()
+        file = self._item(model_downloader, b"wEights", "0" * 64, refetched=True)
+        with self.assertRaises(model_downloader.FileVerificationError):
+            dl.verify_file(file)
+
+
+if __name__ == "__main__":
+    unittest.main()
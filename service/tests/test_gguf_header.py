@@ -0,0 +1,75 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import gguf_header
+
+
+def _string(value: bytes) -> bytes:
+    return struct.pack("<Q", len(value)) + value
+
+
+def write_gguf(file_path: str, kv: list[tuple[bytes, bytes]], magic=b"GGUF") -> None:
+    """A GGUF v3 file with the given (key, type id + value) metadata."""
+    with open(file_path, "wb") as f:
+        f.write(magic + struct.pack("<IQQ", 3, 0, len(kv)))
+        for key, value in kv:
+            f.write(_string(key) + value)
+
+
+def split_kv(no: int, count: int) -> list[tuple[bytes, bytes]]:
+    return [
+        (b"split.no", struct.pack("<IH", 2, no)),
+        (b"split.count", struct.pack("<IH", 2, count)),
+    ]
+
+
+class TestGGUFHeader(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "model-00002-of-00003.gguf")
+
+    def test_split_keys_are_found_after_other_metadata(self):
+        vocab = struct.pack("<IQ", 8, 2) + _string(b"a") + _string(b"bc")
+        write_gguf(
+            self.path,
+            [
+                (b"general.name", struct.pack("<I", 8) + _string(b"m")),
+                (b"tokenizer.ggml.tokens", struct.pack("<I", 9) + vocab),
+                (b"tokenizer.ggml.scores", struct.pack("<IIQ", 9, 6, 2) + bytes(8)),
+                *split_kv(1, 3),
+            ],
+        )
+        self.assertEqual(
+            gguf_header.read_split_keys(self.path), {"split.no": 1, "split.count": 3}
+        )
+        gguf_header.check_shard(self.path, *gguf_header.split_shard(self.path))
+
+    def test_a_shard_with_another_split_number_is_rejected(self):
+        write_gguf(self.path, split_kv(0, 3))
+        with self.assertRaises(ValueError):
+            gguf_header.check_shard(self.path, 2, 3)
+        with self.assertRaises(ValueError):
+            gguf_header.check_shard(self.path, 1, 4)
+
+    def test_files_that_are_not_gguf_are_rejected(self):
+        write_gguf(self.path, split_kv(1, 3), magic=b"<htm")
+        with self.assertRaises(ValueError):
+            gguf_header.check_shard(self.path, 2, 3)
+        with open(self.path, "wb") as f:
+            f.write(b"GGUF" + struct.pack("<IQQ", 3, 0, 1))
+        with self.assertRaises(ValueError):
+            gguf_header.read_split_keys(self.path)
+
+    def test_shard_numbers_come_from_the_file_name(self):
+        self.assertEqual(gguf_header.split_shard("q4/m-00001-of-00002.gguf"), (1, 2))
+        self.assertIsNone(gguf_header.split_shard("m.gguf"))
+
+
+if __name__ == "__main__":
+    unittest.main()
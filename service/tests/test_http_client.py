@@ -0,0 +1,41 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from test_model_downloader import _install_heavy_import_stubs
+
+_install_heavy_import_stubs()
+
+import http_client  # noqa: E402
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_unlimited_by_default(self):
+        bucket = http_client.TokenBucket()
+        started = time.monotonic()
+        bucket.consume(10**12)
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_threads_share_the_rate(self):
+        bucket = http_client.TokenBucket(400_000)
+        started = time.monotonic()
+
+        def pull():
+            for _ in range(4):
+                bucket.consume(25_000)
+
+        threads = [threading.Thread(target=pull) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 200 KB at 400 KB/s, less the 100 KB burst allowance
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import lazy_imports
+
+
+class TestLazyImports(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        for name in ("lazy_target", "lazy_real"):
+            with open(os.path.join(self._tmp.name, f"{name}.py"), "w") as f:
+                f.write(f"NAME = {name!r}\n")
+        sys.path.insert(0, self._tmp.name)
+        self.addCleanup(sys.path.remove, self._tmp.name)
+        self.addCleanup(self._forget, "lazy_target", "lazy_real", "lazy_alias")
+
+    def _forget(self, *names):
+        for name in names:
+            sys.modules.pop(name, None)
+        sys.meta_path[:] = [
+            finder
+            for finder in sys.meta_path
+            if not isinstance(finder, lazy_imports._AliasFinder)
+        ]
+
+    def test_module_is_imported_on_first_attribute_read(self):
+        target = lazy_imports.module("lazy_target")
+        self.assertNotIn("lazy_target", sys.modules)
+        self.assertEqual(target.NAME, "lazy_target")
+        self.assertIn("lazy_target", sys.modules)
+
+    def test_alias_only_applies_when_the_module_does_not_exist(self):
+        lazy_imports.alias_missing_module("lazy_alias", "lazy_target")
+        lazy_imports.alias_missing_module("lazy_real", "lazy_target")
+        self.assertNotIn("lazy_target", sys.modules)
+
+        import lazy_alias
+        import lazy_real
+
+        self.assertIs(lazy_alias, sys.modules["lazy_target"])
+        self.assertIs(sys.modules["lazy_alias"], lazy_alias)
+        self.assertEqual(lazy_alias.__spec__.name, "lazy_target")
+        self.assertEqual(lazy_alias.__name__, "lazy_target")
+        self.assertEqual(lazy_real.NAME, "lazy_real")
+
+    def test_profile_reports_every_phase(self):
+        report = lazy_imports.profile_imports(
+            {"first": ["json"], "second": ["email.message"]}, top=5
+        )
+        self.assertEqual(report["returncode"], 0)
+        self.assertGreater(report["phases_us"]["first"], 0)
+        self.assertGreater(report["phases_us"]["second"], 0)
+        self.assertEqual(len(report["slowest"]), 5)
+        slowest = report["slowest"][0]
+        self.assertIn(slowest["phase"], ("first", "second"))
+        self.assertGreaterEqual(slowest["cumulative_us"], slowest["self_us"])
+
+
+if __name__ == "__main__":
+    unittest.main()
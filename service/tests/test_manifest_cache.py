@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import manifest_cache
+from test_model_downloader import _install_heavy_import_stubs
+
+
+class _ManifestCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._saved_dir = manifest_cache._CACHE_DIR
+        manifest_cache._CACHE_DIR = self._tmp.name
+        manifest_cache._entries.clear()
+
+    def tearDown(self):
+        manifest_cache._CACHE_DIR = self._saved_dir
+        manifest_cache._entries.clear()
+        self._tmp.cleanup()
+
+
+class TestManifestCache(_ManifestCacheTestCase):
+    def test_entries_survive_a_restart(self):
+        files = [{"relpath": "unet/model.safetensors", "size": 10, "url": "u"}]
+        manifest_cache.put("owner/repo", "stableDiffusion", "abc", 10, files)
+        manifest_cache._entries.clear()  # what a new process starts with
+
+        entry = manifest_cache.get("owner/repo", "stableDiffusion")
+        self.assertEqual(entry.sha, "abc")
+        self.assertEqual(entry.total_size, 10)
+        self.assertEqual(entry.files, files)
+        self.assertIsNone(manifest_cache.get("owner/repo", "lora"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        saved_max = manifest_cache._MAX_ENTRIES
+        manifest_cache._MAX_ENTRIES = 2
+        try:
+            for i, repo in enumerate(("a/a", "b/b", "c/c")):
+                manifest_cache.put(repo, "llm", None, i, [])
+                # mtime resolution is coarse on some filesystems
+                path = manifest_cache._entry_path(f"{repo}_llm")
+                os.utime(path, (time.time() + i, time.time() + i))
+            self.assertEqual(len(os.listdir(self._tmp.name)), 2)
+            manifest_cache._entries.clear()
+            self.assertIsNone(manifest_cache.get("a/a", "llm"))
+            self.assertIsNotNone(manifest_cache.get("c/c", "llm"))
+        finally:
+            manifest_cache._MAX_ENTRIES = saved_max
+
+
+class TestGetFileList(_ManifestCacheTestCase):
+    def _make_downloader(self, sha):
+        _install_heavy_import_stubs()
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.hf_token = None
+        dl.enumerations = 0
+
+        def populate(file_list, repo_id, model_type, revision=None):
+            dl.enumerations += 1
+            dl.total_size += 7
+            file_list.append(model_downloader.HFFileItem("model.gguf", 7, "url"))
+
+        dl.populate_file_list = populate
+        dl.get_repo_sha = lambda repo_id: sha
+        return dl
+
+    def test_fresh_entry_needs_no_network(self):
+        dl = self._make_downloader("v1")
+        dl.get_file_list("owner/repo", "ggufLLM")
+        dl.get_repo_sha = lambda repo_id: self.fail("fresh entries are not revalidated")
+
+        files, total = dl.get_file_list("owner/repo", "ggufLLM")
+        self.assertEqual(total, 7)
+        self.assertEqual([f.relpath for f in files], ["model.gguf"])
+        self.assertEqual(dl.enumerations, 1)
+
+    def test_unchanged_revision_is_not_enumerated_again(self):
+        dl = self._make_downloader("v1")
+        dl.get_file_list("owner/repo", "ggufLLM")
+        dl.get_file_list("owner/repo", "ggufLLM", max_age=0)
+        self.assertEqual(dl.enumerations, 1)
+
+    def test_new_revision_is_enumerated_again(self):
+        dl = self._make_downloader("v1")
+        dl.get_file_list("owner/repo", "ggufLLM")
+        dl.get_repo_sha = lambda repo_id: "v2"
+        dl.get_file_list("owner/repo", "ggufLLM", max_age=0)
+        self.assertEqual(dl.enumerations, 2)
+        self.assertEqual(manifest_cache.get("owner/repo", "ggufLLM").sha, "v2")
+
+    def test_stale_entry_is_served_when_hf_is_unreachable(self):
+        dl = self._make_downloader("v1")
+        dl.get_file_list("owner/repo", "ggufLLM")
+        dl.get_repo_sha = lambda repo_id: None
+        _, total = dl.get_file_list("owner/repo", "ggufLLM", max_age=0)
+        self.assertEqual(total, 7)
+        self.assertEqual(dl.enumerations, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
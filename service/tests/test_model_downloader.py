@@ -2,6 +2,7 @@ import os
 import sys
 import types
 import unittest
+from unittest import mock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -10,6 +11,15 @@ import utils
 
 def _install_heavy_import_stubs():
     """Stub third-party deps so model_downloader imports in a minimal test env."""
+    for name in ("httpx", "psutil", "requests", "huggingface_hub"):
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    if "httpx" not in sys.modules:
+        httpx = types.ModuleType("httpx")
+        httpx.HTTPError = Exception
+        sys.modules["httpx"] = httpx
     if "psutil" not in sys.modules:
         psutil = types.ModuleType("psutil")
         common = types.ModuleType("psutil._common")
@@ -18,13 +28,34 @@ def _install_heavy_import_stubs():
         sys.modules["psutil"] = psutil
         sys.modules["psutil._common"] = common
     if "requests" not in sys.modules:
-        sys.modules["requests"] = types.ModuleType("requests")
+        requests = types.ModuleType("requests")
+        requests.exceptions = types.SimpleNamespace(RequestException=Exception)
+        requests.Response = object
+        requests.Session = object
+        adapters = types.ModuleType("requests.adapters")
+        adapters.HTTPAdapter = object
+        adapters.BaseAdapter = object
+        requests.adapters = adapters
+        sys.modules["requests"] = requests
+        sys.modules["requests.adapters"] = adapters
     if "huggingface_hub" not in sys.modules:
         hub = types.ModuleType("huggingface_hub")
+        hub.HfApi = object
         hub.HfFileSystem = object
         hub.hf_hub_url = lambda **kwargs: ""
         hub.model_info = lambda *args, **kwargs: None
+        errors = types.ModuleType("huggingface_hub.errors")
+        errors.HfHubHTTPError = Exception
+        errors.RepositoryNotFoundError = type(
+            "RepositoryNotFoundError", (Exception,), {}
+        )
+        hf_api = types.ModuleType("huggingface_hub.hf_api")
+        hf_api.RepoFolder = type("RepoFolder", (), {})
+        hub.errors = errors
+        hub.hf_api = hf_api
         sys.modules["huggingface_hub"] = hub
+        sys.modules["huggingface_hub.errors"] = errors
+        sys.modules["huggingface_hub.hf_api"] = hf_api
 
 
 class TestHFChunkHttpOk(unittest.TestCase):
@@ -38,6 +69,154 @@ class TestHFChunkHttpOk(unittest.TestCase):
         self.assertFalse(utils.hf_chunk_http_ok(404, 1))
 
 
+class TestEnumFileListFromTree(unittest.TestCase):
+    """A repo is enumerated with one recursive tree listing; the stableDiffusion,
+    embedding and ignored-extension filters then run over it in memory."""
+
+    def _enumerate(self, repo_id, model_type, paths):
+        _install_heavy_import_stubs()
+        import model_downloader
+
+        calls = []
+
+        def entry(path, size):
+            if size is None:
+                folder = object.__new__(model_downloader.RepoFolder)
+                folder.path = path
+                return folder
+            lfs = types.SimpleNamespace(sha256=f"sha-{path}") if size >= 10 else None
+            return types.SimpleNamespace(
+                path=path, size=size, lfs=lfs, blob_id=f"oid-{path}"
+            )
+
+        class FakeApi:
+            def __init__(self, token=None):
+                pass
+
+            def list_repo_tree(self, repo, **kwargs):
+                calls.append((repo, kwargs))
+                return [entry(path, size) for path, size in paths]
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.hf_token = None
+        dl.repo_id = repo_id
+        dl.total_size = 0
+        file_list = []
+        saved_api = model_downloader.HfApi
+        model_downloader.HfApi = FakeApi
+        try:
+            dl.enum_file_list(file_list, repo_id, model_type, "abc123")
+        finally:
+            model_downloader.HfApi = saved_api
+        dl.file_list = file_list
+        return dl, sorted(f.relpath for f in file_list), calls
+
+    def test_diffusers_repo_is_listed_once_and_filtered(self):
+        dl, files, calls = self._enumerate(
+            "owner/sd",
+            "stableDiffusion",
+            [
+                ("README.md", 1),
+                ("model.safetensors", 100),
+                ("model_index.json", 2),
+                ("unet", None),
+                ("unet/config.json", 3),
+                ("unet/diffusion_pytorch_model.safetensors", 50),
+                ("unet/diffusion_pytorch_model.fp16.safetensors", 25),
+                ("vae", None),
+                ("vae/diffusion_pytorch_model.safetensors", 10),
+            ],
+        )
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], "owner/sd")
+        self.assertTrue(calls[0][1]["recursive"])
+        self.assertEqual(calls[0][1]["revision"], "abc123")
+        self.assertEqual(
+            files,
+            [
+                "model_index.json",
+                "unet/config.json",
+                "unet/diffusion_pytorch_model.fp16.safetensors",
+                "vae/diffusion_pytorch_model.safetensors",
+            ],
+        )
+        self.assertEqual(dl.total_size, 2 + 3 + 25 + 10)
+        hashes = {f.relpath: f.sha256 for f in dl.file_list}
+        self.assertIsNone(hashes["model_index.json"])
+        self.assertEqual(
+            hashes["vae/diffusion_pytorch_model.safetensors"],
+            "sha-vae/diffusion_pytorch_model.safetensors",
+        )
+
+    def test_subfolder_reference_lists_only_that_folder(self):
+        _, files, calls = self._enumerate(
+            "owner/repo/onnx",
+            "embedding",
+            [("onnx/model.onnx", 5), ("onnx/tokenizer.json", 1)],
+        )
+        self.assertEqual(calls[0][1]["path_in_repo"], "onnx")
+        self.assertEqual(files, ["onnx/tokenizer.json"])
+
+
+class TestAccessProbe(unittest.TestCase):
+    """Access is probed with a HEAD on one known file, chosen from the cached
+    model_info listing rather than by enumerating the repo."""
+
+    def _make_downloader(self, siblings):
+        _install_heavy_import_stubs()
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.hf_token = "token"
+        dl.info_calls = 0
+        info = types.SimpleNamespace(
+            siblings=[types.SimpleNamespace(rfilename=name) for name in siblings],
+            sha="abc",
+            gated="auto",
+            private=False,
+        )
+
+        def fake_model_info(repo_id, token=None):
+            dl.info_calls += 1
+            return info
+
+        saved = model_downloader.model_info
+        model_downloader.model_info = fake_model_info
+        model_downloader._model_info_cache.clear()
+        self.addCleanup(setattr, model_downloader, "model_info", saved)
+        self.addCleanup(model_downloader._model_info_cache.clear)
+        return dl
+
+    def test_prefers_a_small_config_file(self):
+        dl = self._make_downloader(
+            [".gitattributes", "model.safetensors", "config.json"]
+        )
+        self.assertEqual(dl.get_access_probe_file("owner/repo"), "config.json")
+
+    def test_specific_file_reference_probes_that_file(self):
+        dl = self._make_downloader([])
+        self.assertEqual(
+            dl.get_access_probe_file("owner/repo/sub/model-Q4.gguf"),
+            "sub/model-Q4.gguf",
+        )
+        self.assertEqual(dl.info_calls, 0)
+
+    def test_subfolder_reference_probes_inside_it(self):
+        dl = self._make_downloader(["config.json", "onnx/model.onnx"])
+        self.assertEqual(dl.get_access_probe_file("owner/repo/onnx"), "onnx/model.onnx")
+
+    def test_model_info_is_shared_between_checks(self):
+        dl = self._make_downloader(["config.json"])
+        self.assertTrue(dl.is_gated("owner/repo"))
+        self.assertEqual(dl.get_repo_sha("owner/repo"), "abc")
+        dl.get_access_probe_file("owner/repo")
+        self.assertEqual(dl.info_calls, 1)
+
+
 class TestMoveToDesiredPositionFlatStructure(unittest.TestCase):
     """Reactor (faceswap/facerestore) models must land as a single flat *file*
     named "<owner>---<repo>---<file>", not a directory containing that file.
@@ -47,14 +226,21 @@ class TestMoveToDesiredPositionFlatStructure(unittest.TestCase):
 
     def _make_downloader(self, save_path, repo_id):
         _install_heavy_import_stubs()
+        import download_finalize
         import model_downloader
 
+        journal_dir = os.path.join(os.path.dirname(save_path), "finalize")
+        patcher = mock.patch.object(download_finalize, "_JOURNAL_DIR", journal_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         dl = model_downloader.HFPlaygroundDownloader.__new__(
             model_downloader.HFPlaygroundDownloader
         )
         dl.repo_id = repo_id
         dl.save_path = save_path
         dl.save_path_tmp = os.path.join(save_path, "tmp")
+        dl.verified = {}
         os.makedirs(dl.save_path_tmp, exist_ok=True)
         return dl
 
@@ -104,5 +290,326 @@ class TestMoveToDesiredPositionFlatStructure(unittest.TestCase):
                 self.assertEqual(f.read(), b"weights")
 
 
+class TestDeltaUpdate(unittest.TestCase):
+    """When an installed repo moves to a new revision only changed and added
+    files are fetched, and files the revision dropped are pruned."""
+
+    def setUp(self):
+        import tempfile
+
+        _install_heavy_import_stubs()
+        import download_finalize
+        import file_integrity
+        import install_manifest
+
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        cache = os.path.join(self._tmp.name, "cache")
+        for patcher in (
+            mock.patch.object(
+                download_finalize, "_JOURNAL_DIR", os.path.join(cache, "finalize")
+            ),
+            mock.patch.object(
+                install_manifest,
+                "_MANIFESTS_PATH",
+                os.path.join(cache, "installed-files.json"),
+            ),
+            mock.patch.object(install_manifest, "_manifests", None),
+            mock.patch.object(
+                file_integrity,
+                "_VERIFIED_FILES_PATH",
+                os.path.join(cache, "verified-files.json"),
+            ),
+            mock.patch.object(file_integrity, "_verified", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _write(self, file_path, data):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    def test_only_changed_files_are_fetched_and_dropped_ones_pruned(self):
+        import hashlib
+        import queue
+
+        import install_manifest
+        import model_downloader
+
+        repo_id = "owner/repo"
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.repo_id = repo_id
+        dl.save_path = os.path.join(self._tmp.name, "models")
+        dl.save_path_tmp = os.path.join(dl.save_path, "tmp")
+        dl.file_queue = queue.Queue()
+        dl.download_size = 0
+        dl.verified = {}
+        root = dl.install_target()[0]
+        weights = b"w" * 1000
+        self._write(os.path.join(root, "config.json"), b"old config")
+        self._write(os.path.join(root, "model.bin"), weights)
+        self._write(os.path.join(root, "old.txt"), b"gone")
+        install_manifest.record(
+            root, repo_id, "rev1", ["config.json", "model.bin", "old.txt"]
+        )
+        # an attempt at an older revision left a different model.bin staged
+        self._write(os.path.join(dl.save_path_tmp, "model.bin"), b"x" * 1000)
+
+        config = b"new config"
+        dl.file_list = [
+            model_downloader.HFFileItem(
+                "config.json",
+                len(config),
+                "u1",
+                blob_id=hashlib.sha1(b"blob 10\0" + config).hexdigest(),
+            ),
+            model_downloader.HFFileItem(
+                "model.bin", 1000, "u2", hashlib.sha256(weights).hexdigest()
+            ),
+            model_downloader.HFFileItem("new.json", 2, "u3", blob_id="oid"),
+        ]
+        dl.revision = "rev2"
+
+        dl.build_queue(dl.skip_installed(dl.file_list))
+
+        queued = sorted(item.name for item in dl.file_queue.queue)
+        self.assertEqual(queued, ["config.json", "new.json"])
+        self.assertEqual(dl.download_size, 1000)
+        self.assertEqual(os.listdir(dl.save_path_tmp), [])
+
+        self._write(os.path.join(dl.save_path_tmp, "config.json"), config)
+        self._write(os.path.join(dl.save_path_tmp, "new.json"), b"{}")
+        dl.move_to_desired_position()
+
+        self.assertEqual(
+            sorted(os.listdir(root)), ["config.json", "model.bin", "new.json"]
+        )
+        with open(os.path.join(root, "config.json"), "rb") as f:
+            self.assertEqual(f.read(), config)
+        with open(os.path.join(root, "model.bin"), "rb") as f:
+            self.assertEqual(f.read(), weights)
+        self.assertEqual(
+            install_manifest.get(root, repo_id),
+            {"revision": "rev2", "files": ["config.json", "model.bin", "new.json"]},
+        )
+
+    def test_files_another_repo_id_installed_are_kept(self):
+        import install_manifest
+
+        root = os.path.join(self._tmp.name, "models", "owner---repo")
+        install_manifest.record(root, "owner/repo/a.gguf", None, ["a.gguf"])
+        install_manifest.record(root, "owner/repo/b.gguf", None, ["a.gguf", "b.gguf"])
+        self.assertEqual(
+            install_manifest.prunable(root, "owner/repo/b.gguf", []), ["b.gguf"]
+        )
+        self.assertEqual(install_manifest.prunable(root, "owner/repo/c.gguf", []), [])
+
+
+class TestSplitGGUFShards(unittest.TestCase):
+    """Shards are queued in order and announced one by one as they complete."""
+
+    def _downloader(self):
+        _install_heavy_import_stubs()
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.total_size = 0
+        dl.verified = {}
+        dl.thread_lock = mock.MagicMock()
+        return model_downloader, dl
+
+    def test_shards_are_listed_in_shard_order(self):
+        _, dl = self._downloader()
+        names = [f"owner/repo/m-0000{i}-of-00003.gguf" for i in (3, 1, 2)]
+        dl.fs = mock.Mock()
+        dl.fs.ls.return_value = [
+            {"name": name, "type": "file", "size": 1} for name in names
+        ] + [{"name": "owner/repo/other.gguf", "type": "file", "size": 1}]
+        file_list = []
+        self.assertTrue(
+            dl.enum_split_gguf_shards(file_list, "owner/repo/m-00002-of-00003.gguf")
+        )
+        self.assertEqual(
+            [file.relpath for file in file_list],
+            [f"m-0000{i}-of-00003.gguf" for i in (1, 2, 3)],
+        )
+
+    def test_a_complete_shard_is_checked_and_announced(self):
+        import struct
+        import tempfile
+
+        model_downloader, dl = self._downloader()
+        announced = []
+        dl.on_shard_completed = lambda *args: announced.append(args)
+        with tempfile.TemporaryDirectory() as tmp:
+            staged = os.path.join(tmp, "m-00002-of-00002.gguf")
+            with open(staged, "wb") as f:
+                f.write(b"GGUF" + struct.pack("<IQQ", 3, 0, 1))
+                f.write(struct.pack("<Q", 8) + b"split.no" + struct.pack("<IH", 2, 1))
+            item = model_downloader.HFDownloadItem(
+                "q4/m-00002-of-00002.gguf", 100, "u", 100, staged
+            )
+            dl.finish_file(item)
+            self.assertEqual(announced, [("q4/m-00002-of-00002.gguf", 2, 2, staged)])
+
+            # a shard whose header names another split fails the download
+            item.name = "q4/m-00001-of-00002.gguf"
+            with self.assertRaises(model_downloader.GGUFShardError):
+                dl.finish_file(item)
+            self.assertEqual(len(announced), 1)
+
+
+class TestReserveDiskSpace(unittest.TestCase):
+    def _queue(self, tmp):
+        _install_heavy_import_stubs()
+        import queue
+
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.save_path = tmp
+        dl.save_path_tmp = os.path.join(tmp, "tmp")
+        dl.file_queue = queue.Queue()
+        dl.download_size = 0
+        # an earlier attempt appended 400 bytes of the model
+        os.makedirs(dl.save_path_tmp)
+        with open(os.path.join(dl.save_path_tmp, "model.bin"), "wb") as f:
+            f.write(b"x" * 400)
+        with mock.patch.object(model_downloader, "_PREALLOCATE_MIN_FILE_SIZE", 100):
+            dl.build_queue(
+                [
+                    model_downloader.HFFileItem("model.bin", 1000, "u1"),
+                    model_downloader.HFFileItem("config.json", 10, "u2"),
+                ]
+            )
+        return model_downloader, dl
+
+    def test_only_the_missing_bytes_are_required(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_downloader, dl = self._queue(tmp)
+            usage = types.SimpleNamespace(free=609)
+            with mock.patch.object(
+                model_downloader.psutil, "disk_usage", return_value=usage, create=True
+            ):
+                with self.assertRaises(model_downloader.NotEnoughDiskSpaceException):
+                    dl.reserve_disk_space()
+
+    def test_large_files_are_preallocated_before_downloading(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_downloader, dl = self._queue(tmp)
+            usage = types.SimpleNamespace(free=610)
+            with mock.patch.object(
+                model_downloader.psutil, "disk_usage", return_value=usage, create=True
+            ):
+                dl.reserve_disk_space()
+            target = os.path.join(dl.save_path_tmp, "model.bin")
+            self.assertEqual(os.path.getsize(target), 1000)
+            self.assertEqual(
+                sorted(os.listdir(dl.save_path_tmp)),
+                ["model.bin", "model.bin.aipg-segments"],
+            )
+            # the appended prefix is kept and only the rest is fetched
+            (item,) = [i for i in dl.file_queue.queue if i.name == "model.bin"]
+            self.assertEqual(item.segment.position, 400)
+
+
+class TestResumeCompletedFile(unittest.TestCase):
+    def _queue(self, tmp, content):
+        _install_heavy_import_stubs()
+        import hashlib
+        import json
+        import queue
+        import threading
+
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.save_path_tmp = tmp
+        dl.file_queue = queue.Queue()
+        dl.download_size = 0
+        dl.verified = {}
+        dl.thread_lock = threading.Lock()
+        dl.on_file_verified = None
+        dl.on_shard_completed = None
+        # an earlier attempt wrote every byte but stopped before verifying
+        target = os.path.join(tmp, "model.bin")
+        with open(target, "wb") as f:
+            f.write(content)
+        with open(target + model_downloader.SEGMENTS_SUFFIX, "w") as f:
+            json.dump({"size": 1000, "segments": [[0, 1000, 1000]]}, f)
+        expected = hashlib.sha256(b"w" * 1000).hexdigest()
+        with mock.patch.object(model_downloader, "_PREALLOCATE_MIN_FILE_SIZE", 100):
+            dl.build_queue(
+                [model_downloader.HFFileItem("model.bin", 1000, "u", expected)]
+            )
+        return dl, expected
+
+    def test_a_complete_file_is_verified(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            dl, expected = self._queue(tmp, b"w" * 1000)
+            self.assertTrue(dl.file_queue.empty())
+            self.assertEqual(dl.verified, {"model.bin": expected})
+            self.assertEqual(dl.download_size, 1000)
+
+    def test_a_corrupt_complete_file_is_fetched_again(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            dl, _ = self._queue(tmp, b"x" * 1000)
+            self.assertEqual(dl.verified, {})
+            self.assertEqual(dl.download_size, 0)
+            items = list(dl.file_queue.queue)
+            self.assertTrue(items)
+            self.assertTrue(all(item.refetched for item in items))
+
+
+class TestConnectionLimit(unittest.TestCase):
+    def test_workers_over_the_limit_wait_until_it_is_raised(self):
+        _install_heavy_import_stubs()
+        import queue
+        import threading
+
+        import model_downloader
+
+        dl = model_downloader.HFPlaygroundDownloader.__new__(
+            model_downloader.HFPlaygroundDownloader
+        )
+        dl.download_stop = False
+        dl.file_queue = queue.Queue()
+        dl.file_queue.put("file")
+        dl.connection_limit = 1
+        self.assertTrue(dl.wait_for_connection(0))
+
+        released = []
+        waiter = threading.Thread(
+            target=lambda: released.append(dl.wait_for_connection(1))
+        )
+        waiter.start()
+        waiter.join(0.5)
+        self.assertEqual(released, [])
+        dl.connection_limit = 2
+        waiter.join(5)
+        self.assertEqual(released, [True])
+
+        dl.connection_limit = 1
+        dl.file_queue.get_nowait()
+        self.assertFalse(dl.wait_for_connection(1))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import model_index
+import utils
+
+# far enough in the past for a listing to be trusted
+_OLD = 1_000_000_000
+
+
+class TestModelIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        os.makedirs(os.path.join(self.root, "org---repo"))
+        with open(os.path.join(self.root, "org---repo", "model.gguf"), "wb") as f:
+            f.write(b"gguf")
+        os.utime(os.path.join(self.root, "org---repo"), (_OLD, _OLD))
+        self.index = model_index.ModelIndex()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_batch_reads_each_directory_once_and_listing_is_reused(self):
+        with mock.patch.object(model_index, "_scan", wraps=model_index._scan) as scan:
+            fs = model_index.Lookup(self.index)
+            repo = os.path.join(self.root, "org---repo")
+            self.assertTrue(fs.is_dir(repo))
+            self.assertTrue(fs.is_intact_file(os.path.join(repo, "model.gguf")))
+            self.assertFalse(fs.exists(os.path.join(repo, "other.gguf")))
+            self.assertEqual(fs.names(repo), ["model.gguf"])
+            self.assertFalse(fs.exists(os.path.join(self.root, "missing", "x")))
+
+            fs = model_index.Lookup(self.index)
+            self.assertTrue(fs.is_dir(repo))
+            self.assertEqual(fs.names(repo), ["model.gguf"])
+            scanned = [call.args[0] for call in scan.call_args_list]
+        # the root was just written to, so only its listing is read again
+        self.assertEqual(scanned.count(repo), 1)
+        self.assertEqual(scanned.count(self.root), 2)
+
+    def test_listing_is_refreshed_when_the_directory_changes(self):
+        repo = os.path.join(self.root, "org---repo")
+        self.assertFalse(
+            model_index.Lookup(self.index).exists(os.path.join(repo, "new.gguf"))
+        )
+        open(os.path.join(repo, "new.gguf"), "wb").close()
+        os.utime(repo, (_OLD + 10, _OLD + 10))
+        self.assertTrue(
+            model_index.Lookup(self.index).is_file(os.path.join(repo, "new.gguf"))
+        )
+
+
+class TestCheckModelExist(unittest.TestCase):
+    def test_missing_comfyui_copy_is_restored_in_the_background(self):
+        with tempfile.TemporaryDirectory() as storage:
+            with open(os.path.join(storage, "org---repo---face.onnx"), "wb") as f:
+                f.write(b"onnx")
+            with (
+                mock.patch.object(
+                    utils, "copy_faceswap_facerestore_to_comfyui"
+                ) as copy,
+                mock.patch.object(
+                    utils,
+                    "get_comfyui_faceswap_facerestore_path",
+                    return_value=os.path.join(storage, "comfy", "face.onnx"),
+                ),
+            ):
+                exists = utils.check_mmodel_exist(
+                    "faceswap", "org/repo/face.onnx", "comfyui", storage
+                )
+                utils._restore_executor.submit(lambda: None).result()
+        self.assertTrue(exists)
+        copy.assert_called_once_with("faceswap", "org/repo/face.onnx", storage)
+
+
+if __name__ == "__main__":
+    unittest.main()
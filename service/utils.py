@@ -1,11 +1,15 @@
+import concurrent.futures
 import hashlib
 import logging
 import os
 import shutil
-from typing import IO
+import threading
+
+import blob_store
 
 # Import from the backend_shared package
 import config
+import model_index
 
 
 # Path handling utilities
@@ -93,29 +97,41 @@ def get_model_path(type: str, backend: str):
 
 
 def check_mmodel_exist(
-    type: str, repo_id: str, backend: str, model_path: str | None = None
+    type: str,
+    repo_id: str,
+    backend: str,
+    model_path: str | None = None,
+    fs: model_index.Lookup | None = None,
 ) -> bool:
-    """Check if a model exists for a given type and backend"""
+    """Check if a model exists for a given type and backend
+
+    Pass the same `fs` lookup for every model of a batch query so that each
+    directory is only looked at once.
+    """
     logging.info(f"checking model {repo_id} of type {type} in backend {backend}")
+    fs = fs or model_index.lookup()
     if model_path:
         # Use provided model_path directly
-        return check_model_exists_with_path(type, repo_id, model_path)
+        return check_model_exists_with_path(type, repo_id, model_path, fs)
     # Fallback to old behavior for backward compatibility
     match backend:
         case "default":
             return check_defaultbackend_mmodel_exist(type, repo_id)
         case "openvino":
-            return check_openvino_model_exists(type, repo_id)
+            return check_openvino_model_exists(type, repo_id, fs)
         case "comfyui":
-            return check_comfyui_model_exists(type, repo_id)
+            return check_comfyui_model_exists(type, repo_id, fs)
         case "llama_cpp":
-            return check_llama_cpp_model_exists(type, repo_id)
+            return check_llama_cpp_model_exists(type, repo_id, fs)
         case _:
             raise NameError("Unknown Backend")
 
 
-def check_model_exists_with_path(type: str, repo_id: str, model_path: str) -> bool:
+def check_model_exists_with_path(
+    type: str, repo_id: str, model_path: str, fs: model_index.Lookup | None = None
+) -> bool:
     """Check if a model exists at the given path, and restore to ComfyUI if needed for faceswap/facerestore"""
+    fs = fs or model_index.lookup()
     # Resolve absolute path
     model_path = os.path.abspath(model_path)
 
@@ -125,18 +141,15 @@ def check_model_exists_with_path(type: str, repo_id: str, model_path: str) -> bo
         # Check if model exists in storage. The reactor node requires the flat name
         # to be the model file itself; a directory (left by an older broken download)
         # does not count and must trigger a re-download.
-        if not os.path.isfile(storage_path):
+        if not fs.is_intact_file(storage_path):
             return False
 
         # For faceswap/facerestore, also check and restore to ComfyUI directory
         comfy_ui_path = get_comfyui_faceswap_facerestore_path(type, repo_id)
 
         # If not in ComfyUI directory, restore from storage
-        if not os.path.isfile(comfy_ui_path):
-            logging.info(
-                f"Restoring {type} model {repo_id} from storage to ComfyUI directory"
-            )
-            copy_faceswap_facerestore_to_comfyui(type, repo_id, model_path)
+        if not fs.is_file(comfy_ui_path):
+            restore_faceswap_facerestore_in_background(type, repo_id, model_path)
 
         return True
     elif type == "nsfwdetector":
@@ -144,7 +157,7 @@ def check_model_exists_with_path(type: str, repo_id: str, model_path: str) -> bo
             model_path, "vit-base-nsfw-detector", extract_model_id_pathsegments(repo_id)
         )
         # Check if the specific file exists
-        return os.path.isfile(dir_to_look_for)
+        return fs.is_intact_file(dir_to_look_for)
     elif type == "ggufLLM" or (isinstance(repo_id, str) and repo_id.endswith(".gguf")):
         # For GGUF files, distinguish between specific file references and repo-only references
         dir_to_look_for = os.path.join(
@@ -156,13 +169,12 @@ def check_model_exists_with_path(type: str, repo_id: str, model_path: str) -> bo
         # Check if repo_id specifies a specific file
         if is_specific_file_reference(repo_id):
             # For specific file references, check for exact file match
-            return os.path.isfile(dir_to_look_for)
+            return fs.is_intact_file(dir_to_look_for)
         else:
             # For repo-only references, check if any .gguf file exists in the directory
-            if os.path.isdir(dir_to_look_for):
-                for file in os.listdir(dir_to_look_for):
-                    if file.endswith(".gguf"):
-                        return True
+            for file in fs.names(dir_to_look_for):
+                if file.endswith(".gguf"):
+                    return True
             return False
     else:
         # For other model types, apply the same logic
@@ -175,32 +187,41 @@ def check_model_exists_with_path(type: str, repo_id: str, model_path: str) -> bo
         # Check if repo_id specifies a specific file
         if is_specific_file_reference(repo_id):
             # For specific file references, check for exact file match
-            return os.path.isfile(dir_to_look_for)
+            return fs.is_intact_file(dir_to_look_for)
         else:
             # For repo-only references, check if directory exists
-            return os.path.exists(dir_to_look_for)
+            return fs.exists(dir_to_look_for)
 
 
-def check_openvino_model_exists(type: str, repo_id: str) -> bool:
+def check_openvino_model_exists(
+    type: str, repo_id: str, fs: model_index.Lookup | None = None
+) -> bool:
     """Check if an OpenVINO model exists"""
+    fs = fs or model_index.lookup()
     folder_name = repo_local_root_dir_name(repo_id)
     dir = config.openvino_model_paths.get(type)
-    return os.path.exists(os.path.join(dir, folder_name))
+    return fs.exists(os.path.join(dir, folder_name))
 
 
-def check_llama_cpp_model_exists(type: str, repo_id: str) -> bool:
+def check_llama_cpp_model_exists(
+    type: str, repo_id: str, fs: model_index.Lookup | None = None
+) -> bool:
     """Check if a LlamaCPP model exists"""
+    fs = fs or model_index.lookup()
     model_dir = config.llama_cpp_model_paths.get(type)
     dir_to_look_for = os.path.join(
         model_dir,
         repo_local_root_dir_name(repo_id),
         extract_model_id_pathsegments(repo_id),
     )
-    return os.path.exists(dir_to_look_for)
+    return fs.exists(dir_to_look_for)
 
 
-def check_comfyui_model_exists(type: str, repo_id: str) -> bool:
+def check_comfyui_model_exists(
+    type: str, repo_id: str, fs: model_index.Lookup | None = None
+) -> bool:
     """Check if a ComfyUI model exists, and restore from storage if missing in ComfyUI directory"""
+    fs = fs or model_index.lookup()
     # For faceswap and facerestore, check ComfyUI's models directory first
     if type == "faceswap" or type == "facerestore":
         # Check ComfyUI's models directory first
@@ -208,7 +229,7 @@ def check_comfyui_model_exists(type: str, repo_id: str) -> bool:
 
         # If the model file exists in ComfyUI directory, return True. A directory of
         # the same name (left by an older broken download) does not count.
-        if os.path.isfile(comfy_ui_path):
+        if fs.is_file(comfy_ui_path):
             return True
 
         # If not in ComfyUI directory, check storage and restore if found
@@ -216,19 +237,10 @@ def check_comfyui_model_exists(type: str, repo_id: str) -> bool:
         flat_name = flat_repo_local_dir_name(repo_id)
         storage_path = os.path.join(os.path.abspath(model_dir), flat_name)
 
-        if os.path.isfile(storage_path):
-            # Restore from storage to ComfyUI directory
-            logging.info(
-                f"Restoring {type} model {repo_id} from storage to ComfyUI directory"
-            )
-            if copy_faceswap_facerestore_to_comfyui(type, repo_id):
-                return True
-            else:
-                # Even if copy failed, model exists in storage
-                logging.warning(
-                    f"Model exists in storage but failed to copy to ComfyUI: {repo_id}"
-                )
-                return True  # Return True because model exists, just not in ComfyUI location
+        if fs.is_file(storage_path):
+            # The model exists in storage, even if restoring it to ComfyUI fails
+            restore_faceswap_facerestore_in_background(type, repo_id)
+            return True
 
         return False
     elif type == "nsfwdetector":
@@ -244,7 +256,7 @@ def check_comfyui_model_exists(type: str, repo_id: str) -> bool:
             repo_local_root_dir_name(repo_id),
             extract_model_id_pathsegments(repo_id),
         )
-    return os.path.exists(dir_to_look_for)
+    return fs.exists(dir_to_look_for)
 
 
 def check_defaultbackend_mmodel_exist(type: str, repo_id: str) -> bool:
@@ -267,31 +279,6 @@ def calculate_sha256(file_path: str):
     return file_hash.hexdigest()
 
 
-def create_cache_path(sha256: str, file_size: int):
-    """Create a cache path for a file based on its SHA256 hash and size"""
-    cache_dir = "./cache"
-    sub_dirs = [sha256[i : i + 4] for i in range(0, len(sha256), 4)]
-    cache_path = os.path.abspath(
-        os.path.join(cache_dir, *sub_dirs, f"{sha256}_{file_size}")
-    )
-    return cache_path
-
-
-def cache_file(file_path: IO[bytes] | str, file_size: int):
-    """Cache a file using its SHA256 hash and size"""
-    sha256 = calculate_sha256(file_path)
-
-    cache_path = create_cache_path(sha256, file_size)
-
-    if not os.path.exists(cache_path):
-        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-        os.rename(file_path, cache_path)
-
-    if os.path.exists(file_path):
-        os.remove(file_path)
-    os.link(cache_path, file_path)
-
-
 def remove_existing_filesystem_resource(path: str):
     """Remove an existing file or directory"""
     if os.path.exists(path):
@@ -352,14 +339,54 @@ def copy_faceswap_facerestore_to_comfyui(
                 os.remove(dest_path)
 
         # Copy model (file or directory)
+        # (hardlinked where the filesystem allows, which makes this instant)
         if os.path.isdir(source_path):
-            shutil.copytree(source_path, dest_path)
+            shutil.copytree(
+                source_path, dest_path, copy_function=blob_store.link_or_copy
+            )
             logging.info(f"Copied directory {source_path} to {dest_path}")
         else:
-            shutil.copy2(source_path, dest_path)
+            blob_store.link_or_copy(source_path, dest_path)
             logging.info(f"Copied file {source_path} to {dest_path}")
 
         return True
     except Exception as e:
         logging.error(f"Failed to copy {type} model {repo_id} to ComfyUI: {e}")
         return False
+
+
+# Existence checks are read-only queries the UI waits on, so the copies they
+# find missing are made on this worker instead of inline.
+_restore_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="comfyui-restore"
+)
+_pending_restores: set[tuple] = set()
+_pending_restores_lock = threading.Lock()
+
+
+def restore_faceswap_facerestore_in_background(
+    type: str, repo_id: str, storage_model_path: str | None = None
+) -> concurrent.futures.Future | None:
+    """Queue copy_faceswap_facerestore_to_comfyui unless that restore is already queued."""
+    key = (type, repo_id, storage_model_path)
+    with _pending_restores_lock:
+        if key in _pending_restores:
+            return None
+        _pending_restores.add(key)
+
+    def restore():
+        try:
+            logging.info(
+                f"Restoring {type} model {repo_id} from storage to ComfyUI directory"
+            )
+            if not copy_faceswap_facerestore_to_comfyui(
+                type, repo_id, storage_model_path
+            ):
+                logging.warning(
+                    f"Model exists in storage but failed to copy to ComfyUI: {repo_id}"
+                )
+        finally:
+            with _pending_restores_lock:
+                _pending_restores.discard(key)
+
+    return _restore_executor.submit(restore)
@@ -1,6 +1,7 @@
 import sys
 import time
 
+_started_at = time.monotonic()
 added = []
 
 
@@ -31,6 +32,7 @@ def get_added_dll_directories():
 try:
     import sys
 
+    import lazy_imports
     from web_request_bodies import (
         DownloadModelRequestBody,
     )
@@ -39,16 +41,12 @@ try:
     # Related issues:
     # + https://github.com/XPixelGroup/BasicSR/issues/649
     # + https://github.com/AUTOMATIC1111/stable-diffusion-webui/issues/13985
-    try:
-        import torchvision.transforms.functional_tensor  # noqa: F401
-    except ImportError:
-        try:
-            import torchvision.transforms.functional as functional
-
-            sys.modules["torchvision.transforms.functional_tensor"] = functional
-        except ImportError:
-            pass
+    # Aliased lazily: importing torchvision to check pulls in all of torch.
+    lazy_imports.alias_missing_module(
+        "torchvision.transforms.functional_tensor", "torchvision.transforms.functional"
+    )
 
+    import concurrent.futures
     import os
     import threading
 
@@ -66,15 +64,25 @@ try:
     import logging
     import traceback
 
-    import model_download_adpater
+    import blob_store
+    import config
+    import model_index
     import utils
     from aipg_loopback_auth import (
         evaluate_loopback_auth,
         get_loopback_token,
+        loopback_cors_headers,
     )
     from exceptions import HFReachabilityError
-    from model_downloader import HFPlaygroundDownloader
-    from psutil._common import bytes2human
+
+    # the download stack; see lazy_imports
+    blob_server = lazy_imports.module("blob_server")
+    download_finalize = lazy_imports.module("download_finalize")
+    download_scheduler = lazy_imports.module("download_scheduler")
+    http_client = lazy_imports.module("http_client")
+    model_download_adpater = lazy_imports.module("model_download_adpater")
+    model_downloader = lazy_imports.module("model_downloader")
+    psutil_common = lazy_imports.module("psutil._common")
 
     logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
@@ -86,12 +94,6 @@ try:
     # processes and host-networked containers), which is the attack model
     # documented in the CWE-494 report against /api/comfyUi/loadCustomNodes.
     _LOOPBACK_AUTH_TOKEN = get_loopback_token()
-    # Loopback hostnames whose Origin we are willing to echo back as
-    # Access-Control-Allow-Origin. The renderer may load via 127.0.0.1 or
-    # localhost depending on platform/devtools; production Electron loads
-    # from file:// which the browser sends as `Origin: null`.
-    _ALLOWED_CORS_HOSTS = frozenset({"127.0.0.1", "localhost", "::1", "[::1]"})
-
     if not _LOOPBACK_AUTH_TOKEN:
         logging.warning(
             "AIPG_LOOPBACK_TOKEN env var is not set; ai-backend will reject all "
@@ -99,32 +101,15 @@ try:
             "Electron main process so the token is provisioned."
         )
 
-    def _origin_is_loopback(origin: str) -> bool:
-        """True for `null`, `file://...`, or any http(s) URL whose host is a
-        loopback host. Used to decide whether we are willing to echo the
-        request Origin back as Access-Control-Allow-Origin."""
-        if not origin:
-            return False
-        if origin == "null":
-            return True
-        if origin.startswith("file://"):
-            return True
-        # Strip scheme.
-        for scheme in ("http://", "https://"):
-            if origin.startswith(scheme):
-                rest = origin[len(scheme) :]
-                # Strip path component if any.
-                rest = rest.split("/", 1)[0]
-                # Strip port. IPv6 hosts come bracketed: `[::1]:1234`.
-                if rest.startswith("["):
-                    end = rest.find("]")
-                    if end < 0:
-                        return False
-                    host = rest[: end + 1]
-                else:
-                    host = rest.split(":", 1)[0]
-                return host in _ALLOWED_CORS_HOSTS
-        return False
+    def _record_serving():
+        # neither server offers a hook once its socket is bound, so the first
+        # request it answers (the registry polls /healthy) marks the moment
+        global _serving_after
+        if _serving_after is None:
+            _serving_after = time.monotonic() - _started_at
+            logging.info(f"serving /healthy after {_serving_after:.2f}s")
+
+    app.before_request(_record_serving)
 
     @app.before_request
     def _enforce_loopback_and_auth():
@@ -153,32 +138,69 @@ try:
             return Response(status=204)
         return None
 
+    # Cleared while the download stack starts in the background (see
+    # `__main__`); /healthy is answered meanwhile, every other request waits.
+    _download_stack_ready = threading.Event()
+    _download_stack_ready.set()
+    _serving_after: float | None = None
+    _ready_after: float | None = None
+
+    @app.before_request
+    def _wait_for_download_stack():
+        if request.path != "/healthy":
+            _download_stack_ready.wait()
+
+    def _start_download_stack():
+        global _ready_after
+        try:
+            # finish moving downloads whose finalize was cut short by the last exit
+            download_finalize.recover()
+            # blobs of models deleted since the last run
+            threading.Thread(target=blob_store.collect_garbage, daemon=True).start()
+            if config.download_peer_server:
+                blob_server.serve(config.download_peer_server)
+            # continue the downloads that were queued when the service last stopped
+            download_scheduler.get_scheduler()
+            _ready_after = time.monotonic() - _started_at
+            logging.info(f"download service ready after {_ready_after:.2f}s")
+        except Exception:
+            logging.exception("starting the download service failed")
+        finally:
+            _download_stack_ready.set()
+
     @app.after_request
     def _attach_cors_headers(response):
-        # The renderer fetch sends a custom `X-AIPG-Auth` header which makes
-        # the request "non-simple", so the browser issues a CORS preflight
-        # for every call. We only echo the Origin back when it is a known
-        # loopback origin; non-loopback origins get no Allow-Origin header
-        # and the browser blocks them.
-        origin = request.headers.get("Origin", "")
-        if origin and _origin_is_loopback(origin):
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Vary"] = "Origin"
-            response.headers["Access-Control-Allow-Methods"] = (
-                "GET, POST, DELETE, PUT, OPTIONS, PATCH"
-            )
-            response.headers["Access-Control-Allow-Headers"] = (
-                "Content-Type, Authorization, X-AIPG-Auth"
-            )
-            # Preflight result cached for 10 minutes; avoids repeated OPTIONS
-            # round-trips for typical short-lived API calls.
-            response.headers["Access-Control-Max-Age"] = "600"
+        response.headers.update(
+            loopback_cors_headers(request.headers.get("Origin", ""))
+        )
         return response
 
     @app.get("/healthy")
     def healthEndpoint():
         return jsonify({"health": "OK"})
 
+    @app.get("/api/debug/importTime")
+    def import_time_report():
+        # a cold `-X importtime` run of what /healthy needs, then of the rest
+        imports = lazy_imports.profile_imports(
+            {
+                "serving": ["web_api"],
+                "deferred": [
+                    "model_download_adpater",
+                    "download_finalize",
+                    "blob_server",
+                    "http_client",
+                ],
+            }
+        )
+        return jsonify(
+            {
+                "serving_after_s": _serving_after,
+                "ready_after_s": _ready_after,
+                "imports": imports,
+            }
+        )
+
     @app.post("/api/checkModelAlreadyLoaded")
     @app.input(
         DownloadModelRequestBody.Schema,
@@ -186,15 +208,24 @@ try:
         arg_name="download_request_data",
     )
     def check_model_already_loaded(download_request_data: DownloadModelRequestBody):
+        # one lookup for the batch: each model directory is read (or, when the
+        # cached listing is still current, stat'ed) once, and cold directories
+        # on a slow disk are read concurrently
+        fs = model_index.lookup()
+        items = download_request_data.data
+        loaded = _map_concurrently(
+            lambda item: utils.check_mmodel_exist(
+                item.type, item.repo_id, item.backend, item.model_path, fs
+            ),
+            items,
+        )
         result_list = []
-        for item in download_request_data.data:
+        for item, already_loaded in zip(items, loaded):
             base_response = {
                 "repo_id": item.repo_id,
                 "type": item.type,
                 "backend": item.backend,
-                "already_loaded": utils.check_mmodel_exist(
-                    item.type, item.repo_id, item.backend, item.model_path
-                ),
+                "already_loaded": already_loaded,
             }
 
             if item.additionalLicenseLink is not None:
@@ -211,7 +242,7 @@ try:
         # would treat a private OVMS image repo as nonexistent and skip the
         # download dialog entirely.
         hf_token = get_bearer_token(request)
-        downloader = HFPlaygroundDownloader(hf_token=hf_token)
+        downloader = model_downloader.HFPlaygroundDownloader(hf_token=hf_token)
         try:
             exists = downloader.hf_url_exists(repo_id)
         except HFReachabilityError as ex:
@@ -227,14 +258,24 @@ try:
             ), 503
         return jsonify({"exists": exists})
 
-    size_cache = dict()
-    lock = threading.Lock()
+    # Gated/access checks are independent HF round-trips, and the model picker
+    # asks about dozens of repos at once.
+    _HF_METADATA_MAX_WORKERS = 8
+
+    def _map_concurrently(fn, items):
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=_HF_METADATA_MAX_WORKERS
+        ) as executor:
+            return list(executor.map(fn, items))
 
     @app.post("/api/isModelGated")
     def is_model_gated():
         list, hf_token = request.get_json()
-        downloader = HFPlaygroundDownloader(hf_token if hf_token else None)
-        gated = {item["repo_id"]: downloader.is_gated(item["repo_id"]) for item in list}
+        downloader = model_downloader.HFPlaygroundDownloader(
+            hf_token if hf_token else None
+        )
+        repo_ids = dict.fromkeys(item["repo_id"] for item in list)
+        gated = dict(zip(repo_ids, _map_concurrently(downloader.is_gated, repo_ids)))
 
         return jsonify(
             {
@@ -247,33 +288,24 @@ try:
     @app.route("/api/isAccessGranted", methods=["POST"])
     def is_access_granted():
         list, hf_token = request.get_json()
-        downloader = HFPlaygroundDownloader(hf_token)
-        accessGranted = {
-            item["repo_id"]: downloader.is_access_granted(
+        downloader = model_downloader.HFPlaygroundDownloader(hf_token)
+        granted = _map_concurrently(
+            lambda item: downloader.is_access_granted(
                 item["repo_id"], item["type"], item["backend"]
-            )
-            for item in list
+            ),
+            list,
+        )
+        accessGranted = {
+            item["repo_id"]: is_granted for item, is_granted in zip(list, granted)
         }
         return jsonify({"accessList": accessGranted})
 
     @app.post("/api/getModelSize")
     def get_model_size():
-        import concurrent.futures
-
         list = request.get_json()
         result_dict = dict()
-        request_list = []
-        for item in list:
-            repo_id = item["repo_id"]
-            type = item["type"]
-            key = f"{repo_id}_{type}"
-            total_size = size_cache.get(key)
-            if total_size is None:
-                request_list.append((repo_id, type))
-            else:
-                result_dict.__setitem__(
-                    key, bytes2human(total_size, "%(value).2f%(symbol)s")
-                )
+        # sizes come from the persistent manifest store, so this rarely touches HF
+        request_list = [(item["repo_id"], item["type"]) for item in list]
 
         if request_list.__len__() > 0:
             with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -294,12 +326,12 @@ try:
 
     def fill_size_execute(repo_id: str, type: int, result_dict: dict):
         key = f"{repo_id}_{type}"
-        total_size = HFPlaygroundDownloader().get_model_total_size(repo_id, type)
-        with lock:
-            size_cache.__setitem__(key, total_size)
-            result_dict.__setitem__(
-                key, bytes2human(total_size, "%(value).2f%(symbol)s")
-            )
+        total_size = model_downloader.HFPlaygroundDownloader().get_model_total_size(
+            repo_id, type
+        )
+        result_dict.__setitem__(
+            key, psutil_common.bytes2human(total_size, "%(value).2f%(symbol)s")
+        )
 
     def get_bearer_token(request):
         auth_header = request.headers.get("Authorization")
@@ -314,24 +346,20 @@ try:
         arg_name="download_request_data",
     )
     def download_model(download_request_data: DownloadModelRequestBody):
-        if model_download_adpater._adapter is not None:
-            model_download_adpater._adapter.stop_download()
+        # Requests no longer replace each other: their repos are queued on the
+        # shared scheduler and this stream reports on the ones asked for here.
+        adapter = model_download_adpater.Model_Downloader_Adapter(
+            hf_token=get_bearer_token(request)
+        )
         try:
-            model_download_adpater._adapter = (
-                model_download_adpater.Model_Downloader_Adapter(
-                    hf_token=get_bearer_token(request)
-                )
-            )
-            iterator = model_download_adpater._adapter.download(
-                download_request_data.data
-            )
+            iterator = adapter.download(download_request_data.data)
             return Response(
                 stream_with_context(iterator), content_type="text/event-stream"
             )
         except Exception as e:
             traceback.print_exc()
 
-            model_download_adpater._adapter.stop_download()
+            adapter.stop_download()
             ex_str = f'{{"type": "error", "err_type": "{e}"}}'
             return Response(
                 stream_with_context([ex_str]), content_type="text/event-stream"
@@ -339,8 +367,86 @@ try:
 
     @app.get("/api/stopDownloadModel")
     def stop_download_model():
-        if model_download_adpater._adapter is not None:
-            model_download_adpater._adapter.stop_download()
+        # only the jobs of the caller's request, named by the `download_jobs`
+        # message its stream opened with; other requests' downloads go on
+        job_ids = [id for id in request.args.get("ids", "").split(",") if id]
+        if not job_ids:
+            return jsonify({"code": 1, "message": "ids is required"}), 400
+        scheduler = download_scheduler.get_scheduler()
+        for job_id in job_ids:
+            scheduler.cancel(job_id)
+        return jsonify({"code": 0, "message": "success"})
+
+    @app.route("/api/downloadBandwidthLimit", methods=["GET", "POST"])
+    def download_bandwidth_limit():
+        # bytes per second shared by all model downloads; 0 lifts the cap
+        if request.method == "POST":
+            limit = (request.get_json(silent=True) or {}).get("bytes_per_second")
+            if not isinstance(limit, int) or limit < 0:
+                return jsonify(
+                    {
+                        "code": 1,
+                        "message": "bytes_per_second must be a non-negative integer",
+                    }
+                ), 400
+            http_client.bandwidth.set_rate(limit)
+        return jsonify(
+            {
+                "code": 0,
+                "message": "success",
+                "bytes_per_second": http_client.bandwidth.rate,
+            }
+        )
+
+    @app.get("/api/downloadJobs")
+    def list_download_jobs():
+        jobs = download_scheduler.get_scheduler().list_jobs()
+        return jsonify({"code": 0, "message": "success", "jobs": jobs})
+
+    @app.get("/api/downloadJobs/events")
+    def download_job_events():
+        # another view on running jobs, e.g. a second window or a channel
+        job_ids = [id for id in request.args.get("ids", "").split(",") if id]
+        iterator = model_download_adpater.Model_Downloader_Adapter().follow(job_ids)
+        if iterator is None:
+            return jsonify({"code": 1, "message": "unknown download job"}), 404
+        return Response(stream_with_context(iterator), content_type="text/event-stream")
+
+    @app.post("/api/downloadJobs/resume")
+    def resume_download_jobs():
+        # after a restart: continue every paused download and stream them
+        # like /api/downloadModel, without the client resending the list
+        adapter = model_download_adpater.Model_Downloader_Adapter(
+            get_bearer_token(request)
+        )
+        iterator = adapter.resume_all()
+        if iterator is None:
+            return jsonify({"code": 1, "message": "no paused download jobs"}), 404
+        return Response(stream_with_context(iterator), content_type="text/event-stream")
+
+    @app.post("/api/downloadJobs/<job_id>/<action>")
+    def control_download_job(job_id: str, action: str):
+        scheduler = download_scheduler.get_scheduler()
+        match action:
+            case "pause":
+                done = scheduler.pause(job_id)
+            case "resume":
+                done = scheduler.resume(job_id, get_bearer_token(request))
+            case "cancel":
+                done = scheduler.cancel(job_id)
+            case "priority":
+                priority = (request.get_json(silent=True) or {}).get("priority")
+                if not isinstance(priority, int):
+                    return jsonify(
+                        {"code": 1, "message": "priority must be an integer"}
+                    ), 400
+                done = scheduler.set_priority(job_id, priority)
+            case _:
+                return jsonify({"code": 1, "message": f"unknown action {action}"}), 404
+        if not done:
+            return jsonify(
+                {"code": 1, "message": f"cannot {action} download job {job_id}"}
+            ), 409
         return jsonify({"code": 0, "message": "success"})
 
     if __name__ == "__main__":
@@ -350,8 +456,36 @@ try:
         parser.add_argument(
             "--port", type=int, default=59999, help="Service listen port"
         )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Serve from an asyncio event loop (needs uvicorn)",
+        )
         args = parser.parse_args()
-        app.run(host="127.0.0.1", port=args.port)
+        # bind first; the download stack comes up while /healthy is answered
+        _download_stack_ready.clear()
+        threading.Thread(target=_start_download_stack, daemon=True).start()
+        uvicorn = None
+        if args.asgi:
+            try:
+                import uvicorn
+            except ImportError:
+                logging.warning("uvicorn is not installed, serving without --asgi")
+        if uvicorn is not None:
+            import async_api
+
+            uvicorn.run(
+                async_api.AsyncApi(
+                    app,
+                    _LOOPBACK_AUTH_TOKEN,
+                    _download_stack_ready,
+                    on_request=_record_serving,
+                ),
+                host="127.0.0.1",
+                port=args.port,
+            )
+        else:
+            app.run(host="127.0.0.1", port=args.port)
 
 except OSError as e:
     import json
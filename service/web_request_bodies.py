@@ -12,6 +12,8 @@ class DownloadModelData:
     backend: str
     model_path: str
     additionalLicenseLink: str | None
+    # higher runs first when more repos are queued than download at once
+    priority: int = 0
 
 
 @marshmallow_dataclass.dataclass